@@ -0,0 +1,102 @@
+"""
+Async serving load test.
+
+Simulates requests arriving at a steady rate at an asyncio web app, each
+asking for the JSON specification of a story, and reports the latency of the
+requests from their arrival (median, 95th and 99th percentiles) and the
+longest time the event loop was blocked, for stories serialized inline with
+to_json() (blocking the loop), with ato_json() on the default thread pool, and
+with ato_json() on a process pool. Each request serializes a different,
+pre-built story, so that no render is served from the cache.
+
+Usage: python benchmarks/bench_async.py [requests] [requests per second] [rows]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+import pynarrative
+from common import print_table
+from pynarrative import Story
+
+alt.data_transformers.disable_max_rows()
+
+# Interval of the heartbeat measuring how long the event loop is blocked
+TICK = 0.005
+
+
+def build(index, rows):
+    data = pd.DataFrame({'x': np.arange(rows),
+                         'y': np.random.default_rng(index).random(rows)})
+    return (Story(data).mark_line().encode(x='x:Q', y='y:Q')
+            .add_title(f"Story {index}").add_source("Source: benchmark"))
+
+
+async def heartbeat(lags):
+    # Measures how late each tick is woken up: the time the loop was blocked
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def serve(stories, rate, mode):
+    latencies = []
+    lags = []
+
+    async def handle(story, arrival):
+        if mode == 'inline':
+            story.to_json()
+        else:
+            await story.ato_json()
+        latencies.append(time.perf_counter() - arrival)
+
+    monitor = asyncio.ensure_future(heartbeat(lags))
+    await asyncio.sleep(0)  # Starts the heartbeat
+    start = time.perf_counter()
+    tasks = []
+    for index, story in enumerate(stories):
+        # Requests arrive on schedule, whether the loop is free or not, and
+        # their latency counts from the scheduled arrival
+        arrival = start + index / rate
+        await asyncio.sleep(max(0, arrival - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(handle(story, arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+    return latencies, lags, elapsed
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main(requests=40, rate=4, rows=5_000):
+    results = []
+    for mode in ('inline', 'thread', 'process'):
+        if mode == 'process':
+            pynarrative.set_executor('process')
+        stories = [build(index, rows) for index in range(requests)]
+        latencies, lags, elapsed = asyncio.run(serve(stories, rate, mode))
+        results.append({
+            'mode': mode,
+            'p50 ms': statistics.median(latencies) * 1e3,
+            'p95 ms': percentile(latencies, 0.95) * 1e3,
+            'p99 ms': percentile(latencies, 0.99) * 1e3,
+            'max loop lag ms': max(lags, default=0) * 1e3,
+            'requests/s': len(latencies) / elapsed,
+        })
+    executor = pynarrative.set_executor(None)
+    if executor is not None:
+        executor.shutdown()
+    print_table(results, ['mode', 'p50 ms', 'p95 ms', 'p99 ms', 'max loop lag ms', 'requests/s'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,50 @@
+"""
+Batch rendering benchmark.
+
+Renders one small story per customer with render_many() and reports the
+throughput in stories per second for an increasing number of processes.
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import print_table
+from pynarrative import Story, render_many
+
+CUSTOMERS = 2000
+POINTS = 50
+
+
+def customer_story(data, customer):
+    return (Story(data, width=400, height=200)
+            .mark_line()
+            .encode(x='day:Q', y='sales:Q')
+            .add_title(f"Sales of {customer}", "Last 50 days")
+            .add_context("Daily sales", position='top')
+            .add_annotation(int(data.day.iloc[-1]), float(data.sales.iloc[-1]), "Today"))
+
+
+def main(customers=CUSTOMERS):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'customer': np.repeat(np.arange(customers), POINTS),
+        'day': np.tile(np.arange(POINTS), customers),
+        'sales': rng.random(customers * POINTS),
+    })
+    items = pd.DataFrame({'customer': np.arange(customers)})
+
+    rows = []
+    for processes in (0, 1, 2, 4, 8):
+        start = time.perf_counter()
+        for _ in render_many(customer_story, items, data=data, by='customer',
+                             processes=processes, chunksize=32, ordered=False):
+            pass
+        elapsed = time.perf_counter() - start
+        rows.append({'processes': processes, 'seconds': elapsed, 'stories/s': customers / elapsed})
+    print_table(rows, ['processes', 'seconds', 'stories/s'])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CUSTOMERS)
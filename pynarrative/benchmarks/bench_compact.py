@@ -0,0 +1,59 @@
+"""
+Compact data encoding benchmark.
+
+Renders the same story with and without compact=True for floats, datetimes
+and categories, and reports the size of its specification, the size once
+gzip-compressed, and the time to produce it.
+
+Usage: python benchmarks/bench_compact.py [rows]
+"""
+import gzip
+import sys
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+
+alt.data_transformers.disable_max_rows()
+
+
+def datasets(rows):
+    rng = np.random.default_rng(0)
+    return {
+        'floats': (pd.DataFrame({'x': rng.random(rows) * 100, 'y': rng.normal(50, 10, rows)}),
+                   dict(x='x:Q', y='y:Q')),
+        'datetimes': (pd.DataFrame({'date': pd.date_range('2024-01-01', periods=rows, freq='min'),
+                                    'value': rng.random(rows) * 100}),
+                      dict(x='date:T', y='value:Q')),
+        'categories': (pd.DataFrame({'x': np.arange(rows), 'y': np.arange(rows) % 97,
+                                     'region': rng.choice(['north', 'south', 'east', 'west'], rows)}),
+                       dict(x='x:Q', y='y:Q', color='region:N')),
+    }
+
+
+def story_json(data, encoding, compact):
+    # A new Story each time, so that no render is reused from its cache
+    return (Story(data, compact=compact).mark_point().encode(**encoding)
+            .to_json(validate=False, indent=None, separators=(',', ':')))
+
+
+def main(rows=20_000):
+    results = []
+    for case, (data, encoding) in datasets(rows).items():
+        for compact in (False, True):
+            text = story_json(data, encoding, compact)
+            results.append({
+                'data': case,
+                'compact': compact,
+                'bytes': len(text),
+                'gzip bytes': len(gzip.compress(text.encode('utf-8'))),
+                'ms': measure(lambda: story_json(data, encoding, compact), repeat=3)['min'] * 1e3,
+            })
+    print_table(results, ['data', 'compact', 'bytes', 'gzip bytes', 'ms'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
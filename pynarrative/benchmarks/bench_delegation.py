@@ -0,0 +1,72 @@
+"""
+Delegation overhead benchmark.
+
+Times Altair methods called through a Story (pre-built delegates), through
+the generic Story.__getattr__ wrapper and directly on an alt.Chart, for a
+single attribute access, a single call and a typical method chain. The
+difference between the Story and the Chart columns is the cost of delegation.
+
+Usage: python benchmarks/bench_delegation.py [calls]
+"""
+import sys
+
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+
+DATA = pd.DataFrame({'x': [1, 2, 3], 'y': [4, 5, 6]})
+
+
+def legacy(story, name):
+    # Lookup through __getattr__, as done for every method before delegates
+    # were pre-built
+    return Story.__getattr__(story, name)
+
+
+def chain(target, get):
+    # Calls that give the same chart when repeated, since a Story keeps the
+    # result; encode() is left out, as its shorthand parsing costs milliseconds
+    # and would hide the cost of delegation
+    return get(get(get(target, 'mark_line')(), 'properties')(title="Title"), 'configure_axis')(grid=False)
+
+
+CASES = {
+    'attribute access': (
+        lambda story: story.encode,
+        lambda story: legacy(story, 'encode'),
+        lambda chart: chart.encode,
+    ),
+    'call': (
+        lambda story: story.mark_line(),
+        lambda story: legacy(story, 'mark_line')(),
+        lambda chart: chart.mark_line(),
+    ),
+    'chain': (
+        lambda story: chain(story, getattr),
+        lambda story: chain(story, lambda target, name: (
+            legacy(target, name) if isinstance(target, Story) else getattr(target, name))),
+        lambda chart: chain(chart, getattr),
+    ),
+}
+
+
+def run(calls):
+    # The Story keeps the chart returned by the chain, so both start from it
+    story = chain(Story(DATA), getattr)
+    chart = story.chart
+    rows = []
+    for case, (delegated, wrapped, direct) in CASES.items():
+        row = {'case': case}
+        for column, function, target in (('story µs', delegated, story),
+                                         ('__getattr__ µs', wrapped, story),
+                                         ('chart µs', direct, chart)):
+            row[column] = measure(lambda: function(target), repeat=5, number=calls)['min'] * 1e6
+        row['overhead µs'] = row['story µs'] - row['chart µs']
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    print_table(run(calls), ['case', 'story µs', '__getattr__ µs', 'chart µs', 'overhead µs'])
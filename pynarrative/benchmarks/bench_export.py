@@ -0,0 +1,49 @@
+"""
+Static export benchmark.
+
+Exports small stories to PNG with export_many() and reports the throughput in
+charts per second for an increasing number of worker processes. Worker start-up
+(loading the vl-convert engine) is included, as in a real batch.
+
+Usage: python benchmarks/bench_export.py [charts] [format]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import print_table
+from pynarrative import Story, export_many
+
+CHARTS = 200
+POINTS = 50
+
+
+def stories(count):
+    rng = np.random.default_rng(0)
+    for index in range(count):
+        data = pd.DataFrame({'day': np.arange(POINTS), 'sales': rng.random(POINTS)})
+        yield (Story(data, width=400, height=200)
+               .mark_line()
+               .encode(x='day:Q', y='sales:Q')
+               .add_title(f"Sales of customer {index}", "Last 50 days")
+               .add_annotation(POINTS - 1, float(data.sales.iloc[-1]), "Today"))
+
+
+def main(charts=CHARTS, format='png'):
+    rows = []
+    for workers in (0, 1, 2, 4, 8):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            for _ in export_many(stories(charts), format=format, directory=directory, workers=workers):
+                pass
+            elapsed = time.perf_counter() - start
+        rows.append({'workers': workers, 'seconds': elapsed, 'charts/s': charts / elapsed})
+    print_table(rows, ['workers', 'seconds', 'charts/s'])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CHARTS,
+         sys.argv[2] if len(sys.argv) > 2 else 'png')
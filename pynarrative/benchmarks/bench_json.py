@@ -0,0 +1,69 @@
+"""
+JSON serialization benchmark.
+
+Serializes a rendered story with many rows and reports the time and the peak
+memory allocated by Altair's render().to_json(), Story.to_json() with the json
+module and with orjson, and Story.write_json() streaming the specification to
+a file.
+
+Usage: python benchmarks/bench_json.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+
+alt.data_transformers.disable_max_rows()
+
+
+def build(rows):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({'x': np.arange(rows), 'y': rng.random(rows),
+                         'group': np.where(np.arange(rows) % 2, 'a', 'b')})
+    return Story(data).mark_line().encode(x='x:Q', y='y:Q', color='group:N').add_title("Title")
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(rows=200_000):
+    story = build(rows)
+    story.render()  # Serialization only: the render is cached
+    path = os.path.join(tempfile.mkdtemp(), 'story.json')
+    cases = {
+        'altair to_json': lambda: story.render().to_json(validate=False),
+        'to_json (json)': lambda: story.to_json(validate=False, backend='json'),
+        'to_json (orjson)': lambda: story.to_json(validate=False, backend='orjson'),
+        'write_json (json)': lambda: story.write_json(path, validate=False, backend='json'),
+        'write_json (orjson)': lambda: story.write_json(path, validate=False, backend='orjson'),
+    }
+    results = []
+    for case, function in cases.items():
+        start = time.perf_counter()
+        function()
+        # Slow cases are measured once
+        repeat = 1 if time.perf_counter() - start > 2 else 3
+        results.append({
+            'case': case,
+            'ms': measure(function, repeat=repeat)['min'] * 1e3,
+            'peak MB': peak_memory(function) / 1e6,
+        })
+    print_table(results, ['case', 'ms', 'peak MB'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+Peak memory benchmark for columnar input.
+
+Every case runs in a fresh interpreter: the input frame is created first, then
+a Story is built on it and rendered. The table reports the size of the input
+and how much each phase raised the peak resident memory of the process above
+what the input alone needed, for Polars and Arrow data passed as is, for the
+same data converted to pandas beforehand, and for an Arrow table of only the
+columns the story reads.
+
+Only the columns the story reads are converted: the Arrow table must render
+with no more memory than the table of those columns alone (within a tolerance
+of a tenth of the input), which is checked at the end.
+
+Usage: python benchmarks/bench_memory.py [rows] [columns]
+"""
+import json
+import subprocess
+import sys
+
+from common import print_table
+
+CASE = '''
+import json, resource
+import numpy as np
+import polars as pl
+
+def peak():
+    # Peak resident set size of the process, in MB (kilobytes on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+import pynarrative
+from pynarrative import Story
+import altair as alt
+import pandas
+alt.data_transformers.disable_max_rows()
+
+rng = np.random.default_rng(0)
+data = pl.DataFrame({{f'c{{i}}': rng.normal(size={rows}) for i in range({columns})}})
+data = data.with_columns(x=pl.int_range(0, {rows}))
+size = data.estimated_size() / 2 ** 20
+if '{case}'.startswith('arrow'):
+    data = data.to_arrow()
+results = {{'input MB': size}}
+
+start = peak()
+if '{case}' == 'pandas':
+    data = data.to_pandas()
+story = (Story(data).mark_line().encode(x='x:Q', y='c0:Q')
+         .add_title("Title").add_annotation(10, 0, "Note").add_line(0))
+results['build MB'] = peak() - start
+story.render()
+results['render MB'] = peak() - start
+print(json.dumps(results))
+'''
+
+
+def run(case, rows, columns):
+    output = subprocess.check_output([
+        sys.executable, '-c', CASE.format(case=case, rows=rows, columns=columns)
+    ])
+    return dict(json.loads(output), case=case)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    cases = ('polars', 'arrow', 'pandas', 'arrow (read columns)')
+    # The story reads columns x and c0
+    results = {case: run(case, rows, 1 if case == 'arrow (read columns)' else columns)
+               for case in cases}
+    print_table(list(results.values()), ['case', 'input MB', 'build MB', 'render MB'])
+    arrow, read = results['arrow'], results['arrow (read columns)']
+    assert arrow['render MB'] <= read['render MB'] + arrow['input MB'] / 10, \
+        "the Arrow table is converted beyond the columns the story reads"
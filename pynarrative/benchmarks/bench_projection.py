@@ -0,0 +1,57 @@
+"""
+Column projection benchmark.
+
+Renders a story reading 3 columns of a wide DataFrame and reports the size
+of its specification and the time to produce it, next to the same chart built
+with Altair alone, which embeds every column, for an increasing number of
+unused columns.
+
+Usage: python benchmarks/bench_projection.py [rows]
+"""
+import sys
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+
+alt.data_transformers.disable_max_rows()
+
+
+def wide_data(rows, unused):
+    rng = np.random.default_rng(0)
+    columns = {f'extra_{index}': rng.random(rows) for index in range(unused)}
+    return pd.DataFrame(dict(columns, day=np.arange(rows), sales=rng.random(rows),
+                             region=np.where(np.arange(rows) % 2, 'north', 'south')))
+
+
+def story_json(data):
+    # A new Story each time, so that no render is reused from its cache
+    return (Story(data).mark_line().encode(x='day:Q', y='sales:Q', color='region:N')
+            .to_json(validate=False))
+
+
+def altair_json(data):
+    return (alt.Chart(data, width=600, height=400).mark_line()
+            .encode(x='day:Q', y='sales:Q', color='region:N')
+            .to_json(validate=False))
+
+
+def main(rows=2_000):
+    results = []
+    for unused in (0, 10, 50, 200):
+        data = wide_data(rows, unused)
+        results.append({
+            'unused columns': unused,
+            'story bytes': len(story_json(data)),
+            'altair bytes': len(altair_json(data)),
+            'story ms': measure(lambda: story_json(data), repeat=3)['min'] * 1e3,
+            'altair ms': measure(lambda: altair_json(data), repeat=3)['min'] * 1e3,
+        })
+    print_table(results, ['unused columns', 'story bytes', 'altair bytes', 'story ms', 'altair ms'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
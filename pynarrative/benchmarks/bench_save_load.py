@@ -0,0 +1,61 @@
+"""
+Save and load benchmark.
+
+Times building a typical story with the builder methods, saving it with
+Story.save_story() and loading it back with Story.load_story(), for data of
+increasing size, and reports the size of the saved file and of its data side
+file next to the size of the JSON specification.
+
+Usage: python benchmarks/bench_save_load.py [rows ...]
+"""
+import os
+import sys
+import tempfile
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+
+alt.data_transformers.disable_max_rows()
+
+
+def build(data):
+    return (Story(data).mark_line().encode(x='x:Q', y='y:Q', color='series:N')
+            .add_title("Title", "Subtitle")
+            .add_context("Context")
+            .add_annotation(10, 0.5, "Point of interest")
+            .add_line(0.5)
+            .add_source("Source: benchmark"))
+
+
+def run(sizes):
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'story.pns')
+        for size in sizes:
+            data = pd.DataFrame({
+                'x': np.arange(size),
+                'y': np.random.default_rng(0).random(size),
+                'series': np.where(np.arange(size) % 2, 'a', 'b'),
+            })
+            story = build(data)
+            story.save_story(path)
+            rows.append({
+                'rows': size,
+                'build ms': measure(lambda: build(data))['min'] * 1e3,
+                'save ms': measure(lambda: story.save_story(path))['min'] * 1e3,
+                'load ms': measure(lambda: Story.load_story(path))['min'] * 1e3,
+                'file bytes': os.path.getsize(path),
+                'data bytes': os.path.getsize(path + '.data'),
+                'spec bytes': len(story.to_json(validate=False, indent=None)),
+            })
+    return rows
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 10_000, 100_000]
+    print_table(run(sizes), ['rows', 'build ms', 'save ms', 'load ms',
+                             'file bytes', 'data bytes', 'spec bytes'])
@@ -0,0 +1,89 @@
+"""
+Story server throughput benchmark.
+
+Serves one story with StoryServer on localhost and reports the requests per
+second and median latency seen by concurrent keep-alive clients when every
+request renders the story (cache disabled, as a server calling render() per
+request), with the response cache, with the cache and gzip, and when
+clients revalidate their copy with If-None-Match (304 responses).
+
+Usage: python benchmarks/bench_serve.py [requests per client] [clients] [rows]
+"""
+import http.client
+import statistics
+import sys
+import threading
+import time
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from common import print_table
+from pynarrative import Story
+from pynarrative.serve import StoryServer
+
+alt.data_transformers.disable_max_rows()
+
+
+def build(rows):
+    data = pd.DataFrame({'x': np.arange(rows), 'y': np.random.default_rng(0).random(rows)})
+    return (Story(data).mark_line().encode(x='x:Q', y='y:Q')
+            .add_title("Title", "Subtitle").add_source("Source: benchmark"))
+
+
+def client(port, requests, headers, latencies):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    for _ in range(requests):
+        start = time.perf_counter()
+        connection.request('GET', '/stories/story.json', headers=headers)
+        connection.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run(story, cache_size, headers, requests, clients):
+    server = StoryServer(('127.0.0.1', 0), cache_size=cache_size)
+    server.add('story', story)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        if 'If-None-Match' in headers:
+            headers = dict(headers)
+            headers['If-None-Match'] = server.response('story', 'json').etag
+        latencies = []
+        threads = [threading.Thread(target=client, args=(server.server_port, requests, headers, latencies))
+                   for _ in range(clients)]
+        start = time.perf_counter()
+        for worker in threads:
+            worker.start()
+        for worker in threads:
+            worker.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return len(latencies) / elapsed, statistics.median(latencies)
+
+
+CASES = {
+    'render per request': (0, {}),
+    'cached': (128, {}),
+    'cached + gzip': (128, {'Accept-Encoding': 'gzip'}),
+    'revalidated (304)': (128, {'If-None-Match': None}),
+}
+
+
+def main(requests=20, clients=4, rows=2_000):
+    story = build(rows)
+    results = []
+    for case, (cache_size, headers) in CASES.items():
+        # Rendering every request is far slower: fewer requests keep it short
+        count = max(1, requests // 10) if cache_size == 0 else requests
+        throughput, latency = run(story, cache_size, headers, count, clients)
+        results.append({'case': case, 'requests/s': throughput, 'median ms': latency * 1e3})
+    print_table(results, ['case', 'requests/s', 'median ms'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
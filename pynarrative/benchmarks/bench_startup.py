@@ -0,0 +1,45 @@
+"""
+Cold start benchmark.
+
+Every case runs in a fresh interpreter and reports the time spent importing
+pynarrative, creating the first Story and converting its first render to a
+dictionary, with and without pynarrative.warmup() called beforehand.
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+from common import print_table
+
+CASE = '''
+import json, time
+t0 = time.perf_counter()
+import pynarrative
+t1 = time.perf_counter()
+from pynarrative import Story
+t2 = time.perf_counter()
+if {warmup}:
+    pynarrative.warmup()
+t3 = time.perf_counter()
+import pandas as pd
+data = pd.DataFrame({{'x': range(100), 'y': range(100)}})
+t4 = time.perf_counter()
+Story(data).mark_line().encode(x='x:Q', y='y:Q').add_title("Title").render().to_dict()
+t5 = time.perf_counter()
+print(json.dumps({{'import pynarrative': t1 - t0, 'import Story': t2 - t1,
+                  'warmup': t3 - t2, 'first to_dict': t5 - t4}}))
+'''
+
+
+def run(warmup, repeat):
+    samples = [
+        json.loads(subprocess.check_output([sys.executable, '-c', CASE.format(warmup=warmup)]))
+        for _ in range(repeat)
+    ]
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+if __name__ == '__main__':
+    rows = [dict(run(warmup, repeat=5), case='warmup' if warmup else 'cold') for warmup in (False, True)]
+    print_table(rows, ['case', 'import pynarrative', 'import Story', 'warmup', 'first to_dict'])
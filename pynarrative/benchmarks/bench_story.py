@@ -0,0 +1,191 @@
+"""
+Story benchmark suite.
+
+Times the construction of a Story, each add_* builder, render() and the
+to_dict()/to_json() conversions, sweeping the number of data rows, annotations
+and next steps. For each case it also records the size of the JSON spec and
+the peak memory allocated by Python (measured with tracemalloc in a separate,
+untimed run, since tracing slows execution down).
+
+Results can be saved as a baseline and later runs compared against it: a case
+is reported as a regression when its fastest time (the least noisy measure)
+exceeds the baseline by more than the tolerance, or its spec or peak memory
+grew by more than the tolerance. The exit status is 1 if any regression was
+found, so that the suite can run in CI. Timings are only comparable on the machine that saved the baseline.
+
+Usage:
+    python benchmarks/bench_story.py [--sizes 100,1000] [--annotations 1,10]
+        [--steps 1,5] [--repeat 5] [--baseline PATH] [--save] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+
+SIZES = [10 ** exponent for exponent in range(2, 8)]
+ANNOTATIONS = [1, 10, 100]
+STEPS = [1, 3, 6]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def make_data(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'x': np.arange(rows),
+        'y': rng.random(rows).cumsum(),
+        'category': rng.choice(['a', 'b', 'c'], rows),
+    })
+
+
+def base_story(data):
+    return Story(data).mark_line().encode(x='x:Q', y='y:Q')
+
+
+def full_story(data, annotations=1, steps=3):
+    story = (base_story(data)
+             .add_title("Title", "Subtitle")
+             .add_context(["First line", "Second line"])
+             .add_source("Source: benchmark")
+             .add_line(float(data.y.mean()))
+             .add_next_steps(mode='line_steps', texts=[f"Step {i}" for i in range(steps)]))
+    for i in range(annotations):
+        row = i * len(data) // annotations
+        story = story.add_annotation(int(data.x.iloc[row]), float(data.y.iloc[row]), f"Note {i}")
+    return story
+
+
+# Builders timed one by one, each on a fresh story
+BUILDERS = {
+    'add_title': lambda story: story.add_title("Title", "Subtitle"),
+    'add_context': lambda story: story.add_context(["First line", "Second line"]),
+    'add_source': lambda story: story.add_source("Source: benchmark"),
+    'add_annotation': lambda story: story.add_annotation(1, 1, "Note"),
+    'add_line': lambda story: story.add_line(1),
+    'add_next_steps': lambda story: story.add_next_steps(mode='line_steps', texts=["One", "Two"]),
+}
+
+
+def peak_memory(function):
+    """
+    Returns the peak memory allocated by Python while calling function, in MB.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def pipeline_cases(name, build, repeat):
+    """
+    Times render(), to_dict() and to_json() of the story returned by build().
+    """
+    story = build()
+    chart = story.render()
+    spec = chart.to_json()
+    cases = {}
+
+    def cold_render():
+        story.clear_cache()
+        story.render()
+
+    cases[f'{name}/render'] = measure(cold_render, repeat)
+    cases[f'{name}/to_dict'] = measure(chart.to_dict, repeat)
+    cases[f'{name}/to_json'] = measure(chart.to_json, repeat)
+    total = cases[f'{name}/total'] = measure(lambda: build().render().to_json(), repeat)
+    total['bytes'] = len(spec.encode('utf-8'))
+    total['peak MB'] = peak_memory(lambda: build().render().to_json())
+    return cases
+
+
+def run(sizes, annotations, steps, repeat):
+    cases = {}
+    for rows in sizes:
+        data = make_data(rows)
+        # Larger datasets are timed fewer times
+        times = max(1, repeat if rows <= 10 ** 4 else repeat // 5)
+        cases[f'rows={rows}/Story()'] = measure(lambda: base_story(data), times)
+        for builder, add in BUILDERS.items():
+            cases[f'rows={rows}/{builder}'] = measure(lambda: add(base_story(data)), times)
+        cases.update(pipeline_cases(f'rows={rows}', lambda: full_story(data), times))
+
+    data = make_data(1000)
+    for count in annotations:
+        cases.update(pipeline_cases(f'annotations={count}', lambda: full_story(data, annotations=count), repeat))
+    for count in steps:
+        cases.update(pipeline_cases(f'steps={count}', lambda: full_story(data, steps=count), repeat))
+    return cases
+
+
+def compare(cases, baseline, tolerance):
+    """
+    Compares results with a baseline.
+
+    Returns:
+    - List of table rows, and the number of regressions found
+    """
+    rows = []
+    regressions = 0
+    for name, result in cases.items():
+        row = {'case': name, 'median s': result['median'],
+               'bytes': result.get('bytes', ''), 'peak MB': result.get('peak MB', '')}
+        reference = baseline.get(name)
+        if reference is not None:
+            row['vs baseline'] = f"{result['min'] / reference['min']:.2f}x"
+            regressed = [
+                key for key in ('min', 'bytes', 'peak MB')
+                if key in result and key in reference and result[key] > reference[key] * (1 + tolerance)
+            ]
+            if regressed:
+                row['status'] = 'REGRESSION (' + ', '.join(regressed) + ')'
+                regressions += 1
+        rows.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    def integers(text):
+        return [int(float(value)) for value in text.split(',')]
+
+    parser = argparse.ArgumentParser(description="Story benchmark suite")
+    parser.add_argument('--sizes', type=integers, default=SIZES, help="numbers of data rows")
+    parser.add_argument('--annotations', type=integers, default=ANNOTATIONS, help="numbers of annotations")
+    parser.add_argument('--steps', type=integers, default=STEPS, help="numbers of next steps")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements per case")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline file")
+    parser.add_argument('--save', action='store_true', help="save the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    # The sweep goes far beyond Altair's default limit of 5000 rows
+    alt.data_transformers.disable_max_rows()
+    cases = run(args.sizes, args.annotations, args.steps, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    rows, regressions = compare(cases, baseline, args.tolerance)
+    print_table(rows, ['case', 'median s', 'bytes', 'peak MB', 'vs baseline', 'status'])
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump(cases, file, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{regressions} regression(s) against {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
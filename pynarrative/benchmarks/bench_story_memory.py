@@ -0,0 +1,74 @@
+"""
+Memory per story benchmark.
+
+Builds many stories on the same data, as a report build keeps them in memory,
+and reports the memory allocated per story (measured with tracemalloc) for a
+bare Story, a Story with title, context and source layers, the layer records
+of such a story alone, and the same layers stored as dictionaries (their
+former representation).
+
+Usage: python benchmarks/bench_story_memory.py [stories]
+"""
+import sys
+import tracemalloc
+
+import pandas as pd
+
+from common import print_table
+from pynarrative import Story
+
+DATA = pd.DataFrame({'x': [1, 2, 3], 'y': [4, 5, 6]})
+
+
+def bare_story():
+    return Story(DATA).mark_line().encode(x='x:Q', y='y:Q')
+
+
+def text_story():
+    return (bare_story()
+            .add_title("Title", "Subtitle")
+            .add_context("Context")
+            .add_source("Source: benchmark"))
+
+
+def records():
+    return text_story().story_layers
+
+
+def dictionaries():
+    return [dict(layer) for layer in records()]
+
+
+CASES = {
+    'Story': bare_story,
+    'Story with 3 text layers': text_story,
+    '3 layer records': records,
+    '3 layer dictionaries': dictionaries,
+}
+
+
+def bytes_per_object(build, count):
+    """
+    Returns the memory allocated per object still alive after building count
+    objects, in bytes.
+    """
+    # One object built beforehand, so that one-time allocations (shared
+    # themes, caches of Altair) are not counted
+    build()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        objects = [build() for _ in range(count)]
+        size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del objects
+    return size / count
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rows = []
+    for case, build in CASES.items():
+        rows.append({'case': case, 'bytes per story': bytes_per_object(build, count)})
+    print_table(rows, ['case', 'bytes per story'])
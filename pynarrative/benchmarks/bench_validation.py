@@ -0,0 +1,58 @@
+"""
+Schema validation benchmark.
+
+Builds stories of the same structure (title, context, source, annotations and
+next-step charts) for different data and texts, as a server would for each
+request, and reports the mean time per story of the schema validation and of
+the whole to_json() with validation 'always', 'once' and 'never'.
+
+Usage: python benchmarks/bench_validation.py [stories] [annotations]
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import measure, print_table
+from pynarrative import Story
+from pynarrative.validation import clear_validated, validate_spec
+
+
+def build(index, annotations):
+    rng = np.random.default_rng(index)
+    data = pd.DataFrame({'x': np.arange(200), 'y': rng.random(200)})
+    story = (Story(data).mark_line().encode(x='x:Q', y='y:Q')
+             .add_title(f"Sales of store {index}", "Last 200 days")
+             .add_context("Context").add_source("Source: benchmark"))
+    for point in range(annotations):
+        story.add_annotation(point * 10 + index % 10, float(data['y'][point * 10]), f"Note {point}")
+    story.add_next_steps(mode='line_steps', texts=["Compare", "Forecast", "Share"], position='right')
+    story.add_next_steps(mode='button', text="More", url='https://example.com')
+    return story
+
+
+def main(stories=5, annotations=8):
+    built = [build(index, annotations) for index in range(stories)]
+    # Serialization without validation, the same in every mode
+    serialize = statistics.mean(measure(lambda: story.to_json(validate=False), repeat=3)['min']
+                                for story in built)
+    specs = [(story.render(), story._to_dict(validate=False)[0]) for story in built]
+    results = []
+    for validation in ('always', 'once', 'never'):
+        clear_validated()
+        times = []
+        for chart, spec in specs:
+            # 'once' validates the first story only: the others have its structure
+            start = time.perf_counter()
+            validate_spec(chart, spec, validation)
+            times.append(time.perf_counter() - start)
+        validate = statistics.mean(times)
+        results.append({'validation': validation, 'validate ms': validate * 1e3,
+                        'to_json ms': (serialize + validate) * 1e3})
+    print_table(results, ['validation', 'validate ms', 'to_json ms'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
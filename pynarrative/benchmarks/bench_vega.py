@@ -0,0 +1,76 @@
+"""
+Compiled Vega benchmark.
+
+Estimates the client-side time to first paint of a heavily layered story
+shipped as Vega-Lite (compiled to Vega by the client, then drawn) against
+the same story shipped as compiled Vega (drawn directly), by building the
+scenegraph with the Vega and Vega-Lite engines of vl-convert, and the size of
+each payload. Also reports the server-side cost of the compilation in
+to_vega(), for the first story of a structure and for stories with other
+data, which reuse its cached compilation.
+
+Usage: python benchmarks/bench_vega.py [annotations] [rows]
+"""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import vl_convert
+
+from common import measure, print_table
+from pynarrative import Story
+from pynarrative.vega import clear_compiled, compile_vega, compiled_count
+
+
+def build(index, annotations, rows):
+    rng = np.random.default_rng(index)
+    data = pd.DataFrame({'x': np.arange(rows), 'y': rng.random(rows)})
+    story = (Story(data).mark_line().encode(x='x:Q', y='y:Q')
+             .add_title("Sales of the store", "Daily sales")
+             .add_context("Context").add_source("Source: benchmark"))
+    for point in range(annotations):
+        story.add_annotation(point * rows // annotations, float(data['y'][point]), f"Note {point}")
+    story.add_next_steps(mode='line_steps', texts=["Compare", "Forecast", "Share"], position='right')
+    story.add_next_steps(mode='stair_steps', texts=["Compare", "Forecast", "Share"], position='bottom')
+    return story
+
+
+def main(annotations=12, rows=500):
+    story = build(0, annotations, rows)
+    vegalite = story.to_dict()
+    vega = story.to_vega()
+    # The engines are loaded by the first conversion
+    vl_convert.vegalite_to_scenegraph(vegalite)
+
+    # Compilation only, from the specifications without data
+    spec, datasets = story._to_dict(validate=False)
+    others = [build(index, annotations, rows)._to_dict(validate=False) for index in range(1, 4)]
+
+    def compile_new():
+        clear_compiled()
+        compile_vega(spec, datasets)
+
+    def compile_cached():
+        for other in others:
+            compile_vega(*other)
+
+    compile_vega(spec, datasets)
+    compile_cached()
+    assert compiled_count() == 1, "the stories should differ only by their data"
+    results = [
+        {'case': 'client: Vega-Lite (compile + draw)',
+         'ms': measure(lambda: vl_convert.vegalite_to_scenegraph(vegalite))['min'] * 1e3,
+         'bytes': len(json.dumps(vegalite))},
+        {'case': 'client: compiled Vega (draw)',
+         'ms': measure(lambda: vl_convert.vega_to_scenegraph(vega))['min'] * 1e3,
+         'bytes': len(json.dumps(vega))},
+        {'case': 'server: compile, new structure', 'ms': measure(compile_new)['min'] * 1e3},
+        {'case': 'server: compile, cached structure',
+         'ms': measure(compile_cached)['min'] / len(others) * 1e3},
+    ]
+    print_table(results, ['case', 'ms', 'bytes'])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
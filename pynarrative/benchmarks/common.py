@@ -0,0 +1,50 @@
+"""
+Helpers shared by the pynarrative benchmarks.
+
+Each benchmark is a standalone script (run it with `python benchmarks/<name>.py`
+from the pynarrative directory) printing one table of results.
+"""
+import statistics
+import time
+
+
+def measure(function, repeat=5, number=1):
+    """
+    Times a function.
+
+    Parameters:
+    - function: Callable without arguments
+    - repeat: Number of measurements (default: 5)
+    - number: Calls per measurement (default: 1)
+
+    Returns:
+    - Dictionary with the minimum, median and maximum time per call in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return {'min': min(times), 'median': statistics.median(times), 'max': max(times)}
+
+
+def print_table(rows, columns):
+    """
+    Prints a list of dictionaries as an aligned text table.
+
+    Parameters:
+    - rows: List of dictionaries
+    - columns: Keys to print, in order
+    """
+    def fmt(value):
+        if isinstance(value, float):
+            return f"{value:.6g}"
+        return str(value)
+
+    cells = [[fmt(row.get(column, '')) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    print('  '.join('-' * width for width in widths))
+    for row in cells:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
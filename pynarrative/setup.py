@@ -8,6 +8,9 @@ setup(
     install_requires=[
         'altair',  # Dipendenza necessaria per il pacchetto
     ],
+    entry_points={
+        'console_scripts': ['pynarrative=pynarrative.__main__:main'],  # Comando `pynarrative serve`
+    },
     author='Roberto Olinto Barsotti',
     author_email='robeolinto.barsotti@gmail.com',
     description='Una libreria per creare visualizzazioni narrative con Altair',
@@ -16,5 +19,5 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',  # Versione minima di Python
+    python_requires='>=3.7',  # Versione minima di Python (import lazy, PEP 562)
 )
@@ -1,4 +1,52 @@
-from .story import Story, story
+import importlib
+import sys
+import types
 
+__all__ = ['Story', 'StoryTemplate', 'story', 'warmup', 'set_tracer', 'render_many', 'export_many',
+           'shared_data', 'set_executor', 'set_json_backend']
 
-__all__ = ['Story', 'story']
\ No newline at end of file
+# Public names and the submodules defining them. Submodules, and with them
+# altair and pandas, are only imported when one of their names is first used,
+# so that `import pynarrative` stays cheap
+_LAZY_NAMES = {
+    'Story': 'story',
+    'StoryTemplate': 'story',
+    'story': 'story',
+    'warmup': 'story',
+    'set_tracer': 'story',
+    'render_many': 'batch',
+    'export_many': 'export',
+    'shared_data': 'sharing',
+    'set_executor': 'aio',
+    'set_json_backend': 'jsonio',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name = _LAZY_NAMES[name]
+    module = importlib.import_module('.' + module_name, __name__)
+    # Importing the submodule binds its name on the package (e.g. 'story'),
+    # so every name it provides is bound explicitly afterwards
+    for lazy_name, lazy_module in _LAZY_NAMES.items():
+        if lazy_module == module_name:
+            globals()[lazy_name] = getattr(module, lazy_name)
+    return globals()[name]
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule (e.g. `from pynarrative.story import Story`)
+        # binds it on the package: a public name of the same module, such as
+        # the story() function, keeps the attribute instead
+        if name in _LAZY_NAMES and isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,39 @@
+"""
+Command line interface of pynarrative.
+
+Usage: pynarrative serve [PATH ...] [--host HOST] [--port PORT] [--cache-size N] [--compiled] [--verbose]
+(or python -m pynarrative serve ...)
+"""
+import argparse
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pynarrative')
+    commands = parser.add_subparsers(dest='command')
+
+    serve_parser = commands.add_parser(
+        'serve', help="serve the Vega-Lite JSON and HTML of stories over HTTP")
+    serve_parser.add_argument(
+        'paths', nargs='*', metavar='PATH',
+        help="saved story (.pns), Python file defining stories, or directory of them")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument('--port', type=int, default=8000, help="port to listen on (default: 8000)")
+    serve_parser.add_argument('--cache-size', type=int, default=128,
+                              help="maximum number of cached responses (default: 128)")
+    serve_parser.add_argument('--compiled', action='store_true',
+                              help="embed compiled Vega rather than Vega-Lite in the HTML pages")
+    serve_parser.add_argument('--verbose', action='store_true', help="log every request")
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        from .serve import serve
+        serve(args.paths, host=args.host, port=args.port, cache_size=args.cache_size,
+              verbose=args.verbose, compiled=args.compiled)
+        return 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Executor running the work of the coroutines (see set_executor); created on
+# first use if none is set
+_executor = None
+
+# Maximum number of stories rendered at a time; None for the number of
+# workers of the executor
+_max_concurrency = None
+
+# Semaphore of each running event loop, created on first use: asyncio
+# primitives cannot be shared between loops
+_limiters = weakref.WeakKeyDictionary()
+
+_lock = threading.Lock()
+
+
+def set_executor(executor=None, max_concurrency=None):
+    """
+    Sets the executor running the work of Story.arender(), Story.ato_json() and
+    Story.aexport(), and the number of stories rendered at a time.
+
+    Rendering and serializing a story is CPU-bound: the coroutines run it in
+    the executor, so that the event loop keeps serving other requests. With
+    threads (the default), the loop stays responsive but stories share the
+    GIL; a process pool renders stories in parallel, at the cost of pickling
+    each story to a worker (see shared_data() for large DataFrames) and
+    without reusing the render cache of the story between calls.
+
+    Calls beyond max_concurrency wait, in order, for a slot before their work
+    is submitted to the executor, so that a burst of requests cannot queue
+    unbounded work. A slot is released only when the work has stopped, even
+    if the call was cancelled or timed out while it was running.
+
+    Parameters:
+    - executor: concurrent.futures Executor, 'thread' for a thread pool or
+      'process' for a process pool of one worker per CPU, or None for the
+      default thread pool (default: None)
+    - max_concurrency: Maximum number of stories rendered at a time
+      (default: the number of workers of the executor)
+
+    Returns:
+    - The previously set executor, or None
+    """
+    if not (executor is None or executor in ('thread', 'process') or isinstance(executor, Executor)):
+        raise ValueError("executor must be an Executor, 'thread', 'process' or None")
+    if not (max_concurrency is None or (isinstance(max_concurrency, int) and max_concurrency >= 1)):
+        raise ValueError("max_concurrency must be None or a positive integer")
+    global _executor, _max_concurrency
+    if executor == 'thread':
+        executor = ThreadPoolExecutor(os.cpu_count() or 1, thread_name_prefix='pynarrative')
+    elif executor == 'process':
+        # Spawned rather than forked, as for export_many()
+        import multiprocessing
+        executor = ProcessPoolExecutor(os.cpu_count() or 1,
+                                       mp_context=multiprocessing.get_context('spawn'))
+    with _lock:
+        previous, _executor = _executor, executor
+        _max_concurrency = max_concurrency
+        _limiters.clear()
+    return previous
+
+
+def get_executor():
+    """
+    Returns the executor set with set_executor(), creating the default thread
+    pool if none is set.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(os.cpu_count() or 1, thread_name_prefix='pynarrative')
+        return _executor
+
+
+async def run(function, *args, executor=None, timeout=None, **kwargs):
+    """
+    Runs function(*args, **kwargs) in the executor, within the concurrency
+    limit, and returns its result.
+
+    Parameters:
+    - function: Callable; picklable (e.g. defined at module level) with a
+      process pool
+    - executor: Executor used instead of the one set with set_executor(),
+      still counted in the shared concurrency limit (optional)
+    - timeout: Maximum time in seconds, waiting for a slot included; raises
+      asyncio.TimeoutError when exceeded (default: None, no limit)
+
+    Returns:
+    - Result of the function
+    """
+    if timeout is None:
+        return await _run(function, args, kwargs, executor)
+    return await asyncio.wait_for(_run(function, args, kwargs, executor), timeout)
+
+
+async def _run(function, args, kwargs, executor):
+    loop = asyncio.get_running_loop()
+    executor = executor or get_executor()
+    limiter = _limiter(loop)
+    await limiter.acquire()
+    try:
+        future = executor.submit(functools.partial(function, *args, **kwargs))
+    except BaseException:
+        limiter.release()
+        raise
+    # The slot is released when the work has stopped, rather than when this
+    # coroutine ends: a cancelled call leaves running work behind, which
+    # still occupies a worker
+    future.add_done_callback(lambda _: _release(loop, limiter))
+    # Cancelling the returned future cancels the work if it has not started
+    return await asyncio.wrap_future(future)
+
+
+def _limiter(loop):
+    """
+    Returns the semaphore limiting the concurrency on an event loop.
+    """
+    with _lock:
+        limiter = _limiters.get(loop)
+        if limiter is None:
+            limit = _max_concurrency
+            if limit is None:
+                limit = getattr(_executor, '_max_workers', None) or os.cpu_count() or 1
+            limiter = _limiters[loop] = asyncio.Semaphore(limit)
+        return limiter
+
+
+def _release(loop, limiter):
+    """
+    Releases a slot of the semaphore, from any thread.
+    """
+    try:
+        loop.call_soon_threadsafe(limiter.release)
+    except RuntimeError:
+        pass  # The loop is closed, and its semaphore with it
+
+
+def _render(story, precompute):
+    return story.render(precompute=precompute)
+
+
+def _to_json(story, validate, indent, sort_keys, kwargs):
+    return story.to_json(validate=validate, indent=indent, sort_keys=sort_keys, **kwargs)
+
+
+def _export(story, format, path, options):
+    from .export import _convert, _to_spec
+    return _convert(0, _to_spec(story), format, path, options)[1]
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from .jsonio import dumps
+from .story import StoryTemplate
+
+
+def render_many(template, items, data=None, by=None, processes=None, chunksize=16,
+                ordered=True, output='json', max_tasks_per_child=None,
+                max_worker_memory=None):
+    """
+    Renders one story per item, across a pool of worker processes.
+
+    The template is called once per item with the item's parameters as keyword
+    arguments and must return a Story. It is sent to the workers by pickling, so
+    it has to be defined at module level (a lambda or a nested function cannot
+    be used).
+
+    The template can also be a StoryTemplate (see Story.compile()): each item is
+    then bound to it, which avoids building and rendering a Story per item.
+
+    Stories are converted with Story.to_json() or Story.to_dict(), and so
+    validated as set by their validation setting; the specifications bound to
+    a StoryTemplate are encoded as Story.to_json() does.
+
+    Results are streamed: they are yielded as soon as they are available,
+    while the following chunks are still being rendered.
+
+    Parameters:
+    - template: Callable returning a Story, e.g. `def build(data, title): ...`,
+      or a StoryTemplate whose bind() receives the item's parameters
+    - items: Iterable of dictionaries of keyword arguments for the template,
+      or a DataFrame with one row (and one column per argument) per item
+    - data: DataFrame to be split into per-item slices (optional)
+    - by: Column of `data` (and key of the items) identifying the slice of each
+      item; the slice is passed to the template as its `data` argument
+    - processes: Number of worker processes (default: number of CPUs);
+      0 renders in the current process, which is useful for debugging
+    - chunksize: Number of items sent to a worker at a time (default: 16)
+    - ordered: If True, results are yielded in the order of the items,
+      otherwise as soon as each one is ready (default: True)
+    - output: 'json' for the Vega-Lite JSON string, 'dict' for the
+      specification as a dictionary (default: 'json')
+    - max_tasks_per_child: Number of chunks after which a worker is replaced
+      by a fresh process, releasing the memory it accumulated (optional)
+    - max_worker_memory: Maximum address space of each worker in bytes
+      (optional, POSIX only); a worker exceeding it fails with MemoryError
+
+    Returns:
+    - Generator of (index, result) tuples, index being the position of the item
+    """
+    if output not in ('json', 'dict'):
+        raise ValueError("output must be either 'json' or 'dict'")
+    if max_worker_memory is not None and resource is None:
+        raise ValueError("max_worker_memory is not supported on this platform")
+    if (data is None) != (by is None):
+        raise ValueError("'data' and 'by' must be given together")
+
+    jobs = enumerate(_iter_params(items, data, by))
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes == 0:
+        for job in jobs:
+            yield _render_job(template, output, job)
+        return
+
+    # The template is sent once to each worker, rather than with every chunk:
+    # a StoryTemplate carries a whole specification
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(max_worker_memory, template),
+                              maxtasksperchild=max_tasks_per_child) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(_JobRenderer(output), jobs, chunksize):
+            yield result
+
+
+def _iter_params(items, data, by):
+    """
+    Yields the keyword arguments of the template for every item.
+    """
+    if hasattr(items, 'to_dict') and hasattr(items, 'columns'):
+        items = items.to_dict(orient='records')
+
+    if data is None:
+        yield from items
+        return
+
+    # The data is split once, rather than filtered once per item
+    slices = dict(iter(data.groupby(by, sort=False)))
+    empty = data.iloc[0:0]
+    for params in items:
+        yield dict(params, data=slices.get(params[by], empty))
+
+
+class _JobRenderer:
+    """
+    Picklable callable rendering one (index, params) job in a worker, with the
+    template received by _init_worker.
+    """
+
+    def __init__(self, output):
+        self.output = output
+
+    def __call__(self, job):
+        return _render_job(_worker_template, self.output, job)
+
+
+def _render_job(template, output, job):
+    index, params = job
+    if isinstance(template, StoryTemplate):
+        spec = template.bind(**params)
+        return index, dumps(spec, indent=2, sort_keys=True) if output == 'json' else spec
+    story = template(**params)
+    return index, story.to_json() if output == 'json' else story.to_dict()
+
+
+# Template of the current worker process, set by _init_worker
+_worker_template = None
+
+
+def _init_worker(max_worker_memory, template):
+    """
+    Initialises a worker process, capping its memory if requested.
+    """
+    global _worker_template
+    _worker_template = template
+    if max_worker_memory is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (max_worker_memory, hard))
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import math
+
+# Largest number of distinct strings of a dictionary-encoded column
+MAX_CATEGORIES = 1000
+
+# Largest magnitude of the integers written by compact frames: beyond 2^53,
+# JavaScript numbers no longer hold every integer exactly
+MAX_SAFE_INTEGER = 2 ** 53
+
+# Minimum number of rows per distinct string of a dictionary-encoded column:
+# below it, the dictionary would save little
+MIN_REPEATS = 4
+
+
+def significant_digits(width, height):
+    """
+    Returns the number of significant digits that keeps values exact to less
+    than a pixel on a chart of the given size.
+
+    A value rounded to d significant digits of the extent of its column is
+    off by at most half of 10^(1-d) of that extent, i.e. under half a pixel
+    as long as 10^(d-1) exceeds the number of pixels of the longest axis.
+
+    Parameters:
+    - width, height: Size of the chart in pixels (non-numeric sizes, such as
+      'container', count as 600)
+
+    Returns:
+    - Number of significant digits
+    """
+    pixels = max(size if isinstance(size, (int, float)) else 600 for size in (width, height))
+    return int(math.floor(math.log10(max(pixels, 1)))) + 2
+
+
+def compact_frame(frame, digits, dictionary=True):
+    """
+    Converts the columns of a DataFrame to more compact JSON values.
+
+    - Floats are rounded to `digits` significant digits of the extent of their
+      column, and written as integers when no decimal remains (and they
+      are within +/-2^53)
+    - Datetimes are written as milliseconds since the epoch (UTC), which
+      Vega-Lite reads as timestamps; naive datetimes are taken as UTC
+    - Columns of few distinct strings are replaced by their index in a list
+      of the strings; the list is returned as a small dataset of {code, value}
+      rows, along with the transforms decoding the column by looking the
+      codes up in it
+
+    Polars and Arrow frames are converted to pandas first.
+
+    Parameters:
+    - frame: DataFrame
+    - digits: Number of significant digits of floats (see significant_digits)
+    - dictionary: Whether strings are dictionary-encoded (default: True)
+
+    Returns:
+    - Tuple (frame, decoders, dictionaries): the converted DataFrame (the same
+      object if no column changed), the list of Vega-Lite transforms restoring
+      the strings, to be applied first by the charts reading it, and the
+      dictionary {name: rows} of the datasets these transforms look up
+    """
+    import pandas as pd
+
+    if not isinstance(frame, pd.DataFrame):
+        frame = frame.to_pandas()  # Polars, Arrow
+    columns = {}
+    decoders = []
+    dictionaries = {}
+    for name, column in frame.items():
+        if pd.api.types.is_float_dtype(column.dtype):
+            converted = _round(column, digits)
+        elif pd.api.types.is_datetime64_any_dtype(column.dtype):
+            converted = _epoch(column)
+        elif dictionary and isinstance(name, str) and _is_text(column):
+            converted, decoder, dictionary_name, rows = _dictionary(name, column)
+            if decoder is not None:
+                decoders.extend(decoder)
+                dictionaries[dictionary_name] = rows
+        else:
+            continue
+        if converted is not column:
+            columns[name] = converted
+    if columns:
+        frame = frame.copy(deep=False)
+        for name, column in columns.items():
+            frame[name] = column
+    return frame, decoders, dictionaries
+
+
+def _round(column, digits):
+    """
+    Rounds a float column to digits significant digits of its extent.
+    """
+    import numpy as np
+
+    values = column.to_numpy(dtype='float64', na_value=np.nan)
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return column
+    extent = float(finite.max() - finite.min()) or float(np.abs(finite).max())
+    if extent == 0:
+        return column  # Only zeros
+    decimals = digits - 1 - int(math.floor(math.log10(extent)))
+    rounded = column.round(decimals)
+    if (decimals <= 0 and len(finite) == len(values)
+            and -MAX_SAFE_INTEGER <= finite.min() and finite.max() <= MAX_SAFE_INTEGER):
+        # Integers are written without the trailing '.0'; larger values stay
+        # floats, which int64 (and JavaScript) could not hold
+        return rounded.astype('int64')
+    return rounded
+
+
+def _epoch(column):
+    """
+    Converts a datetime column to milliseconds since the epoch.
+    """
+    if column.dt.tz is not None:
+        column = column.dt.tz_convert('UTC').dt.tz_localize(None)
+    missing = column.isna()
+    milliseconds = column.astype('datetime64[ms]').astype('int64')
+    if missing.any():
+        milliseconds = milliseconds.astype('Int64').mask(missing)
+    return milliseconds
+
+
+def _is_text(column):
+    """
+    Checks whether a column holds strings (and missing values) only.
+    """
+    import pandas as pd
+
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        values = pd.Series(column.cat.categories)
+    elif pd.api.types.is_object_dtype(column.dtype) or pd.api.types.is_string_dtype(column.dtype):
+        values = column.dropna()
+    else:
+        return False
+    return len(values) > 0 and values.map(type).eq(str).all()
+
+
+def _dictionary(name, column):
+    """
+    Dictionary-encodes a column of strings, if it has few distinct values.
+
+    The strings are decoded by a lookup transform into the dataset of the
+    categories, read once by Vega, rather than by indexing a list literal in
+    an expression evaluated for every row.
+
+    Returns:
+    - Tuple (column, decoder, name, rows): the column of codes, the transforms
+      restoring the strings, and the name and rows of the dataset of the
+      categories; or the column itself and three Nones
+    """
+    import pandas as pd
+
+    codes, categories = pd.factorize(column)
+    if len(categories) > MAX_CATEGORIES or len(categories) * MIN_REPEATS > len(column):
+        return column, None, None, None
+    encoded = pd.Series(codes, index=column.index)
+    if (codes < 0).any():
+        encoded = encoded.astype('Int64').mask(codes < 0)
+    rows = [{'code': code, 'value': str(value)} for code, value in enumerate(categories)]
+    dictionary = 'dictionary-' + hashlib.sha256(json.dumps(rows).encode('utf-8')).hexdigest()[:32]
+    decoded = name + '__decoded'
+    field = 'datum[' + json.dumps(name) + ']'
+    decoder = [
+        # Field names of lookup are paths: dots and brackets are escaped
+        {'lookup': _escape(name),
+         'from': {'data': {'name': dictionary}, 'key': 'code', 'fields': ['value']},
+         'as': [decoded]},
+        # Values that are not codes (e.g. data bound to a compiled story later)
+        # are left as they are
+        {'calculate': f"isNumber({field}) ? datum[{json.dumps(decoded)}] : {field}", 'as': name},
+    ]
+    return encoded, decoder, dictionary, rows
+
+
+def _escape(name):
+    """
+    Escapes the characters of a column name that Vega-Lite reads as a path.
+    """
+    for char in '\\.[]':
+        name = name.replace(char, '\\' + char)
+    return name
@@ -0,0 +1,214 @@
+import json
+
+import altair as alt
+
+from .projection import column_projection
+
+# Vega-Lite transform operations, each named by the key of its definition
+TRANSFORMS = (
+    'aggregate', 'bin', 'calculate', 'density', 'extent', 'filter', 'flatten', 'fold',
+    'impute', 'joinaggregate', 'loess', 'lookup', 'pivot', 'quantile', 'regression',
+    'sample', 'stack', 'timeUnit', 'window',
+)
+
+# Encoding properties computed by Vega-Lite before drawing the marks
+ENCODING_TRANSFORMS = ('aggregate', 'bin', 'timeUnit')
+
+# Marks drawn as a connected path, which max_points can downsample
+PATH_MARKS = ('line', 'area', 'trail')
+
+# Number of rows above which a dataset is considered large, as in Altair's
+# default limit of rows embedded in a specification
+LARGE_ROWS = 5000
+
+
+def explain_cost(story, precompute=False, large_rows=LARGE_ROWS):
+    """
+    Reports where the bytes and marks of a rendered story come from.
+
+    See Story.explain_cost().
+    """
+    from .story import _LAYER_DISPATCH, _is_frame
+
+    spec_bytes = len(story.render(precompute).to_json(validate=False).encode('utf-8'))
+
+    # Charts of the layers, as render() builds them
+    charts = [('main', 'main', _main_chart(story, precompute))]
+    for index, layer in enumerate(story.story_layers):
+        placement, builder = _LAYER_DISPATCH.get(layer['type'], (None, None))
+        if placement == 'text':
+            chart = getattr(story, builder)(layer)
+        elif placement is not None:
+            chart = layer['chart']
+        else:
+            continue
+        charts.append((index, layer['type'], chart))
+
+    layers = []
+    datasets = {}
+    hotspots = []
+    projection = column_projection(chart for _, _, chart in charts)
+    for index, layer_type, chart in charts:
+        # The charts are named as in render(), so that their datasets carry
+        # the names used in the specification
+        named, used, _ = story._name_datasets(chart, projection)
+        for name, values in used.items():
+            dataset = datasets.setdefault(name, {
+                'rows': len(values),
+                'bytes': len(json.dumps(values, default=str).encode('utf-8')),
+                'layers': [],
+            })
+            dataset['layers'].append(index)
+
+        record = {
+            'layer': index,
+            'type': layer_type,
+            'datasets': sorted(used),
+            'rows': sum(datasets[name]['rows'] for name in used),
+            'bytes': sum(datasets[name]['bytes'] for name in used),
+            'marks': 0,
+            'transforms': [],
+        }
+        for leaf, data, rows in _leaves(chart, named, used, None, None, _is_frame):
+            marks, transforms = _leaf_cost(leaf, data, rows)
+            record['marks'] += marks
+            record['transforms'].extend(transforms)
+            hotspots.extend(_hotspots(story, index, leaf, data, marks, rows, transforms, large_rows))
+        layers.append(record)
+
+    # Datasets read by several layers are stored once in the specification
+    duplicates = [
+        {'dataset': name, 'layers': dataset['layers'],
+         'bytes_saved': dataset['bytes'] * (len(dataset['layers']) - 1)}
+        for name, dataset in datasets.items() if len(dataset['layers']) > 1
+    ]
+    return {
+        'spec_bytes': spec_bytes,
+        'marks': sum(layer['marks'] for layer in layers),
+        'layers': layers,
+        'datasets': datasets,
+        'duplicates': duplicates,
+        'hotspots': hotspots,
+    }
+
+
+def _main_chart(story, precompute):
+    """
+    Returns the main chart of a story, precomputed and downsampled as by render().
+    """
+    chart = story.chart
+    if precompute:
+        from .precompute import precompute_chart
+        chart = precompute_chart(chart)
+    max_points = story._max_points()
+    if max_points is not None:
+        from .downsample import downsample_chart
+        chart = downsample_chart(chart, max_points, story.downsample)
+    return chart
+
+
+def _leaves(node, named, used, data, rows, is_frame):
+    """
+    Yields (chart, data, rows) for each single-view chart of a layered or
+    concatenated chart, with the data it reads (its own or its parent's) and
+    the number of rows of that data, if known.
+
+    named is the same chart with its datasets replaced by names, whose values
+    are given by used.
+    """
+    own = getattr(node, 'data', alt.Undefined)
+    if own is not alt.Undefined:
+        data = own
+        name = getattr(getattr(named, 'data', None), 'name', None)
+        if name in used:
+            rows = len(used[name])
+        elif isinstance(own, alt.InlineData) and isinstance(own.values, list):
+            rows = len(own.values)
+        elif is_frame(own):
+            rows = len(own)
+        else:
+            rows = None  # URL or other data only known to Vega
+    if isinstance(node, alt.Chart):
+        yield node, data, rows
+        return
+    for key in ('layer', 'hconcat', 'vconcat', 'concat'):
+        children = getattr(node, key, alt.Undefined)
+        named_children = getattr(named, key, alt.Undefined)
+        if children is not alt.Undefined:
+            for child, named_child in zip(children, named_children):
+                yield from _leaves(child, named_child, used, data, rows, is_frame)
+
+
+def _leaf_cost(chart, data, rows):
+    """
+    Returns the number of marks drawn by a single-view chart and the
+    transforms Vega-Lite runs for it in the browser.
+    """
+    transforms = []
+    if chart.transform is not alt.Undefined:
+        for transform in chart.transform:
+            if hasattr(transform, 'to_dict'):
+                transform = transform.to_dict(validate=False)
+            transforms.append(next((kind for kind in TRANSFORMS if kind in transform), 'unknown'))
+    for channel, definition in _channels(chart, data).items():
+        if isinstance(definition, dict):
+            transforms.extend(
+                f'{key}:{channel}' for key in ENCODING_TRANSFORMS if definition.get(key)
+            )
+
+    marks = rows or 0
+    if transforms:
+        # The number of marks is exact when pandas can compute the transforms,
+        # otherwise it is the number of rows the transforms receive
+        from .precompute import precompute_chart
+        from .story import _shallow_copy
+        chart = _shallow_copy(chart)
+        chart.data = data
+        result = precompute_chart(chart)
+        if result is not chart and result.transform is alt.Undefined:
+            if not any(isinstance(definition, dict) and definition.get('aggregate')
+                       for definition in _channels(result, result.data).values()):
+                marks = len(result.data)
+    return marks, transforms
+
+
+def _channels(chart, data):
+    """
+    Returns the encoding of a chart as a dictionary, or an empty one.
+    """
+    if chart.encoding is alt.Undefined:
+        return {}
+    context = {'data': data} if data is not None and data is not alt.Undefined else {}
+    try:
+        return chart.encoding.to_dict(validate=False, context=context)
+    except ValueError:
+        return {}
+
+
+def _hotspots(story, index, chart, data, marks, rows, transforms, large_rows):
+    """
+    Returns the known hot spots of a single-view chart.
+    """
+    mark = chart.mark if isinstance(chart.mark, str) else getattr(chart.mark, 'type', None)
+    channels = _channels(chart, data)
+    hotspots = []
+    if mark == 'text' and marks > 1 and not any(
+            isinstance(definition, dict) and 'field' in definition for definition in channels.values()):
+        # The same text is drawn once per row
+        hotspots.append({
+            'layer': index, 'kind': 'text-overlay-full-data', 'marks': marks,
+            'message': f"text drawn {marks} times from the rows of its data; "
+                       "use constant_overlays=True or bind it to a single datum",
+        })
+    if transforms and rows is not None and rows > large_rows:
+        hotspots.append({
+            'layer': index, 'kind': 'client-side-transforms', 'rows': rows,
+            'message': f"{', '.join(transforms)} computed in the browser over {rows} rows; "
+                       "use render(precompute=True)",
+        })
+    if index == 'main' and mark in PATH_MARKS and story.max_points is None and marks > large_rows:
+        hotspots.append({
+            'layer': index, 'kind': 'dense-line', 'marks': marks,
+            'message': f"{mark} of {marks} points; use max_points to downsample it",
+        })
+    return hotspots
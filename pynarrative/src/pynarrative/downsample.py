@@ -0,0 +1,208 @@
+import math
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+# Marks drawn as a connected path, which can be downsampled
+LINE_MARKS = ('line', 'area', 'trail')
+
+# Channels splitting the data into separate series
+SERIES_CHANNELS = ('color', 'fill', 'stroke', 'detail', 'strokeDash', 'opacity', 'row', 'column', 'facet')
+
+METHODS = ('lttb', 'minmax')
+
+
+def downsample_chart(chart, max_points, method='lttb'):
+    """
+    Reduces the number of points of a line or area chart, series by series.
+
+    The x channel must be quantitative or temporal and the y channel a plain
+    quantitative field; series are identified by the fields of the color,
+    detail, strokeDash and similar channels. Charts with transforms, an order
+    channel, aggregated or binned channels, or stacked areas of several series
+    (whose points must share their x values) are left unchanged. Rows with
+    a missing y value, which break the line, are kept (see
+    downsample_positions).
+
+    Parameters:
+    - chart: An Altair chart
+    - max_points: Maximum number of points kept per series
+    - method: 'lttb' (Largest-Triangle-Three-Buckets, keeps the visual shape
+      of the line) or 'minmax' (keeps the minimum and maximum of each slice
+      of the x axis, so that no peak is lost) (default: 'lttb')
+
+    Returns:
+    - A copy of the chart with the downsampled data, or the chart itself if
+      it cannot be or does not need to be downsampled
+    """
+    if not isinstance(chart, alt.Chart) or not isinstance(chart.data, pd.DataFrame):
+        return chart
+    mark = chart.mark if isinstance(chart.mark, str) else getattr(chart.mark, 'type', None)
+    if mark not in LINE_MARKS or chart.transform is not alt.Undefined or chart.encoding is alt.Undefined:
+        return chart
+
+    data = chart.data
+    channels = chart.encoding.to_dict(validate=False, context={'data': data})
+    x, y = channels.get('x'), channels.get('y')
+    if not isinstance(x, dict) or not isinstance(y, dict) or 'order' in channels:
+        return chart
+    if x.get('type') not in ('quantitative', 'temporal') or y.get('type') != 'quantitative':
+        return chart
+
+    keys = []
+    for channel, definition in channels.items():
+        if not isinstance(definition, dict):
+            continue
+        if any(key in definition for key in ('aggregate', 'bin', 'timeUnit')):
+            return chart
+        field = definition.get('field')
+        if field is not None and field not in data.columns:
+            return chart
+        if channel in SERIES_CHANNELS and field is not None and field not in keys:
+            keys.append(field)
+    if x.get('field') is None or y.get('field') is None:
+        return chart
+    if mark == 'area' and keys and y.get('stack', 'zero') not in (None, False):
+        return chart
+    if len(data) <= max_points:
+        return chart
+
+    positions = downsample_positions(data, x['field'], y['field'], keys, max_points, method)
+    if len(positions) == len(data):
+        return chart
+
+    # Local import: story imports this module only when downsampling
+    from .story import _shallow_copy
+    chart = _shallow_copy(chart)
+    chart.data = data.iloc[positions]
+    return chart
+
+
+def downsample_positions(data, x, y, keys, max_points, method='lttb'):
+    """
+    Selects the rows kept by downsampling, series by series.
+
+    Rows with a missing y value break the line drawn by Vega-Lite: the first
+    row of each gap is kept, with the points on both sides of it so that
+    every piece of the line keeps its ends, in addition to the max_points
+    selected among the other points. Rows with a missing x value have no
+    place along the axis and are all kept.
+
+    Parameters:
+    - data: DataFrame
+    - x, y: Fields of the x and y values
+    - keys: Fields identifying the series (may be empty)
+    - max_points: Maximum number of points kept per series
+    - method: 'lttb' or 'minmax'
+
+    Returns:
+    - Sorted array of the positions of the rows kept
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    xs = data[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        # Nanoseconds since the epoch; missing dates become NaN
+        missing = xs.isna().to_numpy()
+        xs = xs.to_numpy(dtype='datetime64[ns]').view('int64').astype(float)
+        xs[missing] = np.nan
+    else:
+        xs = pd.to_numeric(xs, errors='coerce').to_numpy(dtype=float)
+    ys = pd.to_numeric(data[y], errors='coerce').to_numpy(dtype=float)
+
+    if keys:
+        series = data.groupby([data[key] for key in keys], dropna=False, sort=False, observed=True).indices.values()
+    else:
+        series = [np.arange(len(data))]
+
+    select = lttb if method == 'lttb' else minmax
+    kept = []
+    for positions in series:
+        no_x = np.isnan(xs[positions])
+        kept.append(positions[no_x])
+        # Points are selected along the x axis
+        positions = positions[~no_x]
+        positions = positions[np.argsort(xs[positions], kind='stable')]
+        missing = np.isnan(ys[positions])
+        valid = positions[~missing]
+        kept.append(valid[select(xs[valid], ys[valid], max_points)])
+        if missing.any():
+            # Each gap keeps its first row, and the points before and after it
+            first = np.flatnonzero(missing & ~np.concatenate(([False], missing[:-1])))
+            last = np.flatnonzero(missing & ~np.concatenate((missing[1:], [False])))
+            edges = np.concatenate((first - 1, first, last + 1))
+            kept.append(positions[edges[(edges >= 0) & (edges < len(positions))]])
+    return np.unique(np.concatenate(kept)) if kept else np.arange(0)
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Parameters:
+    - x, y: Arrays of the coordinates, sorted by x
+    - threshold: Number of points to keep
+
+    Returns:
+    - Array of the indices of the points kept
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # The first and last points are always kept, the others are split into
+    # threshold - 2 buckets from each of which one point is selected
+    every = (n - 2) / (threshold - 2)
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # Average point of the next bucket
+        next_start = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        count = next_end - next_start
+        avg_x = (x_sums[next_end] - x_sums[next_start]) / count
+        avg_y = (y_sums[next_end] - y_sums[next_start]) / count
+
+        # Point of the current bucket forming the largest triangle with the
+        # previously selected point and the average of the next bucket
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax(x, y, threshold):
+    """
+    Min/max downsampling: the x range is split into slices of equal width,
+    and the lowest and highest points of each slice are kept, along with the
+    first and last points.
+
+    Parameters:
+    - x, y: Arrays of the coordinates, sorted by x
+    - threshold: Maximum number of points to keep
+
+    Returns:
+    - Sorted array of the indices of the points kept
+    """
+    n = len(x)
+    buckets = (threshold - 2) // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+
+    span = x[-1] - x[0]
+    bucket = np.zeros(n, dtype=np.int64)
+    if span > 0:
+        bucket = np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+    grouped = pd.Series(y).groupby(bucket, sort=False)
+    kept = np.union1d(grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy())
+    # The ends of the line are kept, so that it spans the same x range
+    return np.union1d(kept, [0, n - 1])
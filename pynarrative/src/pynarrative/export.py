@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+FORMATS = ('svg', 'png', 'pdf', 'jpeg')
+
+# Smallest specification converted by each worker on start, so that the
+# JavaScript engine of vl-convert is loaded before the first real story
+_WARMUP_SPEC = {'data': {'values': [{}]}, 'mark': 'point'}
+
+
+def export_many(stories, format='png', directory='.', workers=None, max_pending=None,
+                scale=1, ppi=72):
+    """
+    Exports stories to static image or PDF files, using a pool of worker
+    processes that each keep a warm vl-convert engine.
+
+    Stories are rendered in the current process while the workers convert the
+    previous ones; at most max_pending stories wait for conversion at a time,
+    so that a long or lazy iterable of stories is never rendered far ahead of
+    the workers. Each worker writes its file directly to disk.
+
+    Workers are started with the 'spawn' method, so scripts calling this
+    function must guard their entry point with `if __name__ == '__main__':`.
+
+    Parameters:
+    - stories: Iterable of Story objects, Altair charts or Vega-Lite
+      specifications (dictionaries), or of (name, story) pairs; files are named
+      after their position in the iterable unless a name is given
+    - format: 'svg', 'png', 'pdf' or 'jpeg' (default: 'png')
+    - directory: Directory where the files are written, created if needed
+      (default: current directory)
+    - workers: Number of worker processes (default: number of CPUs);
+      0 converts in the current process
+    - max_pending: Maximum number of rendered stories waiting for conversion
+      (default: twice the number of workers)
+    - scale: Scale factor of PNG and JPEG images (default: 1)
+    - ppi: Pixels per inch of PNG images (default: 72)
+
+    Returns:
+    - Generator of (index, path) tuples, in the order the files are finished
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    try:
+        import vl_convert  # noqa: F401
+    except ImportError:
+        raise ImportError("export_many requires the vl-convert-python package") from None
+
+    os.makedirs(directory, exist_ok=True)
+    options = {'scale': scale, 'ppi': ppi}
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    def jobs():
+        for index, item in enumerate(stories):
+            name = str(index)
+            if isinstance(item, tuple):
+                name, item = item
+            path = os.path.join(directory, f'{name}.{format}')
+            yield index, _to_spec(item), path
+
+    if workers == 0:
+        for index, spec, path in jobs():
+            yield _convert(index, spec, format, path, options)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * workers
+    # Workers are spawned rather than forked: a process where vl-convert has
+    # already run holds engine threads that a forked child would deadlock on
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_converter) as pool:
+        pending = set()
+        for index, spec, path in jobs():
+            pending.add(pool.submit(_convert, index, spec, format, path, options))
+            # Backpressure: stop rendering until a worker has finished a file
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def _to_spec(item):
+    """
+    Returns the Vega-Lite specification of a story, chart or specification.
+
+    Stories are validated as set by their validation setting.
+    """
+    if hasattr(item, 'to_dict'):
+        item = item.to_dict()
+    return item
+
+
+def _init_converter():
+    """
+    Initialises a worker process by loading the vl-convert engine.
+    """
+    import vl_convert
+    vl_convert.vegalite_to_svg(_WARMUP_SPEC)
+
+
+def _convert(index, spec, format, path, options):
+    import vl_convert
+
+    if format == 'svg':
+        content = vl_convert.vegalite_to_svg(spec).encode('utf-8')
+    elif format == 'png':
+        content = vl_convert.vegalite_to_png(spec, scale=options['scale'], ppi=options['ppi'])
+    elif format == 'jpeg':
+        content = vl_convert.vegalite_to_jpeg(spec, scale=options['scale'])
+    else:
+        content = vl_convert.vegalite_to_pdf(spec)
+
+    # Written under a temporary name first, so that a file at the final path
+    # is always complete
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(content)
+    os.replace(temporary, path)
+    return index, path
@@ -0,0 +1,345 @@
+import json
+import os
+import struct
+import threading
+import zlib
+
+import altair as alt
+
+from .layers import LAYER_TYPES, Theme
+
+# Version of the intermediate representation, increased on incompatible changes
+IR_VERSION = 1
+
+# First bytes of a saved story
+MAGIC = b'PYNSTORY'
+
+# Extension added to the path of a saved story for its data side file
+DATA_SUFFIX = '.data'
+
+# Keys of the sub-charts of layered and concatenated charts, and their classes
+CHILD_CLASSES = {
+    'layer': alt.LayerChart,
+    'hconcat': alt.HConcatChart,
+    'vconcat': alt.VConcatChart,
+    'concat': alt.ConcatChart,
+}
+
+# Keys of the specifications rebuilt with Altair's from_dict(), which the
+# direct rebuild does not handle
+FROM_DICT_KEYS = ('params', 'facet', 'repeat', 'spec')
+
+
+def to_ir(story):
+    """
+    Converts a story to its intermediate representation (IR).
+
+    The IR holds the Vega-Lite specification of the main chart and of the
+    charts of the layers, the fields of the other layers, the theme and the
+    settings of the story, as JSON values only. DataFrames are replaced by
+    references to the returned list of frames.
+
+    Parameters:
+    - story: Story object
+
+    Returns:
+    - Tuple (ir, frames): the IR dictionary and the list of DataFrames it
+      references, by position
+    """
+    frames = []
+    frame_names = {}  # id(frame) -> name
+    inline = {}
+
+    def data_name(data):
+        # DataFrames and inline values are replaced by names, so that the
+        # specification holds no data
+        from .story import _is_frame
+
+        if _is_frame(data):
+            name = frame_names.get(id(data))
+            if name is None:
+                name = frame_names[id(data)] = f'frame-{len(frames)}'
+                frames.append(data)
+            return name
+        if isinstance(data, alt.InlineData) or (isinstance(data, dict) and 'values' in data):
+            name = f'inline-{len(inline)}'
+            inline[name] = data.to_dict(validate=False) if isinstance(data, alt.InlineData) else data
+            return name
+        return None
+
+    def chart_ir(chart):
+        from .story import _is_frame, _resolve_encoding, _shallow_copy
+
+        def visit(node, inherited):
+            node = _shallow_copy(node)
+            data = getattr(node, 'data', alt.Undefined)
+            if data is not alt.Undefined:
+                name = data_name(data)
+                if name is not None:
+                    node.data = alt.NamedData(name=name)
+                inherited = data
+            if isinstance(node, alt.Chart):
+                if _is_frame(inherited):
+                    _resolve_encoding(node, inherited)
+                return node
+            for key in CHILD_CLASSES:
+                children = getattr(node, key, alt.Undefined)
+                if children is not alt.Undefined:
+                    setattr(node, key, [visit(child, inherited) for child in children])
+            return node
+
+        return visit(chart, None).to_dict(validate=False, context={'top_level': False})
+
+    layers = []
+    for layer in story.story_layers:
+        fields = {key: value for key, value in layer.items() if key != 'type'}
+        if fields.get('chart') is not None:
+            fields['chart'] = chart_ir(fields['chart'])
+        layers.append({'type': layer['type'], 'fields': fields})
+
+    theme = story.theme
+    ir = {
+        'version': IR_VERSION,
+        'story': {
+            'font': story.font,
+            'constant_overlays': story.constant_overlays,
+            'max_points': story.max_points,
+            'downsample': story.downsample,
+            'compact': story.compact,
+            'precision': story.precision,
+            'validation': story.validation,
+            'config': story.config,
+            'theme': {
+                'base_font_size': theme.base_font_size,
+                'font_sizes': dict(theme.font_sizes),
+                'colors': dict(theme.colors),
+            },
+        },
+        'chart': chart_ir(story.chart),
+        'layers': layers,
+        'inline': inline,
+    }
+    return ir, frames
+
+
+def from_ir(ir, frames, cls=None):
+    """
+    Builds a story from its intermediate representation (see to_ir).
+
+    Charts are rebuilt from their specifications directly, without the
+    validation and type inference of the builder methods.
+
+    Parameters:
+    - ir: IR dictionary
+    - frames: List of the DataFrames referenced by the IR
+    - cls: Class of the story (default: Story)
+
+    Returns:
+    - Story object
+    """
+    from .story import Story
+
+    version = ir.get('version')
+    if not isinstance(version, int) or version > IR_VERSION:
+        raise ValueError(f"Unsupported story version {version!r} (supported: up to {IR_VERSION})")
+
+    data = {f'frame-{index}': frame for index, frame in enumerate(frames)}
+    for name, values in ir.get('inline', {}).items():
+        data[name] = _schema_object(alt.InlineData, values)
+
+    settings = ir['story']
+    theme = settings['theme']
+    story = (cls or Story).__new__(cls or Story)
+    story.chart = _chart(ir['chart'], data, alt.Chart)
+    story.font = settings['font']
+    story.theme = Theme(theme['base_font_size'], theme['font_sizes'], theme['colors'])
+    story.constant_overlays = settings['constant_overlays']
+    story.max_points = settings['max_points']
+    story.downsample = settings['downsample']
+    story.compact = settings.get('compact', False)
+    story.precision = settings.get('precision', 'auto')
+    story.validation = settings.get('validation', 'always')
+    story.config = settings['config']
+    story.story_layers = []
+    for layer in ir['layers']:
+        fields = dict(layer['fields'])
+        if fields.get('chart') is not None:
+            fields['chart'] = _chart(fields['chart'], data)
+        record = LAYER_TYPES.get(layer['type'])
+        story.story_layers.append(
+            record(**fields) if record is not None else dict(fields, type=layer['type'])
+        )
+    story._render_cache = {}
+    story._dataset_cache = {}
+    story._render_lock = threading.RLock()
+    story._main_dataset = None
+    return story
+
+
+def save(story, path):
+    """
+    Saves a story (see Story.save_story).
+    """
+    from .sharing import _serialize
+
+    ir, frames = to_ir(story)
+    data_path = path + DATA_SUFFIX
+    if frames:
+        # Frames are stored one after the other, each as an Arrow IPC stream;
+        # pickles, which can run code when loaded, are not written to files
+        serialized = [_serialize(frame) for frame in frames]
+        if any(kind == 'pickle' for kind, _ in serialized):
+            raise ValueError("Saving a story requires pyarrow, and DataFrames whose columns "
+                             "can be converted to Arrow")
+        entries = []
+        offset = 0
+        with open(data_path, 'wb') as file:
+            for kind, payload in serialized:
+                file.write(payload)
+                entries.append({'kind': kind, 'offset': offset, 'size': len(payload)})
+                offset += len(payload)
+        ir['frames'] = entries
+    elif os.path.exists(data_path):
+        # Side file of a previous save to the same path
+        os.remove(data_path)
+
+    payload = zlib.compress(json.dumps(ir, separators=(',', ':')).encode('utf-8'))
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(payload)))
+        file.write(payload)
+
+
+def load(path, cls=None, allow_pickle=False):
+    """
+    Loads a story saved with save() (see Story.load_story).
+    """
+    from .sharing import _deserialize
+
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a saved story")
+        try:
+            size, = struct.unpack('<I', file.read(4))
+            payload = file.read(size)
+            if len(payload) != size:
+                raise ValueError("truncated file")
+            ir = json.loads(zlib.decompress(payload).decode('utf-8'))
+            if not isinstance(ir, dict):
+                raise ValueError("not a story")
+        except (struct.error, zlib.error, ValueError) as error:
+            # Truncated or corrupt file
+            raise ValueError(f"{path} is not a saved story") from error
+
+    frames = []
+    if ir.get('frames'):
+        with open(path + DATA_SUFFIX, 'rb') as file:
+            content = memoryview(file.read())
+        if any(entry['offset'] + entry['size'] > len(content) for entry in ir['frames']):
+            raise ValueError(f"{path + DATA_SUFFIX} is truncated")
+        if not allow_pickle and any(entry['kind'] == 'pickle' for entry in ir['frames']):
+            raise ValueError(f"{path + DATA_SUFFIX} holds pickled DataFrames, which can run "
+                             "arbitrary code when loaded: pass allow_pickle=True only for a "
+                             "trusted file")
+        frames = [
+            _deserialize(entry['kind'], content[entry['offset']:entry['offset'] + entry['size']])
+            for entry in ir['frames']
+        ]
+    return from_ir(ir, frames, cls)
+
+
+def _chart(spec, data, cls=None):
+    """
+    Rebuilds an Altair chart from its specification, replacing the names of
+    saved data with the data.
+    """
+    if cls is None:
+        cls = next((CHILD_CLASSES[key] for key in CHILD_CLASSES if key in spec), alt.Chart)
+    if _needs_from_dict(spec):
+        from .sharing import _map_data
+
+        chart = cls.from_dict(spec, validate=False)
+        return _map_data(chart, lambda value: data.get(getattr(value, 'name', None), value))
+
+    kwds = dict(spec)
+    for key in CHILD_CLASSES:
+        if key in kwds:
+            kwds[key] = [_chart(child, data) for child in kwds[key]]
+    if isinstance(kwds.get('data'), dict):
+        kwds['data'] = _data(kwds['data'], data)
+    if isinstance(kwds.get('mark'), dict):
+        kwds['mark'] = _schema_object(alt.MarkDef, kwds['mark'])
+    if isinstance(kwds.get('encoding'), dict):
+        kwds['encoding'] = _schema_object(alt.FacetedEncoding, {
+            channel: _channel(channel, definition) for channel, definition in kwds['encoding'].items()
+        })
+    if isinstance(kwds.get('config'), dict):
+        kwds['config'] = _schema_object(alt.Config, kwds['config'])
+    if isinstance(kwds.get('resolve'), dict):
+        kwds['resolve'] = _schema_object(alt.Resolve, kwds['resolve'])
+    return _schema_object(cls, kwds)
+
+
+def _needs_from_dict(spec):
+    """
+    Checks whether a specification, or any of its sub-charts, uses features
+    that only Altair's from_dict() rebuilds correctly.
+    """
+    if any(key in spec for key in FROM_DICT_KEYS):
+        return True
+    return any(_needs_from_dict(child) for key in CHILD_CLASSES for child in spec.get(key, ()))
+
+
+def _data(spec, data):
+    """
+    Rebuilds the data of a chart.
+    """
+    name = spec.get('name')
+    if name in data:
+        return data[name]
+    if name is not None:
+        return _schema_object(alt.NamedData, spec)
+    if 'url' in spec:
+        return _schema_object(alt.UrlData, spec)
+    return spec
+
+
+def _channel(channel, definition):
+    """
+    Rebuilds an encoding channel, as an object of its Altair class (e.g. alt.X,
+    alt.XValue) when there is one.
+    """
+    if not isinstance(definition, dict):
+        return definition
+    name = channel[0].upper() + channel[1:]
+    if 'value' in definition:
+        name += 'Value'
+    elif 'datum' in definition:
+        name += 'Datum'
+    cls = getattr(alt, name, None)
+    if cls is None:
+        return definition
+    return _schema_object(cls, definition)
+
+
+_KEYS = {}
+
+
+def _schema_object(cls, kwds):
+    """
+    Creates an Altair schema object without running its constructor, which
+    validates it and processes shorthands; the values are used as they are.
+    """
+    keys = _KEYS.get(cls)
+    if keys is None:
+        # Altair objects expect every property of their class to be set,
+        # Undefined if not given
+        from altair.utils.schemapi import debug_mode
+        with debug_mode(False):
+            keys = _KEYS[cls] = tuple(cls()._kwds)
+    values = dict.fromkeys(keys, alt.Undefined)
+    values.update(kwds)
+    chart = object.__new__(cls)
+    object.__setattr__(chart, '_args', ())
+    object.__setattr__(chart, '_kwds', values)
+    return chart
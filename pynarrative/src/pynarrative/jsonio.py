@@ -0,0 +1,284 @@
+import io
+import json
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+BACKENDS = ('auto', 'orjson', 'json')
+
+# Rows of a dataset encoded at a time by write_json()
+CHUNK_ROWS = 10_000
+
+# Backend used when none is given (see set_json_backend)
+_backend = 'auto'
+
+# Separators produced by orjson, with and without indentation
+_ORJSON_SEPARATORS = {None: (',', ':'), 2: (',', ': ')}
+
+
+def set_json_backend(backend='auto'):
+    """
+    Sets the JSON encoder used by Story.to_json() and Story.write_json().
+
+    orjson encodes a large specification many times faster than the json
+    module of the standard library; its output is the same JSON value, but
+    not always the same text (non-ASCII characters are written as they are,
+    and some floats in another, equivalent, form).
+
+    Parameters:
+    - backend: 'orjson', 'json' (standard library), or 'auto' for orjson if
+      it is installed and json otherwise (default: 'auto')
+
+    Returns:
+    - The previously set backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if backend == 'orjson':
+        _orjson()
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+def get_json_backend(backend=None, indent=None, **kwargs):
+    """
+    Returns the name of the backend ('orjson' or 'json') encoding JSON with
+    the given options.
+
+    Parameters:
+    - backend: Backend asked for, or None for the one set with
+      set_json_backend()
+    - indent, **kwargs: Options of json.dumps(); orjson only supports an
+      indentation of 2 and its own separators, other options fall back to the
+      json module when the backend is 'auto'
+
+    Returns:
+    - 'orjson' or 'json'
+    """
+    if backend is None:
+        backend = _backend
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if backend == 'json':
+        return 'json'
+    supported = (indent in _ORJSON_SEPARATORS
+                 and set(kwargs) <= {'separators', 'ensure_ascii'}
+                 and kwargs.get('separators') in (None, _ORJSON_SEPARATORS[indent])
+                 and not kwargs.get('ensure_ascii'))
+    if backend == 'orjson':
+        _orjson()
+        if not supported:
+            raise ValueError("orjson only supports indent=None or 2, its own separators and "
+                             "ensure_ascii=False")
+        return 'orjson'
+    return 'orjson' if supported and _orjson(required=False) is not None else 'json'
+
+
+def dumps(value, indent=None, sort_keys=False, backend=None, **kwargs):
+    """
+    Encodes a value as JSON with a backend (see get_json_backend).
+
+    Parameters:
+    - value: JSON-compatible value; numpy scalars and dates are converted
+    - indent, sort_keys, **kwargs: Options of json.dumps()
+    - backend: 'orjson', 'json', 'auto', or None for the one set with
+      set_json_backend() (default: None)
+
+    Returns:
+    - JSON string
+    """
+    if get_json_backend(backend, indent, **kwargs) == 'orjson':
+        return _orjson_dumps(value, indent, sort_keys).decode('utf-8')
+    kwargs.setdefault('default', _default)
+    return json.dumps(value, indent=indent, sort_keys=sort_keys, **kwargs)
+
+
+def write_json(spec, datasets, file, indent=None, sort_keys=True, backend=None,
+               chunk_rows=CHUNK_ROWS, workers=None):
+    """
+    Writes a Vega-Lite specification as JSON to a file, a piece at a time.
+
+    The specification is encoded without its datasets, whose rows are then
+    encoded and written by chunks, so that the whole text is never held in
+    memory. Chunks can be encoded by worker processes while the previous ones
+    are written.
+
+    Parameters:
+    - spec: Specification, without its top-level datasets
+    - datasets: Dictionary {name: rows} of the datasets of the specification
+    - file: Path, binary or text file object, or socket
+    - indent: Indentation, None or a number of spaces (default: None, compact)
+    - sort_keys: Whether to sort the keys (default: True)
+    - backend: See dumps() (default: None)
+    - chunk_rows: Number of rows encoded at a time (default: CHUNK_ROWS)
+    - workers: Number of worker processes encoding chunks, or an Executor
+      (default: None, encodes in the current thread)
+
+    Returns:
+    - Number of bytes written
+    """
+    if not (indent is None or (isinstance(indent, int) and indent >= 0)):
+        raise ValueError("indent must be None or a non-negative integer")
+    if not (isinstance(chunk_rows, int) and chunk_rows >= 1):
+        raise ValueError("chunk_rows must be a positive integer")
+    # Compact output has no spaces after separators, with either backend
+    separators = (',', ':') if indent is None else (',', ': ')
+    backend = get_json_backend(backend, indent, separators=separators)
+
+    # Each dataset is replaced by a placeholder string, found again in the
+    # encoded specification
+    token = 'pynarrative-dataset-' + os.urandom(8).hex()
+    skeleton = dict(spec)
+    if datasets:
+        skeleton['datasets'] = {name: f'{token}-{index}' for index, name in enumerate(datasets)}
+    text = _encode(skeleton, indent, sort_keys, backend, separators)
+    pieces = re.split(rb'"' + token.encode('ascii') + rb'-(\d+)"', text)
+    rows = list(datasets.values())
+
+    executor = workers
+    if isinstance(workers, int) and workers > 1:
+        # Spawned rather than forked, as for export_many()
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+    elif not isinstance(workers, Executor):
+        executor = None
+    try:
+        with _Output(file) as output:
+            output.write(pieces[0])
+            for index in range(1, len(pieces), 2):
+                # Datasets are at the third level of the specification
+                _write_rows(output, rows[int(pieces[index])], indent, sort_keys, backend, separators,
+                            chunk_rows, executor, depth=2)
+                output.write(pieces[index + 1])
+            return output.written
+    finally:
+        if executor is not None and executor is not workers:
+            executor.shutdown()
+
+
+def _write_rows(output, rows, indent, sort_keys, backend, separators, chunk_rows, executor, depth):
+    """
+    Writes the JSON array of the rows of a dataset, encoded by chunks.
+    """
+    if not rows:
+        output.write(b'[]')
+        return
+    chunks = (rows[start:start + chunk_rows] for start in range(0, len(rows), chunk_rows))
+    arguments = (indent, sort_keys, backend, separators, depth)
+    if executor is None:
+        encoded = (_encode_chunk(chunk, *arguments) for chunk in chunks)
+    else:
+        encoded = _map_ordered(executor, chunks, arguments)
+    output.write(b'[')
+    for index, text in enumerate(encoded):
+        if index:
+            output.write(b',')
+        output.write(text)
+    output.write(b']' if indent is None else b'\n' + b' ' * (indent * depth) + b']')
+
+
+def _map_ordered(executor, chunks, arguments):
+    """
+    Encodes chunks in an executor, in order, with at most twice its number of
+    workers pending at a time so that encoded chunks do not pile up in memory.
+    """
+    limit = 2 * getattr(executor, '_max_workers', os.cpu_count() or 1)
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(_encode_chunk, chunk, *arguments))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _encode_chunk(rows, indent, sort_keys, backend, separators, depth):
+    """
+    Encodes rows as the items of a JSON array nested at the given depth,
+    without the brackets of the array.
+    """
+    text = _encode(rows, indent, sort_keys, backend, separators)
+    if indent is None:
+        return text[1:-1]
+    # Strings cannot contain raw newlines: every newline is indentation
+    return text[1:-2].replace(b'\n', b'\n' + b' ' * (indent * depth))
+
+
+def _encode(value, indent, sort_keys, backend, separators):
+    """
+    Encodes a value as UTF-8 JSON bytes.
+    """
+    if backend == 'orjson':
+        return _orjson_dumps(value, indent, sort_keys)
+    return json.dumps(value, indent=indent, sort_keys=sort_keys, separators=separators,
+                      default=_default).encode('utf-8')
+
+
+def _orjson_dumps(value, indent, sort_keys):
+    orjson = _orjson()
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if indent is not None:
+        option |= orjson.OPT_INDENT_2
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(value, default=_default, option=option)
+
+
+def _orjson(required=True):
+    """
+    Returns the orjson module, or None if it is not installed and not required.
+    """
+    try:
+        import orjson
+    except ImportError:
+        if required:
+            raise ImportError("The orjson backend requires the orjson package") from None
+        return None
+    return orjson
+
+
+def _default(value):
+    """
+    Converts values the encoders do not support, as Altair's to_dict() does.
+    """
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()  # dates, times, timestamps
+    if hasattr(value, 'item'):
+        return value.item()  # numpy scalars
+    if hasattr(value, 'tolist'):
+        return value.tolist()  # numpy arrays
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _Output:
+    """
+    Writes bytes to a path, a file object or a socket, counting them.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.written = 0
+        self._close = False
+
+    def __enter__(self):
+        if isinstance(self.file, (str, os.PathLike)):
+            self.file = open(self.file, 'wb')
+            self._close = True
+        if hasattr(self.file, 'sendall'):
+            self._write = self.file.sendall
+        elif isinstance(self.file, io.TextIOBase):
+            self._write = lambda data: self.file.write(data.decode('utf-8'))
+        else:
+            self._write = self.file.write
+        return self
+
+    def write(self, data):
+        if data:
+            self._write(data)
+            self.written += len(data)
+
+    def __exit__(self, *exc_info):
+        if self._close:
+            self.file.close()
@@ -0,0 +1,225 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+
+# Default font sizes of the text elements, as multipliers of the base font size
+FONT_SIZES = {
+    'title': 2,        # The title will be twice as big as the basic font
+    'subtitle': 1.5,   # The subtitle will be 1.5 times bigger
+    'context': 1.2,    # The context text will be 1.2 times larger
+    'nextstep': 1.3,   # Next-Step text will be 1.3 times larger
+    'source': 1        # The source text will have the basic size
+}
+
+# Default colours of the text elements
+COLORS = {
+    'title': 'black',
+    'subtitle': 'gray',
+    'context': 'black',
+    'nextstep': 'black',
+    'source': 'gray'
+}
+
+
+class Theme:
+    """
+    Theme class: Font sizes and colours of the text elements of a story.
+
+    Themes are immutable, so that a single Theme object can be shared by many
+    stories; stories with the default sizes and colours share one per base
+    font size (see default_theme). Font sizes in pixels are computed once,
+    when the theme is created.
+    """
+
+    __slots__ = ('base_font_size', 'font_sizes', 'colors', 'font_px')
+
+    def __init__(self, base_font_size=16, font_sizes=None, colors=None):
+        """
+        Initialise a Theme object.
+
+        Parameters:
+        - base_font_size: Basic font size in pixels (default: 16)
+        - font_sizes: Font sizes of the text elements as multipliers of
+          base_font_size, replacing the defaults given (optional)
+        - colors: Colours of the text elements, replacing the defaults
+          given (optional)
+        """
+        font_sizes = dict(FONT_SIZES, **(font_sizes or {}))
+        set_field = object.__setattr__
+        set_field(self, 'base_font_size', base_font_size)
+        set_field(self, 'font_sizes', MappingProxyType(font_sizes))
+        set_field(self, 'colors', MappingProxyType(dict(COLORS, **(colors or {}))))
+        set_field(self, 'font_px', MappingProxyType({
+            element: int(size * base_font_size) for element, size in font_sizes.items()
+        }))
+
+    def replace(self, base_font_size=None, font_sizes=None, colors=None):
+        """
+        Returns a copy of the theme with some values changed.
+
+        Parameters:
+        - base_font_size: New basic font size in pixels (optional)
+        - font_sizes, colors: Dictionaries of the font sizes and colours to
+          change (optional)
+
+        Returns:
+        - New Theme object
+        """
+        return Theme(
+            self.base_font_size if base_font_size is None else base_font_size,
+            dict(self.font_sizes, **(font_sizes or {})),
+            dict(self.colors, **(colors or {})),
+        )
+
+    def _key(self):
+        return (self.base_font_size, tuple(self.font_sizes.items()), tuple(self.colors.items()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Theme objects are immutable, use replace() to change them")
+
+    def __delattr__(self, name):
+        raise AttributeError("Theme objects are immutable, use replace() to change them")
+
+    def __eq__(self, other):
+        return isinstance(other, Theme) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __reduce__(self):
+        # The read-only mappings cannot be pickled themselves
+        return Theme, (self.base_font_size, dict(self.font_sizes), dict(self.colors))
+
+    def __repr__(self):
+        return f"Theme(base_font_size={self.base_font_size!r})"
+
+
+_DEFAULT_THEMES = {}
+
+
+def default_theme(base_font_size=16):
+    """
+    Returns the shared theme with the default font sizes and colours.
+
+    Parameters:
+    - base_font_size: Basic font size in pixels (default: 16)
+
+    Returns:
+    - Theme object, the same for every call with the same base font size
+    """
+    theme = _DEFAULT_THEMES.get(base_font_size)
+    if theme is None:
+        theme = _DEFAULT_THEMES[base_font_size] = Theme(base_font_size)
+    return theme
+
+
+class Layer(Mapping):
+    """
+    Base class of the layer records stored in Story.story_layers.
+
+    Each kind of layer is a class with __slots__, which takes much less memory
+    than the dictionary per layer used before. For compatibility with code
+    written for those dictionaries, records are read-only mappings of their
+    fields, plus 'type', whose fields can also be changed by key
+    (layer['title'] = ...).
+    """
+
+    __slots__ = ()
+
+    # Kind of layer, dispatched on by Story.render()
+    type = None
+
+    def __init__(self, *args, **kwargs):
+        values = dict(zip(self.__slots__, args), **kwargs)
+        unknown = set(values) - set(self.__slots__)
+        if unknown:
+            raise TypeError(f"{type(self).__name__} has no field(s) {', '.join(sorted(unknown))}")
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.type
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        yield 'type'
+        yield from self.__slots__
+
+    def __len__(self):
+        return len(self.__slots__) + 1
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class TitleLayer(Layer):
+    """
+    Title (and optional subtitle) of the story, added by Story.add_title().
+    """
+    __slots__ = ('title', 'subtitle', 'title_color', 'subtitle_color', 'title_font_size',
+                 'subtitle_font_size', 'dx', 'dy', 's_dx', 's_dy')
+    type = 'title'
+
+
+class ContextLayer(Layer):
+    """
+    Context text, added by Story.add_context().
+    """
+    __slots__ = ('text', 'position', 'color', 'dx', 'dy', 'font_size')
+    type = 'context'
+
+
+class CtaLayer(Layer):
+    """
+    Call-to-action text, added by Story.add_next_steps() without a mode.
+    """
+    __slots__ = ('text', 'position', 'color')
+    type = 'cta'
+
+
+class SourceLayer(Layer):
+    """
+    Source of the data, added by Story.add_source().
+    """
+    __slots__ = ('text', 'position', 'vertical', 'color', 'dx', 'dy', 'font_size')
+    type = 'source'
+
+
+class NextStepsLayer(Layer):
+    """
+    Next-step chart placed beside the main chart, added by Story.add_next_steps().
+    """
+    __slots__ = ('chart', 'position')
+    type = 'special_cta'
+
+
+class AnnotationLayer(Layer):
+    """
+    Annotation chart, added by Story.add_annotation() and add_annotations().
+    """
+    __slots__ = ('chart',)
+    type = 'annotation'
+
+
+class LineLayer(Layer):
+    """
+    Reference line chart, added by Story.add_line().
+    """
+    __slots__ = ('chart',)
+    type = 'line'
+
+
+# Record class of each type of layer
+LAYER_TYPES = {
+    layer.type: layer
+    for layer in (TitleLayer, ContextLayer, CtaLayer, SourceLayer, NextStepsLayer,
+                  AnnotationLayer, LineLayer)
+}
@@ -0,0 +1,431 @@
+import math
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+# Vega-Lite aggregation operations and their pandas equivalents
+# ('count' counts rows and is handled separately)
+AGGREGATES = {
+    'valid': 'count',
+    'missing': lambda values: values.isna().sum(),
+    'distinct': lambda values: values.nunique(dropna=False),
+    'sum': 'sum',
+    'product': 'prod',
+    'mean': 'mean',
+    'average': 'mean',
+    'median': 'median',
+    'min': 'min',
+    'max': 'max',
+    'stdev': 'std',
+    'stdevp': lambda values: values.std(ddof=0),
+    'variance': 'var',
+    'variancep': lambda values: values.var(ddof=0),
+    'q1': lambda values: values.quantile(0.25),
+    'q3': lambda values: values.quantile(0.75),
+}
+
+# Window operations computed over a frame of [null, 0] (running) or
+# [null, null] (whole partition)
+WINDOW_AGGREGATES = {
+    'count': ('cumcount', 'size'),
+    'sum': ('cumsum', 'sum'),
+    'min': ('cummin', 'min'),
+    'max': ('cummax', 'max'),
+    'mean': (None, 'mean'),
+    'average': (None, 'mean'),
+}
+
+# Comparison predicates of Vega-Lite filters
+COMPARISONS = {
+    'equal': lambda values, value: values == value,
+    'lt': lambda values, value: values < value,
+    'lte': lambda values, value: values <= value,
+    'gt': lambda values, value: values > value,
+    'gte': lambda values, value: values >= value,
+}
+
+
+def precompute_chart(chart):
+    """
+    Computes the transforms of a chart in pandas, on the Python side.
+
+    Transforms are applied in order as long as they are supported (aggregate,
+    bin, window and filter on field predicates); the first unsupported one and
+    all those after it are left to Vega-Lite. If all transforms were computed,
+    aggregations in the encodings (e.g. y='sum(sales):Q') are computed as well,
+    and the encodings rewritten to read the aggregated fields under the titles
+    Vega-Lite would have given them.
+
+    Only charts whose data is a pandas DataFrame are precomputed.
+
+    Parameters:
+    - chart: An Altair chart
+
+    Returns:
+    - A copy of the chart whose data is the precomputed result, or the chart
+      itself if nothing could be precomputed
+    """
+    if not isinstance(chart, alt.Chart) or not isinstance(chart.data, pd.DataFrame):
+        return chart
+
+    data = chart.data.reset_index(drop=True)
+    transforms = [] if chart.transform is alt.Undefined else list(chart.transform)
+    done = 0
+    for transform in transforms:
+        if hasattr(transform, 'to_dict'):
+            transform = transform.to_dict(validate=False)
+        result = _apply_transform(data, transform)
+        if result is None:
+            break
+        data = result.reset_index(drop=True)
+        done += 1
+    remaining = transforms[done:]
+
+    encoding = chart.encoding
+    if not remaining and chart.params is alt.Undefined:
+        result = _aggregate_encoding(data, encoding)
+        if result is not None:
+            data, encoding = result
+
+    if done == 0 and encoding is chart.encoding:
+        return chart
+
+    # Local import: story imports this module only when precomputing
+    from .story import _shallow_copy
+    chart = _shallow_copy(chart)
+    chart.data = data
+    chart.transform = remaining or alt.Undefined
+    chart.encoding = encoding
+    return chart
+
+
+def _apply_transform(data, transform):
+    """
+    Applies a Vega-Lite transform (as a dictionary) to a DataFrame.
+
+    Returns:
+    - The transformed DataFrame, or None if the transform is not supported
+    """
+    try:
+        if 'aggregate' in transform:
+            return _aggregate_transform(data, transform)
+        if 'bin' in transform:
+            return _bin_transform(data, transform)
+        if 'window' in transform:
+            return _window_transform(data, transform)
+        if 'filter' in transform:
+            mask = _predicate(data, transform['filter'])
+            return None if mask is None else data[mask.to_numpy(dtype=bool)]
+    except (KeyError, TypeError):
+        # Fields missing from the DataFrame (e.g. nested fields) or values
+        # that pandas cannot compare: let Vega-Lite handle the transform
+        return None
+    return None
+
+
+def _aggregate(data, groupby, measures):
+    """
+    Groups a DataFrame and computes Vega-Lite aggregations.
+
+    Parameters:
+    - data: DataFrame
+    - groupby: List of fields to group by (may be empty)
+    - measures: List of (op, field, name) tuples
+
+    Returns:
+    - DataFrame with the groupby fields followed by one column per measure
+    """
+    if not groupby:
+        # Without groups Vega-Lite always produces one row, even for no data
+        return pd.DataFrame({
+            name: [len(data) if op == 'count' else data[field].agg(AGGREGATES[op])]
+            for op, field, name in measures
+        })
+
+    grouped = data.groupby([data[field] for field in groupby], dropna=False, sort=False, observed=True)
+    columns = {}
+    for op, field, name in measures:
+        columns[name] = grouped.size() if op == 'count' else grouped[field].agg(AGGREGATES[op])
+    return pd.DataFrame(columns).reset_index()
+
+
+def _aggregate_transform(data, transform):
+    measures = []
+    for measure in transform['aggregate']:
+        op = measure['op']
+        if op != 'count' and op not in AGGREGATES:
+            return None
+        measures.append((op, measure.get('field'), measure['as']))
+    return _aggregate(data, list(transform.get('groupby', [])), measures)
+
+
+def bin_params(extent, maxbins=10, step=None, steps=None, base=10, divide=(5, 2),
+               minstep=0, nice=True, span=None):
+    """
+    Computes the bins of Vega's bin transform, so that they match the ones
+    the browser would compute.
+
+    Returns:
+    - Tuple (start, stop, step)
+    """
+    start, stop = extent
+    logb = math.log(base)
+    span = span or (stop - start) or abs(start) or 1
+
+    if step is None and steps:
+        target = span / maxbins
+        i = 0
+        while i < len(steps) and steps[i] < target:
+            i += 1
+        step = steps[max(0, i - 1)]
+    elif step is None:
+        level = math.ceil(math.log(maxbins) / logb)
+        # Rounded half up, as Math.round in JavaScript
+        step = max(minstep, base ** (math.floor(math.log(span) / logb + 0.5) - level))
+        while math.ceil(span / step) > maxbins:
+            step *= base
+        for div in divide:
+            value = step / div
+            if value >= minstep and span / value <= maxbins:
+                step = value
+
+    value = math.log(step)
+    precision = 0 if value >= 0 else int(-value / logb) + 1
+    eps = base ** (-precision - 1)
+    if nice:
+        value = math.floor(start / step + eps) * step
+        start = value - step if start < value else value
+        stop = math.ceil(stop / step) * step
+
+    return start, start + step if stop == start else stop, step
+
+
+def _bin_transform(data, transform):
+    params = transform['bin']
+    params = {} if params is True else dict(params)
+    if set(params) - {'maxbins', 'step', 'steps', 'base', 'divide', 'extent', 'minstep', 'nice'}:
+        # e.g. 'anchor', or bins given by a parameter
+        return None
+    values = data[transform['field']]
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return None
+
+    extent = params.pop('extent', None)
+    if extent is None:
+        if values.notna().sum() == 0:
+            return None
+        extent = (float(values.min()), float(values.max()))
+    elif not isinstance(extent, (list, tuple)):
+        return None
+    start, stop, step = bin_params(extent, **params)
+
+    names = transform['as']
+    if isinstance(names, str):
+        names = [names, names + '_end']
+
+    # Same assignment as Vega: values out of the extent go to -inf/+inf
+    values = values.astype(float)
+    clipped = values.clip(start, stop - step)
+    binned = start + step * np.floor(1e-14 + (clipped - start) / step)
+    binned = binned.mask(values < start, -np.inf).mask(values > stop, np.inf)
+
+    data = data.copy()
+    data[names[0]] = binned
+    data[names[1]] = binned + step
+    return data
+
+
+def _window_transform(data, transform):
+    frame = list(transform.get('frame', [None, 0]))
+    if frame not in ([None, 0], [None, None]):
+        return None
+    groupby = list(transform.get('groupby', []))
+    sort = list(transform.get('sort', []))
+    sort_fields = [item['field'] for item in sort]
+    # Rows with equal sort values ("peers") share the same frame, unless ignored
+    peers = bool(sort) and not transform.get('ignorePeers', False)
+
+    # Partitions are computed in sorted order, and the result put back in the
+    # original order of the rows
+    ordered = data
+    if sort:
+        ordered = data.sort_values(
+            sort_fields, ascending=[item.get('order', 'ascending') == 'ascending' for item in sort],
+            kind='stable'
+        )
+    keys = [ordered[field] for field in groupby] or [pd.Series(0, index=ordered.index)]
+    grouped = ordered.groupby(keys, dropna=False, sort=False, observed=True)
+    peer_groups = None
+    if peers:
+        peer_keys = keys + [ordered[field] for field in sort_fields]
+        peer_groups = ordered.groupby(peer_keys, dropna=False, sort=False, observed=True)
+
+    columns = {}
+    for window in transform['window']:
+        op, field, name = window['op'], window.get('field'), window['as']
+        if op == 'row_number':
+            column = grouped.cumcount() + 1
+        elif op in ('rank', 'dense_rank'):
+            if not sort:
+                return None
+            row_number = grouped.cumcount() + 1
+            if op == 'rank':
+                column = row_number.groupby(peer_groups.ngroup()).transform('first')
+            else:
+                first = row_number == row_number.groupby(peer_groups.ngroup()).transform('first')
+                column = first.astype(int).groupby(keys, dropna=False, sort=False, observed=True).cumsum()
+        elif op in ('lag', 'lead'):
+            offset = window.get('param', 1)
+            column = grouped[field].shift(offset if op == 'lag' else -offset)
+        elif op in WINDOW_AGGREGATES:
+            column = _window_aggregate(ordered, keys, op, field, running=frame == [None, 0])
+            if peers and frame == [None, 0]:
+                column = column.groupby(peer_groups.ngroup()).transform('last')
+        else:
+            return None
+        columns[name] = column
+
+    data = data.copy()
+    for name, column in columns.items():
+        data[name] = column.reindex(data.index)
+    return data
+
+
+def _window_aggregate(ordered, keys, op, field, running):
+    """
+    Computes a window aggregation over the partitions of a sorted DataFrame,
+    either running (frame [null, 0]) or over whole partitions.
+    """
+    def by_partition(values):
+        return values.groupby(keys, dropna=False, sort=False, observed=True)
+
+    if op == 'count':
+        # Vega counts rows, whether or not the field is valid
+        rows = pd.Series(1, index=ordered.index)
+        return by_partition(rows).cumsum() if running else by_partition(rows).transform('sum')
+
+    values = ordered[field]
+    if not running:
+        return by_partition(values).transform(WINDOW_AGGREGATES[op][1])
+    # Invalid values are skipped, the running value is carried over them
+    if op in ('sum', 'mean', 'average'):
+        total = by_partition(values.fillna(0)).cumsum()
+        if op == 'sum':
+            return total
+        count = by_partition(values.notna().astype(int)).cumsum()
+        return total / count.where(count > 0)
+    return by_partition(getattr(by_partition(values), WINDOW_AGGREGATES[op][0])()).ffill()
+
+
+def _predicate(data, predicate):
+    """
+    Evaluates a Vega-Lite field predicate on a DataFrame.
+
+    Returns:
+    - Boolean Series, or None if the predicate is not supported (expressions,
+      parameters, time units, date-time objects)
+    """
+    if not isinstance(predicate, dict) or 'timeUnit' in predicate:
+        return None
+    if 'and' in predicate or 'or' in predicate:
+        masks = [_predicate(data, item) for item in predicate.get('and', predicate.get('or'))]
+        if any(mask is None for mask in masks):
+            return None
+        combined = masks[0]
+        for mask in masks[1:]:
+            combined = (combined & mask) if 'and' in predicate else (combined | mask)
+        return combined
+    if 'not' in predicate:
+        mask = _predicate(data, predicate['not'])
+        return None if mask is None else ~mask
+    if 'field' not in predicate:
+        return None
+
+    values = data[predicate['field']]
+    for key, compare in COMPARISONS.items():
+        if key in predicate:
+            value = predicate[key]
+            if isinstance(value, dict):
+                return None
+            return compare(values, value).fillna(False)
+    if 'range' in predicate:
+        low, high = predicate['range']
+        if isinstance(low, dict) or isinstance(high, dict):
+            return None
+        mask = values.notna()
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask.fillna(False)
+    if 'oneOf' in predicate:
+        if any(isinstance(value, dict) for value in predicate['oneOf']):
+            return None
+        return values.isin(predicate['oneOf'])
+    if 'valid' in predicate:
+        valid = values.notna() & (values == values)
+        return valid if predicate['valid'] else ~valid
+    return None
+
+
+def _aggregate_encoding(data, encoding):
+    """
+    Computes the aggregations of the encoding channels, grouping by the fields
+    of the other channels as Vega-Lite does.
+
+    Returns:
+    - Tuple (data, encoding) with the aggregated DataFrame and the rewritten
+      encoding, or None if there is nothing to aggregate or it is not supported
+    """
+    if encoding is alt.Undefined:
+        return None
+    channels = encoding.to_dict(validate=False, context={'data': data})
+
+    groupby = []
+    measures = []
+    for channel, definition in channels.items():
+        if not isinstance(definition, dict):
+            # Several definitions for one channel (e.g. a list of tooltips)
+            return None
+        if 'condition' in definition or 'timeUnit' in definition:
+            return None
+        if definition.get('bin') not in (None, 'binned'):
+            return None
+        if isinstance(definition.get('sort'), dict):
+            # Sorted by an aggregation of a field that would no longer exist
+            return None
+        field = definition.get('field')
+        if field is not None and field not in data.columns:
+            return None
+        aggregate = definition.get('aggregate')
+        if aggregate is None:
+            if field is not None and field not in groupby:
+                groupby.append(field)
+        elif aggregate == 'count' or aggregate in AGGREGATES:
+            measures.append((channel, aggregate, field))
+        else:
+            # argmin/argmax, or an unknown operation
+            return None
+    if not measures:
+        return None
+
+    names = {}
+    for channel, op, field in measures:
+        name = 'count' if op == 'count' else f'{op}_{field}'
+        if name in groupby:
+            return None
+        names[channel] = name
+    data = _aggregate(data, groupby, list({
+        names[channel]: (op, field, names[channel]) for channel, op, field in measures
+    }.values()))
+
+    for channel, op, field in measures:
+        definition = dict(channels[channel])
+        del definition['aggregate']
+        definition['field'] = names[channel]
+        if 'title' not in definition:
+            # Default titles of Vega-Lite for aggregated fields
+            definition['title'] = 'Count of Records' if op == 'count' else f'{op[0].upper()}{op[1:]} of {field}'
+        channels[channel] = definition
+    return data, alt.FacetedEncoding.from_dict(channels, validate=False)
@@ -0,0 +1,300 @@
+import re
+
+import altair as alt
+
+# Keys of each transform, other than nested 'field' keys, whose values are
+# fields of its input; transforms not listed may read any field
+TRANSFORM_KEYS = {
+    'aggregate': ('groupby',),
+    'bin': (),
+    'calculate': (),
+    'density': ('density', 'groupby'),
+    'extent': ('extent',),
+    'filter': (),
+    'flatten': ('flatten',),
+    'fold': ('fold',),
+    'impute': ('impute', 'key', 'groupby'),
+    'joinaggregate': ('groupby',),
+    'loess': ('loess', 'on', 'groupby'),
+    'lookup': ('lookup',),
+    'pivot': ('pivot', 'value', 'groupby'),
+    'quantile': ('quantile', 'groupby'),
+    'regression': ('regression', 'on', 'groupby'),
+    'sample': (),
+    'stack': ('stack', 'groupby'),
+    'timeUnit': (),
+    'window': ('groupby',),
+}
+
+# References to fields in Vega expressions: datum.name and datum['name']
+_DATUM_ATTRIBUTE = re.compile(r'\bdatum\s*\.\s*([A-Za-z_$][\w$]*)')
+_DATUM_ITEM = re.compile(r'''\bdatum\s*\[\s*(?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)")\s*\]''')
+_DATUM = re.compile(r'\bdatum\b')
+
+
+class _AllFields(Exception):
+    """
+    Raised when a chart may read fields that cannot be determined.
+    """
+
+
+def chart_fields(chart):
+    """
+    Finds the fields of its DataFrames that a chart and its sub-charts read.
+
+    Fields are taken from the encodings (shorthands included, resolved against
+    the DataFrame), the transforms (including field references in calculate
+    and filter expressions), the fields of selection parameters, and are
+    reduced to the columns they start from (e.g. 'a.b' reads column 'a').
+
+    Parameters:
+    - chart: An Altair chart (possibly layered or concatenated)
+
+    Returns:
+    - Dictionary {id(frame): (frame, fields)}, fields being a set of column
+      names, or None if the chart may read any column (e.g. tooltips showing
+      every field, or expressions using datum as a whole)
+    """
+    from .story import _is_frame
+
+    found = {}
+    all_fields = _reads_all_fields(getattr(chart, 'config', alt.Undefined))
+
+    def visit(node, frame):
+        data = getattr(node, 'data', alt.Undefined)
+        if data is not alt.Undefined:
+            frame = data if _is_frame(data) else None
+        if frame is not None:
+            entry = found.setdefault(id(frame), [frame, set()])
+            if entry[1] is not None:
+                try:
+                    if all_fields:
+                        raise _AllFields()
+                    entry[1] |= _node_fields(node, frame)
+                except _AllFields:
+                    entry[1] = None
+        for key in ('layer', 'hconcat', 'vconcat', 'concat'):
+            for child in _items(node, key):
+                visit(child, frame)
+
+    visit(chart, None)
+    return {key: (frame, fields) for key, (frame, fields) in found.items()}
+
+
+def column_projection(charts, fields=chart_fields):
+    """
+    Works out the columns to keep of each DataFrame read by some charts: the
+    fields any of them reads.
+
+    Parameters:
+    - charts: Iterable of Altair charts
+    - fields: Function giving the fields of a chart, as chart_fields()
+      (e.g. a cached version of it)
+
+    Returns:
+    - Dictionary {id(frame): columns}, columns being the tuple of the columns
+      to keep, in the order of the DataFrame, for the DataFrames that have
+      other columns
+    """
+    merged = {}
+    for chart in charts:
+        for key, (frame, used) in fields(chart).items():
+            entry = merged.setdefault(key, [frame, set()])
+            entry[1] = None if used is None or entry[1] is None else entry[1] | used
+    projection = {}
+    for key, (frame, used) in merged.items():
+        columns = _columns(frame)
+        if used is None or columns is None:
+            continue
+        kept = tuple(column for column in columns if column in used)
+        # A chart reading no column still draws a mark per row, while a
+        # DataFrame without columns would be converted to no rows: it is kept
+        # whole
+        if kept and len(kept) < len(columns):
+            projection[key] = kept
+    return projection
+
+
+def project(frame, columns):
+    """
+    Returns the given columns of a DataFrame (pandas, Polars or Arrow).
+    """
+    if hasattr(frame, 'loc'):  # pandas
+        return frame.loc[:, list(columns)]
+    return frame.select(list(columns))  # Polars, Arrow
+
+
+def _columns(frame):
+    """
+    Returns the column names of a DataFrame, or None if it cannot be projected.
+    """
+    # Arrow tables also have a 'columns' attribute, holding their arrays
+    if hasattr(frame, 'select') and hasattr(frame, 'column_names'):
+        columns = list(frame.column_names)  # Arrow
+    elif hasattr(frame, 'loc') or (hasattr(frame, 'select') and hasattr(frame, 'columns')):
+        columns = list(frame.columns)  # pandas, Polars
+    else:
+        return None
+    # Column names Vega-Lite cannot address are left alone
+    return columns if all(isinstance(column, str) for column in columns) else None
+
+
+def _node_fields(node, frame):
+    """
+    Returns the columns of frame read by the encoding, transforms, parameters
+    and mark of a single chart node (not its sub-charts).
+    """
+    fields = set()
+
+    mark = getattr(node, 'mark', alt.Undefined)
+    if isinstance(mark, alt.SchemaBase):
+        mark = mark.to_dict(validate=False)
+    if isinstance(mark, dict) and _reads_all_fields({'mark': mark}):
+        raise _AllFields()
+
+    encoding = getattr(node, 'encoding', alt.Undefined)
+    if encoding is not alt.Undefined:
+        # Shorthands without a type are resolved against the DataFrame
+        _encoding_fields(encoding.to_dict(validate=False, context={'data': frame}), fields)
+
+    for transform in _items(node, 'transform'):
+        if isinstance(transform, alt.SchemaBase):
+            transform = transform.to_dict(validate=False)
+        _transform_fields(transform, fields)
+
+    for param in _items(node, 'params'):
+        if isinstance(param, alt.SchemaBase):
+            param = param.to_dict(validate=False)
+        select = param.get('select')
+        if isinstance(select, dict):
+            fields.update(select.get('fields', ()))
+
+    columns = set(_columns(frame) or ())
+    return {_column(field, columns) for field in fields} - {None}
+
+
+def _items(node, key):
+    """
+    Returns the list held by an attribute of a chart, or an empty list.
+    """
+    items = getattr(node, key, alt.Undefined)
+    return () if items is alt.Undefined else items
+
+
+def _encoding_fields(value, fields):
+    """
+    Collects the fields referenced in an encoding dictionary.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == 'field':
+                if not isinstance(item, str):
+                    raise _AllFields()  # e.g. {'repeat': 'column'}
+                fields.add(item)
+            elif key in ('test', 'expr') and isinstance(item, str):
+                _expression_fields(item, fields)
+            elif key in ('scale', 'axis', 'legend', 'header', 'title'):
+                continue  # Expressions of axes, legends and headers read their own datum
+            else:
+                _encoding_fields(item, fields)
+    elif isinstance(value, list):
+        for item in value:
+            _encoding_fields(item, fields)
+
+
+def _transform_fields(transform, fields):
+    """
+    Collects the fields a transform reads.
+    """
+    kind = next((key for key in TRANSFORM_KEYS if key in transform), None)
+    if kind is None:
+        raise _AllFields()
+    if kind == 'calculate':
+        _expression_fields(transform['calculate'], fields)
+    elif kind == 'filter':
+        _predicate_fields(transform['filter'], fields)
+    for key in TRANSFORM_KEYS[kind]:
+        value = transform.get(key)
+        if isinstance(value, str):
+            fields.add(value)
+        elif isinstance(value, list):
+            fields.update(item for item in value if isinstance(item, str))
+    # Nested field definitions (aggregate, window and sort operations); the
+    # secondary data of a lookup holds fields of another dataset
+    _nested_fields({key: value for key, value in transform.items() if key != 'from'}, fields)
+
+
+def _nested_fields(value, fields):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == 'field' and isinstance(item, str):
+                fields.add(item)
+            else:
+                _nested_fields(item, fields)
+    elif isinstance(value, list):
+        for item in value:
+            _nested_fields(item, fields)
+
+
+def _predicate_fields(predicate, fields):
+    """
+    Collects the fields a filter predicate reads.
+    """
+    if isinstance(predicate, str):
+        _expression_fields(predicate, fields)
+    elif isinstance(predicate, dict):
+        if isinstance(predicate.get('field'), str):
+            fields.add(predicate['field'])
+        for key in ('and', 'or'):
+            for item in predicate.get(key, ()):
+                _predicate_fields(item, fields)
+        if 'not' in predicate:
+            _predicate_fields(predicate['not'], fields)
+
+
+def _expression_fields(expression, fields):
+    """
+    Collects the fields a Vega expression reads through datum.
+    """
+    found = 0
+    for match in _DATUM_ATTRIBUTE.finditer(expression):
+        fields.add(match.group(1))
+        found += 1
+    for match in _DATUM_ITEM.finditer(expression):
+        name = match.group(1) if match.group(1) is not None else match.group(2)
+        fields.add(re.sub(r'\\(.)', r'\1', name))
+        found += 1
+    # datum used as a whole, or indexed by a computed key
+    if len(_DATUM.findall(expression)) > found:
+        raise _AllFields()
+
+
+def _column(field, columns):
+    """
+    Returns the column a field reads, or None if it is not a column (e.g. a
+    field computed by a transform).
+    """
+    if field in columns:
+        return field
+    # Nested access ('a.b', 'a[0]'); escaped dots and brackets are part of
+    # the name
+    name = re.split(r'(?<!\\)[.\[]', field, maxsplit=1)[0]
+    name = re.sub(r'\\(.)', r'\1', name)
+    return name if name in columns else None
+
+
+def _reads_all_fields(config):
+    """
+    Checks whether a configuration or mark definition turns on tooltips
+    showing every field of the data.
+    """
+    if isinstance(config, alt.SchemaBase):
+        config = config.to_dict(validate=False)
+    if isinstance(config, dict):
+        for key, value in config.items():
+            if key == 'tooltip' and (value is True or (isinstance(value, dict)
+                                                       and value.get('content') == 'data')):
+                return True
+            if _reads_all_fields(value):
+                return True
+    return False
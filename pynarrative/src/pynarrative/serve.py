@@ -0,0 +1,438 @@
+import gzip
+import hashlib
+import json
+import os
+import runpy
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+# Formats served for each story, and their content types
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'vega': 'application/json',
+    'html': 'text/html; charset=utf-8',
+}
+
+# Responses smaller than this are never compressed
+MIN_GZIP_BYTES = 1024
+
+
+def serve(paths=(), host='127.0.0.1', port=8000, cache_size=128, verbose=False, compiled=False):
+    """
+    Serves stories over HTTP until interrupted (see StoryServer).
+
+    Parameters:
+    - paths: Saved stories (Story.save_story), Python files defining stories, or
+      directories of them (see StoryServer.add_path)
+    - host: Address to listen on (default: '127.0.0.1', local connections only)
+    - port: Port to listen on (default: 8000)
+    - cache_size: Maximum number of responses kept in the cache (default: 128)
+    - verbose: Whether each request is logged to stderr (default: False)
+    - compiled: Whether HTML pages embed the compiled Vega specification
+      (default: False, Vega-Lite)
+    """
+    server = StoryServer((host, port), cache_size=cache_size, verbose=verbose, compiled=compiled)
+    for path in paths:
+        server.add_path(path)
+    print(f"Serving {len(server.names())} stories on http://{host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class StoryServer(ThreadingHTTPServer):
+    """
+    StoryServer class: HTTP server of the Vega-Lite JSON and HTML pages of
+    stories.
+
+    Routes:
+    - GET /: JSON list of the story names
+    - GET /stories/<name>.json: Vega-Lite specification of a story
+    - GET /stories/<name>.vega: Vega specification of a story, compiled
+      offline (see Story.to_vega)
+    - GET /stories/<name>.html: HTML page displaying a story with vega-embed
+
+    Each response is rendered once and kept in a bounded LRU cache, keyed by
+    the fingerprint of the story definition and the version of its data, along
+    with its gzip-compressed body and an ETag (hash of the body). Requests
+    carrying a matching If-None-Match header get a 304 Not Modified response
+    without body; clients accepting gzip get the compressed body, under the
+    ETag suffixed with '-gz'. Saved
+    stories are reloaded when their files change, which also changes their
+    cache key.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 8000), cache_size=128, verbose=False, compiled=False):
+        """
+        Initialise a StoryServer object, listening on address.
+
+        Parameters:
+        - address: Tuple (host, port); port 0 picks a free port (see server_port)
+        - cache_size: Maximum number of responses kept in the cache (default: 128);
+          0 renders every request
+        - verbose: Whether each request is logged to stderr (default: False)
+        - compiled: Whether HTML pages embed the compiled Vega specification,
+          which browsers draw without compiling it (default: False, Vega-Lite)
+        """
+        super().__init__(address, _Handler)
+        self.verbose = verbose
+        self.compiled = compiled
+        self.cache = ResponseCache(cache_size)
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, story, data_version=None):
+        """
+        Serves a story under a name, replacing any story of that name.
+
+        The story is treated as immutable once added: add it again after
+        changing it.
+
+        Parameters:
+        - name: Name of the story in the URLs
+        - story: Story object
+        - data_version: Version of the data of the story, or a function
+          returning it, called on every request (e.g. the last modification
+          time of a table); a new version renders the story again (default:
+          a hash of the content of the DataFrames of the story)
+        """
+        source = _StorySource(story, data_version)
+        with self._lock:
+            self._sources[name] = source
+
+    def add_path(self, path):
+        """
+        Serves the stories of a file or directory.
+
+        Parameters:
+        - path: File saved with Story.save_story(), served under the name of the
+          file without extension; Python file, whose module-level Story
+          objects are served under their variable names; or directory, whose
+          .pns and .py files are added
+        """
+        if os.path.isdir(path):
+            for entry in sorted(os.listdir(path)):
+                if entry.endswith(('.pns', '.py')):
+                    self.add_path(os.path.join(path, entry))
+            return
+        if path.endswith('.py'):
+            from .story import Story
+
+            for name, value in runpy.run_path(path).items():
+                if isinstance(value, Story) and not name.startswith('_'):
+                    self.add(name, value)
+            return
+        name = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            self._sources[name] = _FileSource(path)
+
+    def names(self):
+        """
+        Returns the sorted names of the stories served.
+        """
+        with self._lock:
+            return sorted(self._sources)
+
+    def response(self, name, format):
+        """
+        Returns the cached response for a story, rendering it if needed.
+
+        Parameters:
+        - name: Name of the story
+        - format: 'json', 'vega' or 'html'
+
+        Returns:
+        - Response object, or None if there is no story of that name
+        """
+        with self._lock:
+            source = self._sources.get(name)
+        if source is None:
+            return None
+        key = source.key()
+        return self.cache.get((key, format), lambda: self._render(source, key, format))
+
+    def _render(self, source, key, format):
+        if format == 'json':
+            story = source.story(key)
+            return Response(story.to_json(indent=None, separators=(',', ':')).encode('utf-8'),
+                            CONTENT_TYPES[format])
+        if format == 'vega':
+            from .jsonio import dumps
+
+            vega = source.story(key).to_vega()
+            return Response(dumps(vega, separators=(',', ':')).encode('utf-8'), CONTENT_TYPES[format])
+        # The page embeds the specification served as JSON, rendered once
+        mode = 'vega' if self.compiled else 'json'
+        spec = json.loads(self.cache.get((key, mode), lambda: self._render(source, key, mode)).body)
+        return Response(_to_html(spec, 'vega' if self.compiled else 'vega-lite').encode('utf-8'),
+                        CONTENT_TYPES[format])
+
+
+class Response:
+    """
+    Cached response: body, content type, ETag and compressed body.
+    """
+
+    __slots__ = ('body', 'content_type', 'etag', 'gzipped')
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        # Compressed once, when the response is built
+        self.gzipped = gzip.compress(body, 6) if len(body) >= MIN_GZIP_BYTES else None
+
+
+class ResponseCache:
+    """
+    ResponseCache class: Bounded LRU cache of responses.
+
+    Concurrent requests missing the same key wait for a single render rather
+    than each rendering the story.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._building = {}  # key -> lock held while the entry is built
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Returns the entry of a key, calling build() to create it if missing.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            building = self._building.get(key)
+            if building is None:
+                building = self._building[key] = threading.Lock()
+        with building:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    # Built by another request meanwhile
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+            try:
+                entry = build()
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+            with self._lock:
+                if self.max_entries > 0:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """
+        Discards every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _StorySource:
+    """
+    Story added as an object.
+    """
+
+    def __init__(self, story, data_version):
+        from .ir import to_ir
+
+        ir, frames = to_ir(story)
+        self._story = story
+        self._fingerprint = hashlib.sha256(
+            json.dumps(ir, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        self._data_version = data_version
+        if data_version is None:
+            self._data_version = _frames_version(frames)
+
+    def key(self):
+        version = self._data_version
+        return self._fingerprint, version() if callable(version) else version
+
+    def story(self, key):
+        return self._story
+
+
+class _FileSource:
+    """
+    Story saved with Story.save_story(), reloaded when its files change.
+    """
+
+    def __init__(self, path):
+        from .ir import DATA_SUFFIX
+
+        self.path = path
+        self.data_path = path + DATA_SUFFIX
+        self._loaded = None  # (key, story)
+
+    def key(self):
+        # The story is identified by its path and the state of its file; the
+        # data by the state of the side file
+        return self.path, _stat(self.path), _stat(self.data_path)
+
+    def story(self, key):
+        loaded = self._loaded
+        if loaded is None or loaded[0] != key:
+            from .story import Story
+
+            loaded = self._loaded = (key, Story.load_story(self.path))
+        return loaded[1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive connections: every response has a Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately: without TCP_NODELAY, small
+    # bodies wait for the client's delayed acknowledgement (about 40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def _respond(self, head):
+        path = unquote(urlsplit(self.path).path)
+        if path == '/':
+            body = json.dumps({'stories': self.server.names()}).encode('utf-8')
+            return self._send(200, body, CONTENT_TYPES['json'], head=head)
+        if not path.startswith('/stories/'):
+            return self._send_error(404, "Not found")
+        name, _, format = path[len('/stories/'):].rpartition('.')
+        if format not in CONTENT_TYPES:
+            name, format = path[len('/stories/'):], 'json'
+        try:
+            response = self.server.response(name, format)
+        except Exception as error:
+            return self._send_error(500, f"Rendering {name} failed: {error}")
+        if response is None:
+            return self._send_error(404, f"No story named {name}")
+
+        gzipped = (response.gzipped is not None
+                   and _accepts_gzip(self.headers.get('Accept-Encoding')))
+        # Each representation has its own ETag, so that a 304 validates the
+        # body the client holds
+        etag = response.etag[:-1] + '-gz"' if gzipped else response.etag
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if _etag_matches(self.headers.get('If-None-Match'), etag):
+            return self._send(304, b'', None, headers, head=True)
+        body = response.body
+        if gzipped:
+            body = response.gzipped
+            headers['Content-Encoding'] = 'gzip'
+        self._send(200, body, response.content_type, headers, head=head)
+
+    def _send_error(self, status, message):
+        self._send(status, message.encode('utf-8'), 'text/plain; charset=utf-8')
+
+    def _send(self, status, body, content_type, headers=None, head=False):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0' if status == 304 else str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def _accepts_gzip(header):
+    """
+    Checks whether an Accept-Encoding header accepts gzip: with a q-value
+    above 0 for gzip (or x-gzip), or else for '*'.
+    """
+    if not header:
+        return False
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def _etag_matches(header, etag):
+    """
+    Checks whether an If-None-Match header matches an ETag.
+    """
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    # Weak comparison, as required for If-None-Match
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+def _stat(path):
+    """
+    Returns the modification time and size of a file, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _frames_version(frames):
+    """
+    Returns a hash of the content of DataFrames.
+    """
+    import altair as alt
+
+    from .story import _content_hash
+
+    digest = hashlib.sha256()
+    for frame in frames:
+        digest.update(_content_hash(frame, lambda: alt.data_transformers.get()(frame)['values'])
+                      .encode('ascii'))
+    return digest.hexdigest()[:32]
+
+
+def _to_html(spec, mode='vega-lite'):
+    """
+    Returns an HTML page displaying a Vega-Lite or Vega specification with
+    vega-embed.
+    """
+    import altair as alt
+    from altair.utils.html import spec_to_html
+
+    return spec_to_html(spec, mode, vega_version=alt.VEGA_VERSION,
+                        vegaembed_version=alt.VEGAEMBED_VERSION,
+                        vegalite_version=alt.VEGALITE_VERSION)
@@ -0,0 +1,277 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+import altair as alt
+
+# Frames smaller than this are pickled inline, with the rest of the story
+DEFAULT_MIN_BYTES = 1 << 20
+
+# Largest number of frames loaded from shared memory kept by a process
+MAX_ATTACHED = 16
+
+# Contexts entered with shared_data(), innermost last. A module-level list
+# rather than a context variable: ProcessPoolExecutor pickles its tasks in a
+# separate thread
+_active = []
+
+# Frames loaded by this process, with the shared memory segment each reads
+# in place (Arrow tables, Polars frames) or None, by name of the segment, in
+# LRU order
+_attached = OrderedDict()
+# Segments of frames evicted from _attached while still in use by stories,
+# closed once they are released
+_evicted = []
+_lock = threading.Lock()
+
+
+def shared_data(min_bytes=DEFAULT_MIN_BYTES):
+    """
+    Returns a context in which pickled stories reference their large
+    DataFrames through shared memory instead of embedding them.
+
+    Inside the context, each DataFrame of at least min_bytes held by a pickled
+    Story (main chart, annotations, lines, next-step charts) is written once
+    to a shared memory segment, as an Arrow IPC stream (or pickled, if it
+    cannot be converted to Arrow or pyarrow is not installed), and the
+    pickle only holds its name. Sending stories to worker processes then
+    costs about the size of their narrative layers, and a DataFrame shared by
+    many stories is copied once. Each worker process loads a segment once and
+    reuses the frame for every story referencing it, for the last
+    MAX_ATTACHED frames it loaded.
+
+    The segments are released when the context exits, so the stories must
+    have been unpickled by then, e.g. by shutting the pool down inside it:
+
+        with pynarrative.shared_data():
+            with ProcessPoolExecutor() as pool:
+                specs = list(pool.map(Story.to_json, stories))
+
+    DataFrames must not be modified in place while the context is open.
+
+    Parameters:
+    - min_bytes: Size from which DataFrames are shared, in bytes (default: 1 MB)
+
+    Returns:
+    - SharedData context manager
+    """
+    return SharedData(min_bytes)
+
+
+class SharedData:
+    """
+    SharedData class: Shared memory segments holding the DataFrames of pickled
+    stories (see shared_data).
+    """
+
+    def __init__(self, min_bytes=DEFAULT_MIN_BYTES):
+        self.min_bytes = min_bytes
+        self._segments = {}  # id(frame) -> (frame, segment, reference)
+
+    def __enter__(self):
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active.remove(self)
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Releases the shared memory segments created so far.
+        """
+        for _, segment, _ in self._segments.values():
+            segment.close()
+            segment.unlink()
+        self._segments = {}
+
+    def reference(self, frame):
+        """
+        Returns a picklable reference to a frame stored in shared memory, or
+        the frame itself if it is smaller than min_bytes.
+        """
+        entry = self._segments.get(id(frame))
+        if entry is None:
+            if _frame_bytes(frame) < self.min_bytes:
+                return frame
+            from multiprocessing import shared_memory
+
+            kind, payload = _serialize(frame)
+            segment = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+            try:
+                segment.buf[:len(payload)] = payload
+            except BaseException:
+                segment.close()
+                segment.unlink()
+                raise
+            # The frame is kept alive, so that its id is not reused while the
+            # entry exists
+            entry = (frame, segment, SharedFrame(segment.name, len(payload), kind))
+            self._segments[id(frame)] = entry
+        return entry[2]
+
+    def share_chart(self, chart):
+        """
+        Returns a copy of a chart whose large DataFrames are replaced by
+        references, or the chart itself if it has none.
+        """
+        return _map_data(chart, self.reference)
+
+
+class SharedFrame:
+    """
+    Picklable reference to a frame stored in shared memory.
+    """
+
+    __slots__ = ('name', 'size', 'kind')
+
+    def __init__(self, name, size, kind):
+        self.name = name
+        self.size = size
+        self.kind = kind
+
+    def __reduce__(self):
+        return SharedFrame, (self.name, self.size, self.kind)
+
+    def load(self):
+        """
+        Returns the frame, loading it from shared memory on first use in
+        this process.
+        """
+        with _lock:
+            entry = _attached.get(self.name)
+            if entry is not None:
+                _attached.move_to_end(self.name)
+                return entry[1]
+        from multiprocessing import shared_memory
+
+        segment = shared_memory.SharedMemory(name=self.name)
+        frame = _deserialize(self.kind, segment.buf[:self.size])
+        # pandas frames and unpickled ones hold copies of the data: their
+        # segment is closed at once
+        segment = _detach(segment)
+        with _lock:
+            _attached[self.name] = (segment, frame)
+            while len(_attached) > MAX_ATTACHED:
+                _evicted.append(_attached.popitem(last=False)[1][0])
+            _evicted[:] = [segment for segment in _evicted if _detach(segment) is not None]
+        return frame
+
+
+def _detach(segment):
+    """
+    Closes a shared memory segment, unless buffers of it are still in use
+    (e.g. by an Arrow table of a story).
+
+    Returns:
+    - None if the segment was closed, otherwise the segment
+    """
+    if segment is None:
+        return None
+    try:
+        segment.close()
+    except BufferError:
+        return segment
+    return None
+
+
+def active_sharing():
+    """
+    Returns the innermost SharedData context entered, or None.
+    """
+    return _active[-1] if _active else None
+
+
+def load_chart(chart):
+    """
+    Returns a copy of a chart whose frame references are replaced by the
+    frames, or the chart itself if it has none.
+    """
+    return _map_data(chart, lambda data: data.load() if isinstance(data, SharedFrame) else data)
+
+
+def _map_data(chart, function):
+    """
+    Applies function to the data of a chart and of its sub-charts, copying
+    only the charts whose data changed and their parents.
+    """
+    from .story import _shallow_copy
+
+    data = getattr(chart, 'data', alt.Undefined)
+    changes = {}
+    if data is not alt.Undefined:
+        mapped = function(data)
+        if mapped is not data:
+            changes['data'] = mapped
+    for key in ('layer', 'hconcat', 'vconcat', 'concat'):
+        children = getattr(chart, key, alt.Undefined)
+        if children is not alt.Undefined:
+            mapped = [_map_data(child, function) for child in children]
+            if any(new is not old for new, old in zip(mapped, children)):
+                changes[key] = mapped
+    if not changes:
+        return chart
+    chart = _shallow_copy(chart)
+    for key, value in changes.items():
+        setattr(chart, key, value)
+    return chart
+
+
+def _frame_bytes(frame):
+    """
+    Returns the approximate size of a frame in bytes, or 0 if it is not a
+    DataFrame or table.
+    """
+    from .story import _is_frame
+
+    if not _is_frame(frame):
+        return 0
+    if hasattr(frame, 'memory_usage'):  # pandas
+        return int(frame.memory_usage(index=True).sum())
+    if hasattr(frame, 'estimated_size'):  # Polars
+        return frame.estimated_size()
+    return getattr(frame, 'nbytes', 0)  # Arrow
+
+
+def _serialize(frame):
+    """
+    Serializes a frame for shared memory.
+
+    Returns:
+    - Tuple (kind, payload): 'arrow', 'polars' or 'pandas' for an Arrow IPC
+      stream of the frame, 'pickle' for a pickle
+    """
+    try:
+        import pyarrow as pa
+
+        if isinstance(frame, (pa.Table, pa.RecordBatch)):
+            kind, table = 'arrow', frame
+        elif hasattr(frame, 'to_arrow'):
+            kind, table = 'polars', frame.to_arrow()
+        else:
+            kind, table = 'pandas', pa.Table.from_pandas(frame)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write(table)
+        return kind, memoryview(sink.getvalue()).cast('B')
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        # pyarrow is missing, or the pandas columns (e.g. of mixed Python
+        # objects) have no Arrow equivalent
+        return 'pickle', pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _deserialize(kind, buffer):
+    """
+    Returns the frame serialized by _serialize() in a buffer.
+    """
+    if kind == 'pickle':
+        return pickle.loads(buffer)
+    import pyarrow as pa
+    table = pa.ipc.open_stream(pa.py_buffer(buffer)).read_all()
+    if kind == 'pandas':
+        return table.to_pandas()
+    if kind == 'polars':
+        import polars as pl
+        return pl.from_arrow(table)
+    return table
@@ -1,5 +1,124 @@
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import string
+import sys
+import threading
+
 import altair as alt
-import pandas as pd
+
+from .layers import (AnnotationLayer, ContextLayer, CtaLayer, Layer, LineLayer, NextStepsLayer,
+                     SourceLayer, TitleLayer, default_theme)
+from .projection import chart_fields, column_projection, project
+from .validation import MODES as VALIDATION_MODES, validate_spec
+
+# pandas is imported by the methods that build DataFrames, so that importing
+# pynarrative, or telling a story from a URL or another dataframe library,
+# does not pay for importing it
+
+# Dictionary that maps arrow directions to corresponding Unicode symbols
+ARROW_SYMBOLS = {
+    'left': '←', 'right': '→', 'up': '↑', 'down': '↓',
+    'upleft': '↖', 'upright': '↗', 'downleft': '↙', 'downright': '↘',
+    'leftup': '↰', 'leftdown': '↲', 'rightup': '↱', 'rightdown': '↳',
+    'upleftcurve': '↺', 'uprightcurve': '↻'
+}
+
+# Vega-Lite types and their shorthand codes
+TYPE_CODES = {'quantitative': 'Q', 'ordinal': 'O', 'nominal': 'N', 'temporal': 'T'}
+
+# How render() places each type of layer: 'text' overlays built by the given
+# Story method, charts of the layer overlaid on the main chart ('overlay'), or
+# placed beside it ('side'); layers of other types are ignored
+_LAYER_DISPATCH = {
+    'title': ('text', 'create_title_layer'),
+    'context': ('text', 'create_text_layer'),
+    'cta': ('text', 'create_text_layer'),
+    'source': ('text', 'create_text_layer'),
+    'annotation': ('overlay', None),
+    'line': ('overlay', None),
+    'shape': ('overlay', None),
+    'shape_label': ('overlay', None),
+    'special_cta': ('side', None),
+}
+
+# Tracer receiving the spans of builders, render phases, validation and
+# serialization (see set_tracer); None disables tracing
+_tracer = None
+
+
+def set_tracer(tracer):
+    """
+    Installs a tracer receiving timed spans for the phases of building and
+    rendering stories.
+
+    The tracer must provide the OpenTelemetry method
+    `start_as_current_span(name, attributes=None)`, returning a context manager
+    that yields a span with a `set_attribute(key, value)` method; an
+    OpenTelemetry tracer (`opentelemetry.trace.get_tracer(...)`) can be used
+    as is. Spans are named 'pynarrative.<phase>': one per add_* builder call,
+    'pynarrative.render' with its 'pynarrative.render.*' sub-phases (one per
+    layer built, dataset naming, layout composition), 'pynarrative.validate'
+    and 'pynarrative.serialize'. Their attributes include layer types, row
+    counts and byte sizes.
+
+    Parameters:
+    - tracer: Tracer object, or None to disable tracing (the default)
+
+    Returns:
+    - The previously installed tracer
+    """
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+class _NoSpan:
+    """
+    Context manager standing in for a span while tracing is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _span(name, attributes=None):
+    """
+    Starts a span with the installed tracer, or does nothing if there is none.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def _traced(method):
+    """
+    Decorator emitting a 'pynarrative.<method name>' span for each call of a
+    builder method.
+    """
+    name = 'pynarrative.' + method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _tracer is None:
+            return method(self, *args, **kwargs)
+        with _tracer.start_as_current_span(name) as span:
+            result = method(self, *args, **kwargs)
+            span.set_attribute('story.layers', len(self.story_layers))
+            return result
+    return wrapper
+
 
 class Story:
     """
@@ -10,49 +129,112 @@ class Story:
     the creation of more engaging and informative data visualisations.
     """
 
-    def __init__(self, data=None, width=600, height=400, font='Arial', base_font_size=16, **kwargs):
+    def __init__(self, data=None, width=600, height=400, font='Arial', base_font_size=16,
+                 constant_overlays=True, max_points=None, downsample='lttb', theme=None,
+                 compact=False, precision='auto', validation='always', **kwargs):
         """
         Initialise a Story object.
 
         Parameters:
-        - data: DataFrame or URL for graph data  (default: None)
+        - data: DataFrame (pandas, Polars, Arrow table) or URL for graph data; Polars
+          and Arrow data are used as is, without conversion to pandas (default: None)
         - width: Graph width in pixels (default: 600)
         - height: Height of the graph in pixels (default: 400)
         - font: Font to be used for all text elements (default: 'Arial')
         - base_font_size: Basic font size in pixels (default: 16)
+        - constant_overlays: If True, titles, context, CTA and source texts are drawn
+          from a single constant datum instead of the main dataset (default: True)
+        - max_points: Maximum number of points per series of a line or area main
+          chart; larger series are downsampled at render. 'auto' uses the width
+          of the chart, one point per pixel (default: None, no downsampling)
+        - downsample: Downsampling method, 'lttb' (Largest-Triangle-Three-Buckets)
+          or 'minmax' (minimum and maximum of each slice of the x axis)
+          (default: 'lttb')
+        - theme: Theme object giving the font sizes and colours of the text
+          elements, in place of base_font_size (default: the shared default
+          theme for base_font_size)
+        - compact: If True, the data is written in a more compact form: floats
+          rounded to `precision` significant digits, datetimes as timestamps in
+          milliseconds (naive datetimes taken as UTC), and columns of few
+          distinct strings as indices into a list of the strings, decoded by
+          a transform in the browser (default: False)
+        - precision: Significant digits of the floats of compact data, relative
+          to the extent of their column; 'auto' keeps them exact to less than
+          a pixel of the chart (default: 'auto')
+        - validation: When to_dict(), to_json() and write_json() validate the
+          specification against the Vega-Lite schema: 'always'; 'once', only
+          the first specification of each structure in the process, later
+          ones differing only by their data or texts being skipped (see
+          validation.structure_key); or 'never' (default: 'always')
         - **kwargs: Additional parameters to be passed to the constructor of alt.Chart
         """
+        if downsample not in ('lttb', 'minmax'):
+            raise ValueError("downsample must be either 'lttb' or 'minmax'")
+        if not (max_points is None or max_points == 'auto'
+                or (isinstance(max_points, int) and max_points >= 4)):
+            raise ValueError("max_points must be None, 'auto' or an integer of at least 4")
+        if not (precision == 'auto' or (isinstance(precision, int) and precision >= 1)):
+            raise ValueError("precision must be 'auto' or a positive integer")
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f"validation must be one of {VALIDATION_MODES}")
+
         # Initialising the Altair Chart object with basic parameters
         self.chart = alt.Chart(data, width=width, height=height, **kwargs)
         self.font = font
-        self.base_font_size = base_font_size
-        self.story_layers = []  # List for storing history layers
-        
-        # Dictionaries for the sizes and colours of various text elements
-        # These values are multipliers for base_font_size
-        self.font_sizes = {
-            'title': 2,        # The title will be twice as big as the basic font
-            'subtitle': 1.5,   # The subtitle will be 1.5 times bigger
-            'context': 1.2,    # The context text will be 1.2 times larger
-            'nextstep': 1.3,   # Next-Step text will be 1.3 times larger
-            'source': 1        # The source text will have the basic size
-        }
-        # Predefined colours for various text elements
-        self.colors = {
-            'title': 'black',
-            'subtitle': 'gray',
-            'context': 'black',
-            'nextstep': 'black',
-            'source': 'gray'
-        }
+        # Font sizes and colours of the text elements, shared between stories
+        self.theme = default_theme(base_font_size) if theme is None else theme
+        self.constant_overlays = constant_overlays
+        self.max_points = max_points
+        self.downsample = downsample
+        self.compact = compact
+        self.precision = precision
+        self.validation = validation
+        self.story_layers = []  # List for storing history layers (see layers.py)
         self.config = {}
 
+        # Built overlays, sub-charts and dataset hashes reused between renders,
+        # and the lock serialising the renders that read and replace them
+        self._render_cache = {}
+        self._dataset_cache = {}
+        self._render_lock = threading.RLock()
+        # (name, columns) of the dataset of the main chart as last rendered
+        self._main_dataset = None
+
+    @property
+    def base_font_size(self):
+        """
+        Basic font size in pixels, from the theme. Setting it replaces the theme
+        with a copy using the new size.
+        """
+        return self.theme.base_font_size
+
+    @base_font_size.setter
+    def base_font_size(self, value):
+        self.theme = self.theme.replace(base_font_size=value)
+
+    @property
+    def font_sizes(self):
+        """
+        Read-only font sizes of the text elements, as multipliers of
+        base_font_size (use theme.replace() to change them).
+        """
+        return self.theme.font_sizes
+
+    @property
+    def colors(self):
+        """
+        Read-only colours of the text elements (use theme.replace() to change them).
+        """
+        return self.theme.colors
+
     def __getattr__(self, name):
         """
         Special method to delegate attributes not found to the Altair Chart object.
         
         This method is crucial for maintaining compatibility with Altair, allowing
-        to call Altair methods directly on the Story object.
+        to call Altair methods directly on the Story object. Methods of alt.Chart
+        have pre-built delegates on the Story class (see _install_delegates), so
+        this is only reached for the other attributes, such as chart properties.
 
         Parameters:
         - name: Name of the required attribute
@@ -60,6 +242,12 @@ class Story:
         Returns:
         - Altair attribute if it exists, otherwise raises an AttributeError
         """
+        # Special attributes are not delegated, nor is anything while the story
+        # is being unpickled or copied, before chart is set (self.chart would
+        # call __getattr__ again)
+        if name.startswith('__') or 'chart' not in self.__dict__:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
         # Search for the attribute in Altair's Chart object
         attr = getattr(self.chart, name)
         
@@ -87,6 +275,68 @@ class Story:
         # If the attribute is not callable (it is a property), we return it directly
         return attr
 
+    def __getstate__(self):
+        """
+        Returns the state of the story for pickling and deep copies.
+
+        The render caches and their lock are left out, since the keys of the
+        caches are object identities that do not survive pickling. Inside a shared_data() context, large
+        DataFrames are replaced by references to shared memory.
+        """
+        state = dict(self.__dict__)
+        state['_render_cache'] = {}
+        state['_dataset_cache'] = {}
+        state.pop('_render_lock', None)
+
+        from .sharing import active_sharing
+        sharing = active_sharing()
+        if sharing is not None:
+            state['chart'] = sharing.share_chart(self.chart)
+            layers = []
+            for layer in self.story_layers:
+                chart = layer.get('chart')
+                if chart is not None:
+                    shared = sharing.share_chart(chart)
+                    if shared is not chart:
+                        layer = copy.copy(layer)
+                        layer['chart'] = shared
+                layers.append(layer)
+            state['story_layers'] = layers
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled story, loading the DataFrames it references from
+        shared memory.
+        """
+        from .sharing import load_chart
+
+        self.__dict__.update(state)
+        self._render_lock = threading.RLock()
+        self.chart = load_chart(self.chart)
+        for index, layer in enumerate(self.story_layers):
+            chart = layer.get('chart')
+            if chart is not None:
+                loaded = load_chart(chart)
+                if loaded is not chart:
+                    layer['chart'] = loaded
+
+    def __copy__(self):
+        """
+        Returns a copy of the story sharing its chart, layer records and
+        render caches, with its own list of layers and configuration, so that
+        adding layers to the copy leaves the original unchanged.
+        """
+        story = type(self).__new__(type(self))
+        story.__dict__.update(self.__dict__)
+        story.story_layers = list(self.story_layers)
+        story.config = dict(self.config)
+        story._render_cache = dict(self._render_cache)
+        story._dataset_cache = dict(self._dataset_cache)
+        story._render_lock = threading.RLock()
+        return story
+
+    @_traced
     def add_title(self, title, subtitle=None, title_color=None, subtitle_color=None, title_font_size=None, subtitle_font_size=None, dx=None, dy=None, s_dx=None, s_dy=None):
         """
         Adds a title layer (and optional subtitle) to the story.
@@ -106,21 +356,21 @@ class Story:
         returns:
         - self, to allow method chaining
         """
-        self.story_layers.append({
-            'type': 'title', 
-            'title': title, 
-            'subtitle': subtitle,
-            'title_color': title_color or self.colors['title'],
-            'subtitle_color': subtitle_color or self.colors['subtitle'],
-            'title_font_size': title_font_size or self.em_to_px(self.font_sizes['title']),
-            'subtitle_font_size': subtitle_font_size or self.em_to_px(self.font_sizes['subtitle']),
-            'dx': dx or 0,
-            'dy': dy or 0,
-            's_dx': s_dx or 0,
-            's_dy': s_dy or 0
-        })
+        self.story_layers.append(TitleLayer(
+            title=title,
+            subtitle=subtitle,
+            title_color=title_color or self.theme.colors['title'],
+            subtitle_color=subtitle_color or self.theme.colors['subtitle'],
+            title_font_size=title_font_size or self.theme.font_px['title'],
+            subtitle_font_size=subtitle_font_size or self.theme.font_px['subtitle'],
+            dx=dx or 0,
+            dy=dy or 0,
+            s_dx=s_dx or 0,
+            s_dy=s_dy or 0
+        ))
         return self
 
+    @_traced
     def add_context(self, text, position='left', color=None, dx=0, dy=0, font_size=None):
         """
         Adds a context layer to the story.
@@ -136,19 +386,18 @@ class Story:
         returns:
         - self, to allow method chaining
         """
-        self.story_layers.append({
-            'type': 'context', 
-            'text': text, 
-            'position': position,
-            'color': color or self.colors['context'],
-            'dx': dx,
-            'dy': dy,
-            'font_size' : font_size or self.em_to_px(self.font_sizes['context'])
-            
-        })
+        self.story_layers.append(ContextLayer(
+            text=text,
+            position=position,
+            color=color or self.theme.colors['context'],
+            dx=dx,
+            dy=dy,
+            font_size=font_size or self.theme.font_px['context']
+        ))
         return self
 
 
+    @_traced
     def add_next_steps(self, 
         #Basic parameters
         text=None,
@@ -273,6 +522,8 @@ class Story:
         -------
         self : Story object                                     The current instance for method chaining
         """
+        import pandas as pd
+
  
  
         # Apply general parameters to specific parameters if not set
@@ -308,12 +559,11 @@ class Story:
         if mode is None:
             if text is None:
                 raise ValueError("The parameter ‘text’ is required for the basic version")
-            self.story_layers.append({
-                'type': 'cta', 
-                'text': text, 
-                'position': position,
-                'color': color or self.colors['cta']
-            })
+            self.story_layers.append(CtaLayer(
+                text=text,
+                position=position,
+                color=color or self.theme.colors['cta']
+            ))
             return self
 
         # Mode validation
@@ -525,14 +775,11 @@ class Story:
             )
 
         # Addition to layer
-        self.story_layers.append({
-            'type': 'special_cta',
-            'chart': chart,
-            'position': position
-        })
+        self.story_layers.append(NextStepsLayer(chart=chart, position=position))
         
         return self
     
+    @_traced
     def add_source(self, text, position='bottom', vertical=False, color=None, dx=None, dy=None, font_size=None):
         """
         Add a source layer to the story.
@@ -549,19 +796,18 @@ class Story:
         Ritorna:
         - self, to allow the method chaining
         """
-        self.story_layers.append({
-            'type': 'source', 
-            'text': text, 
-            'position': position, 
-            'vertical': vertical,
-            'color': color or self.colors['source'],
-            'dx': dx or 0,
-            'dy': dy or 0,
-            'font_size': font_size or self.em_to_px(self.font_sizes['source'])
-            
-        })
+        self.story_layers.append(SourceLayer(
+            text=text,
+            position=position,
+            vertical=vertical,
+            color=color or self.theme.colors['source'],
+            dx=dx or 0,
+            dy=dy or 0,
+            font_size=font_size or self.theme.font_px['source']
+        ))
         return self
 
+    @_traced
     def add_annotation(self, x_point, y_point, annotation_text="Point of interest", 
                                      arrow_direction='right', arrow_color='blue', arrow_size=40,
                                      label_color='black', label_size=12,
@@ -589,88 +835,22 @@ class Story:
         returns:
         - self, to allow method chaining
         """
-        
-        # Dictionary that maps arrow directions to corresponding Unicode symbols
-        arrow_symbols = {
-            'left': '←', 'right': '→', 'up': '↑', 'down': '↓',
-            'upleft': '↖', 'upright': '↗', 'downleft': '↙', 'downright': '↘',
-            'leftup': '↰', 'leftdown': '↲', 'rightup': '↱', 'rightdown': '↳',
-            'upleftcurve': '↺', 'uprightcurve': '↻'
-        }
+        import pandas as pd
 
+        
         # Check that the direction of the arrow is valid
-        if arrow_direction not in arrow_symbols:
-            raise ValueError(f"Invalid arrow direction. Use one of: {', '.join(arrow_symbols.keys())}")
+        if arrow_direction not in ARROW_SYMBOLS:
+            raise ValueError(f"Invalid arrow direction. Use one of: {', '.join(ARROW_SYMBOLS.keys())}")
 
         # Select the appropriate arrow symbol
-        arrow_symbol = arrow_symbols[arrow_direction]
+        arrow_symbol = ARROW_SYMBOLS[arrow_direction]
         
-        # checks whether the encoding has already been defined
-        if not hasattr(self.chart, 'encoding')or not hasattr(self.chart.encoding, 'x'):
-            # If encoding is not defined use of default values
-            x_type = 'Q'
-            y_type = 'Q'
-        else:
-            # If encoding is defined, we extract the data types for the x and y axes
-            x_type = self.chart.encoding.x.shorthand.split(':')[-1]
-            y_type = self.chart.encoding.y.shorthand.split(':')[-1]
-
-        # Explanation of data type extraction:
-        # 1. We first check whether the encoding has been defined. This is important because
-        # the user may call this method before defining the encoding of the graph.
-        # (The encoding in Altair defines how the data is mapped to the visual properties of the graph).
-        # 2. If encoding is not defined, we use ‘Q’ (Quantitative) as the default data type
-        # for both axes. This allows the method to work even without a defined encoding.
-        # 3. If the encoding is defined, we proceed with the data type extraction as before:
-        # - self.chart.encoding.x.shorthand: accesses the shorthand of the x-axis
-        # .shorthand: In Altair, ‘shorthand’ is a concise notation for specifying the encoding.
-        # Example of shorthand: ‘column:Q’ where ‘column’ is the name of the data column
-        # and ‘Q’ is the data type (in this case, Quantitative).
-        # - split(‘:’)[-1]: splits the shorthand at ‘:’ and takes the last element (the data type)
-        # Example: If shorthand is ‘price:Q’, split(‘:’) will return [‘price’, ‘Q’].
-        # 4. The extracted data type will be one of:
-        # - ‘Q’: Quantitative (continuous numeric)
-        # - ‘O’: Ordinal (ordered categories)
-        # N': Nominal (unordered categories)
-        # T': Temporal (dates or times)
-        
-        # Important: This operation is essential to ensure that the annotations
-        # added to the graph are consistent with the original axis data types.
-        # Without this match, annotations may be positioned
-        # incorrectly or cause rendering errors.
+        # Data types of the x and y axes of the main chart
+        x_type, y_type = self._axis_types()
 
         # Create a DataFrame with a single point for the annotation
         annotation_data = pd.DataFrame({'x': [x_point], 'y': [y_point]})
         
-        # Internal function to create the correct encoding based on the data type
-        def create_encoding(field, dtype):
-            """
-            Creates the appropriate encoding for Altair based on the data type.
-            This function is crucial to ensure that the annotation is
-            consistent with the original chart data type.
-            
-            Parameters:
-            - field: str - The field name to encode ('x' or 'y')
-            - dtype: str - The data type to use for encoding. Can be:
-                        'O' for Ordinal (ordered categories)
-                        'N' for Nominal (unordered categories) 
-                        'T' for Temporal (dates/times)
-                        'Q' for Quantitative (default, continuous numeric)
-
-            Returns:
-            - alt.X or alt.Y encoding object configured with the specified field and data type
-                 
-            """
-            
-            if dtype == 'O':  # Ordinal
-                return alt.X(field + ':O', title='') if field == 'x' else alt.Y(field + ':O', title='')
-            elif dtype == 'N':  # Nominal
-                return alt.X(field + ':N', title='') if field == 'x' else alt.Y(field + ':N', title='')
-            elif dtype == 'T':  # Temporal
-                return alt.X(field + ':T', title='') if field == 'x' else alt.Y(field + ':T', title='')
-            else:  # Quantity (default)
-                return alt.X(field + ':Q', title='') if field == 'x' else alt.Y(field + ':Q', title='')
-
         # Initialises the list of annotation layers
         layers = []
 
@@ -680,8 +860,8 @@ class Story:
                 color=point_color,
                 size=point_size
             ).encode(
-                x=create_encoding('x', x_type),
-                y=create_encoding('y', y_type)
+                x=self._axis_encoding('x', x_type),
+                y=self._axis_encoding('y', y_type)
             )
             layers.append(point_layer)
 
@@ -694,8 +874,8 @@ class Story:
             dy=arrow_dy,  # Vertical offset to position the arrow                     was -22
             color=arrow_color
         ).encode(
-            x=create_encoding('x', x_type),
-            y=create_encoding('y', y_type)
+            x=self._axis_encoding('x', x_type),
+            y=self._axis_encoding('y', y_type)
         )
         layers.append(arrow_layer)
 
@@ -709,8 +889,8 @@ class Story:
             color=label_color,
             text=annotation_text
         ).encode(
-            x=create_encoding('x', x_type),
-            y=create_encoding('y', y_type)
+            x=self._axis_encoding('x', x_type),
+            y=self._axis_encoding('y', y_type)
         )
         layers.append(label_layer)
 
@@ -718,10 +898,7 @@ class Story:
         annotation = alt.layer(*layers)
 
         # Adds annotation to history layers
-        self.story_layers.append({
-            'type': 'annotation',
-            'chart': annotation
-        })
+        self.story_layers.append(AnnotationLayer(chart=annotation))
 
         # Note on flexibility and robustness:
         # This approach makes the add_annotation method more flexible,
@@ -735,6 +912,211 @@ class Story:
         return self  # Return self to allow method chaining
     
     
+    @_traced
+    def add_annotations(self, annotations, x='x', y='y', text='text', direction='right',
+                        arrow_color='blue', arrow_size=40,
+                        label_color='black', label_size=12,
+                        show_point=True, point_color='red', point_size=60,
+                        arrow_dx=0, arrow_dy=-45,
+                        label_dx=37, label_dy=-37):
+        """
+        Create many arrow annotations at once from a DataFrame.
+
+        Unlike repeated calls to add_annotation, which create up to three layers
+        and a one-row dataset per annotation, all the annotations share one
+        dataset and are drawn by at most three layers (points, arrows and labels).
+        Per-row styling is driven by encodings, so the number of layers does not
+        depend on the number of annotations.
+
+        Every styling parameter accepts either a constant value, applied to all
+        annotations, or the name of a column of `annotations` holding one value
+        per row.
+
+        Parameters:
+        - annotations: DataFrame with one row per annotation
+        - x, y: Columns holding the coordinates of the points (default: 'x', 'y')
+        - text: Column holding the annotation texts (default: 'text')
+        - direction: Arrow direction, or column of directions (default: 'right')
+        - arrow_color, arrow_size: Arrow colour and size
+        - label_color, label_size: Colour and size of the annotation text
+        - show_point: If True, shows a point at the annotation location
+          (a column of booleans shows points only for some rows)
+        - point_color, point_size: Colour and size of the point
+        - arrow_dx, arrow_dy: Distances in pixels to be added to the arrow position (default:0, -45)
+        - label_dx, label_dy: Distances in pixels to be added to the label position (default:37, -37)
+
+        returns:
+        - self, to allow method chaining
+        """
+        import pandas as pd
+
+        def is_column(value):
+            return isinstance(value, str) and value in annotations.columns
+
+        # Directions are validated and translated into arrow glyphs column-wise
+        directions = annotations[direction] if is_column(direction) else pd.Series(direction, index=annotations.index)
+        invalid = set(directions) - set(ARROW_SYMBOLS)
+        if invalid:
+            raise ValueError(f"Invalid arrow direction {sorted(map(str, invalid))}. "
+                             f"Use one of: {', '.join(ARROW_SYMBOLS.keys())}")
+
+        annotation_data = pd.DataFrame({
+            'x': annotations[x].to_numpy(),
+            'y': annotations[y].to_numpy(),
+            'text': annotations[text].to_numpy() if is_column(text) else text,
+            'arrow': directions.map(ARROW_SYMBOLS).to_numpy(),
+        })
+
+        # Styles given as column names become per-row encodings, the others
+        # remain constant mark properties
+        mark_styles = {}
+        encoded_styles = {}
+        styles = {
+            'point_color': point_color, 'point_size': point_size,
+            'arrow_color': arrow_color, 'arrow_size': arrow_size,
+            'label_color': label_color, 'label_size': label_size,
+        }
+        for name, value in styles.items():
+            if is_column(value):
+                annotation_data[name] = annotations[value].to_numpy()
+                channel = alt.Color if name.endswith('color') else alt.Size
+                encoded_styles[name] = channel(f"{name}:{'N' if name.endswith('color') else 'Q'}",
+                                               scale=None, legend=None)
+            else:
+                mark_styles[name] = value
+
+        def style(prefix):
+            # Returns the mark properties and encodings of a layer for a style prefix
+            mark, encoding = {}, {}
+            for prop, channel in (('color', 'color'), ('size', 'size')):
+                name = f'{prefix}_{prop}'
+                if name in encoded_styles:
+                    encoding[channel] = encoded_styles[name]
+                else:
+                    # The size of a text mark is its font size
+                    mark['fontSize' if prop == 'size' and prefix != 'point' else prop] = mark_styles[name]
+            return mark, encoding
+
+        x_type, y_type = self._axis_types()
+        position = {
+            'x': self._axis_encoding('x', x_type),
+            'y': self._axis_encoding('y', y_type)
+        }
+
+        layers = []
+
+        if show_point is not False:
+            mark, encoding = style('point')
+            point_layer = alt.Chart().mark_point(**mark).encode(**position, **encoding)
+            if is_column(show_point):
+                annotation_data['show_point'] = annotations[show_point].astype(bool).to_numpy()
+                point_layer = point_layer.transform_filter('datum.show_point')
+            layers.append(point_layer)
+
+        mark, encoding = style('arrow')
+        layers.append(alt.Chart().mark_text(dx=arrow_dx, dy=arrow_dy, **mark).encode(
+            text='arrow:N', **position, **encoding
+        ))
+
+        mark, encoding = style('label')
+        layers.append(alt.Chart().mark_text(
+            align='left', baseline='top', dx=label_dx, dy=label_dy, **mark
+        ).encode(
+            text='text:N', **position, **encoding
+        ))
+
+        # All the layers share the annotation dataset
+        self.story_layers.append(AnnotationLayer(chart=alt.layer(*layers, data=annotation_data)))
+        return self
+
+    def _axis_types(self):
+        """
+        Extracts the data types of the x and y axes of the main chart.
+
+        Annotations must be encoded with the same types as the axes they are
+        drawn on, otherwise they may be positioned incorrectly.
+
+        Returns:
+        - Tuple (x_type, y_type) of Vega-Lite type codes ('Q', 'O', 'N' or 'T')
+        """
+        # checks whether the encoding has already been defined
+        if not hasattr(self.chart, 'encoding')or not hasattr(self.chart.encoding, 'x'):
+            # If encoding is not defined use of default values
+            x_type = 'Q'
+            y_type = 'Q'
+        else:
+            # If encoding is defined, we extract the data types for the x and y axes
+            x_type = self._channel_type(self.chart.encoding.x)
+            y_type = self._channel_type(self.chart.encoding.y)
+
+        # Explanation of data type extraction:
+        # 1. We first check whether the encoding has been defined. This is important because
+        # the user may call this method before defining the encoding of the graph.
+        # (The encoding in Altair defines how the data is mapped to the visual properties of the graph).
+        # 2. If encoding is not defined, we use ‘Q’ (Quantitative) as the default data type
+        # for both axes. This allows the method to work even without a defined encoding.
+        # 3. If the encoding is defined, we proceed with the data type extraction as before:
+        # - self.chart.encoding.x.shorthand: accesses the shorthand of the x-axis
+        # .shorthand: In Altair, ‘shorthand’ is a concise notation for specifying the encoding.
+        # Example of shorthand: ‘column:Q’ where ‘column’ is the name of the data column
+        # and ‘Q’ is the data type (in this case, Quantitative).
+        # - split(‘:’)[-1]: splits the shorthand at ‘:’ and takes the last element (the data type)
+        # Example: If shorthand is ‘price:Q’, split(‘:’) will return [‘price’, ‘Q’].
+        # 4. The extracted data type will be one of:
+        # - ‘Q’: Quantitative (continuous numeric)
+        # - ‘O’: Ordinal (ordered categories)
+        # N': Nominal (unordered categories)
+        # T': Temporal (dates or times)
+        
+        # Important: This operation is essential to ensure that the annotations
+        # added to the graph are consistent with the original axis data types.
+        # Without this match, annotations may be positioned
+        # incorrectly or cause rendering errors.
+
+        return x_type, y_type
+
+    @staticmethod
+    def _channel_type(channel):
+        """
+        Returns the type code of an encoding channel, from its shorthand or,
+        for channels given by field and type (e.g. in a story loaded with
+        Story.load_story()), from its type.
+        """
+        shorthand = getattr(channel, 'shorthand', alt.Undefined)
+        if isinstance(shorthand, str):
+            return shorthand.split(':')[-1]
+        return TYPE_CODES.get(getattr(channel, 'type', None), 'Q')
+
+    @staticmethod
+    def _axis_encoding(field, dtype):
+        """
+        Creates the appropriate encoding for Altair based on the data type.
+        This function is crucial to ensure that the annotation is
+        consistent with the original chart data type.
+
+        Parameters:
+        - field: str - The field name to encode ('x' or 'y')
+        - dtype: str - The data type to use for encoding. Can be:
+                    'O' for Ordinal (ordered categories)
+                    'N' for Nominal (unordered categories) 
+                    'T' for Temporal (dates/times)
+                    'Q' for Quantitative (default, continuous numeric)
+
+        Returns:
+        - alt.X or alt.Y encoding object configured with the specified field and data type
+
+        """
+
+        if dtype == 'O':  # Ordinal
+            return alt.X(field + ':O', title='') if field == 'x' else alt.Y(field + ':O', title='')
+        elif dtype == 'N':  # Nominal
+            return alt.X(field + ':N', title='') if field == 'x' else alt.Y(field + ':N', title='')
+        elif dtype == 'T':  # Temporal
+            return alt.X(field + ':T', title='') if field == 'x' else alt.Y(field + ':T', title='')
+        else:  # Quantity (default)
+            return alt.X(field + ':Q', title='') if field == 'x' else alt.Y(field + ':Q', title='')
+
+    @_traced
     def add_line(self, value, orientation='horizontal', color='red', stroke_width=2, stroke_dash=[]):
         """
         Adds a reference line to the story.
@@ -749,6 +1131,8 @@ class Story:
         Returns:
         - self, to allow method chaining
         """
+        import pandas as pd
+
         
         if orientation not in ['horizontal', 'vertical']:
             raise ValueError("orientation must be either 'horizontal' or 'vertical'")
@@ -781,10 +1165,7 @@ class Story:
         )
 
         # Aggiunge la linea ai layer della storia
-        self.story_layers.append({
-            'type': 'line',
-            'chart': line
-        })
+        self.story_layers.append(LineLayer(chart=line))
 
         return self
     
@@ -834,6 +1215,22 @@ class Story:
         # In this case, horizontally centred and 20 pixels from the bottom
         return positions.get(position, (self.chart.width / 2, self.chart.height - 20))
 
+    def _overlay_chart(self):
+        """
+        Returns the base chart on which the narrative text overlays are built.
+
+        Text overlays are positioned with alt.value(), so they never read any field
+        of the data. Binding them to the main dataset makes Vega draw one identical
+        mark per row; with constant_overlays enabled they are bound to a single
+        empty datum instead, so each overlay costs one mark whatever the data size.
+
+        Returns:
+        - Altair Chart object without mark or encoding
+        """
+        if self.constant_overlays:
+            return alt.Chart(alt.InlineData(values=[{}]))
+        return alt.Chart(self.chart.data)
+
     def create_title_layer(self, layer):
         """
         Creates the title layer (and subtitle if present).
@@ -842,12 +1239,12 @@ class Story:
         and the optional subtitle of the graphic.
 
         Parameters:
-        - Layer: Dictionary containing the title information
+        - Layer: Layer record (or dictionary) containing the title information
 
         Returns:
         - Altair Chart object representing the title layer
         """
-        title_chart = alt.Chart(self.chart.data).mark_text(
+        title_chart = self._overlay_chart().mark_text(
             text=layer['title'],
             fontSize=layer['title_font_size'],
             fontWeight='bold',
@@ -860,7 +1257,7 @@ class Story:
         )
         
         if layer['subtitle']:
-            subtitle_chart = alt.Chart(self.chart.data).mark_text(
+            subtitle_chart = self._overlay_chart().mark_text(
                 text=layer['subtitle'],
                 fontSize=layer['subtitle_font_size'],
                 align='center',
@@ -881,7 +1278,7 @@ class Story:
         such as adding context, next-steps or data source information.
 
         Parameters:
-        - Layer: Dictionary containing the text information to be added
+        - Layer: Layer record (or dictionary) containing the text information to be added
 
         Returns:
         - Altair Chart object representing the text layer
@@ -893,9 +1290,9 @@ class Story:
             x += layer.get('dx', 0)
             y += layer.get('dy', 0)
         
-        return alt.Chart(self.chart.data).mark_text(
+        return self._overlay_chart().mark_text(
             text=layer['text'],
-            fontSize=layer.get('font_size', self.em_to_px(self.font_sizes[layer['type']])),
+            fontSize=layer.get('font_size', self.theme.font_px[layer['type']]),
             align='center',
             baseline='middle',
             font=self.font,
@@ -922,13 +1319,99 @@ class Story:
         return self
 
 
-    def render(self):
+    def render(self, precompute=False):
         """
-        It renders all layers of the story in a single graphic.       
+        It renders all layers of the story in a single graphic.
+
+        Built overlays and the sub-charts of the layout (main chart with its
+        overlays, side stacks of next-step charts, final composition) are cached
+        between calls, keyed by the content of the layers they come from. A new
+        render only rebuilds the layers that changed since the previous one and
+        the parts of the layout that contain them; if nothing changed, the
+        previously rendered chart is returned as is.
+
+        The returned chart, and the sub-charts it shares with later renders,
+        must be treated as read-only: copy it (chart.copy()) before modifying
+        it. Concurrent renders of the same story, for instance by arender()
+        calls, run one at a time; the story itself must not be modified
+        while it is being rendered.
+
+        DataFrames are assumed not to be modified in place once added to the
+        story: call clear_cache() after doing so.
+
+        Parameters:
+        - precompute: If True, the transforms of the main chart (aggregate, bin,
+          window, filter) and the aggregations of its encodings are computed in
+          pandas, and only their result is embedded in the spec instead of the
+          raw rows. Transforms that cannot be computed are left to the browser.
+          Text overlays still embed the raw rows if constant_overlays is False
+          (default: False)
+
+        Returns:
+        - The Altair chart of the whole story
         """
-        # Let's start with the basic graph
-        main_chart = self.chart
-        
+        with self._render_lock:
+            with _span('pynarrative.render', {'story.layers': len(self.story_layers)}):
+                return self._render(precompute)
+
+    def _render(self, precompute):
+        """
+        Builds the chart of render(), reusing the cached parts.
+        """
+        cache = self._render_cache
+        self._render_cache = {}  # Keeps only the entries used by this render
+
+        def cached(key, refs, build, phase=None, attributes=None, describe=None):
+            # refs keeps alive the objects whose id() is part of the key, so that
+            # the ids cannot be reused by other objects while the entry exists
+            entry = cache.get(key)
+            if entry is None:
+                if phase is None or _tracer is None:
+                    entry = (refs, build())
+                else:
+                    # Only actual builds are traced, not the parts reused from
+                    # the cache; describe() gives attributes of the result
+                    with _tracer.start_as_current_span(phase, attributes=attributes) as span:
+                        entry = (refs, build())
+                        for name, value in (describe(entry[1]) if describe else {}).items():
+                            span.set_attribute(name, value)
+            self._render_cache[key] = entry
+            return entry[1]
+
+        def describe_datasets(result):
+            _, used, _ = result
+            return {
+                'datasets.count': len(used),
+                'datasets.rows': sum(len(values) for values in used.values()),
+            }
+
+        def describe_rows(chart):
+            data = getattr(chart, 'data', None)
+            return {'data.rows': len(data)} if _is_frame(data) else {}
+
+        # Every distinct dataset is stored only once, at the top level of the spec:
+        # each piece of the layout gets its inline data replaced by named references
+        datasets = {}
+        projection = {}
+
+        def named(chart, layer_type='main'):
+            chart, used, _ = cached(
+                ('named', id(chart), _freeze(projection), self._compact_digits()), chart,
+                lambda: self._name_datasets(chart, projection),
+                'pynarrative.render.datasets', {'layer.type': layer_type}, describe_datasets
+            )
+            datasets.update(used)
+            return chart
+
+        def fields(chart):
+            return cached(('fields', id(chart)), chart, lambda: chart_fields(chart))
+
+        # Everything the text overlays depend on besides their own layer
+        geometry = (
+            self.chart.width, self.chart.height, self.font, self.theme, self.constant_overlays,
+            None if self.constant_overlays else id(self.chart.data)
+        )
+
         # Create separate lists to place special graphics
         top_charts = []
         bottom_charts = []
@@ -936,50 +1419,898 @@ class Story:
         right_charts = []
         overlay_charts = []
         
-        # Organise the layers according to their position
+        sides = {'top': top_charts, 'bottom': bottom_charts, 'left': left_charts, 'right': right_charts}
+        parts = []  # (list, chart, layer type) of the charts of the layers
+
+        # Organise the layers according to their type and position
         for layer in self.story_layers:
-            if layer['type'] == 'special_cta':
+            layer_type = layer['type']
+            placement, builder = _LAYER_DISPATCH.get(layer_type, (None, None))
+            if placement == 'side':
                 # We take the position from the layer
-                if layer.get('position') == 'top':
-                    top_charts.append(layer['chart'])
-                elif layer.get('position') == 'bottom':
-                    bottom_charts.append(layer['chart'])
-                elif layer.get('position') == 'left':
-                    left_charts.append(layer['chart'])
-                elif layer.get('position') == 'right':
-                    right_charts.append(layer['chart'])
-            elif layer['type'] == 'title':
-                overlay_charts.append(self.create_title_layer(layer))
-            elif layer['type'] in ['context', 'cta', 'source']:
-                overlay_charts.append(self.create_text_layer(layer))
-            elif layer['type'] in ['shape', 'shape_label', 'annotation']:
-                overlay_charts.append(layer['chart'])
-            elif layer['type'] == 'line':
-                overlay_charts.append(layer['chart'])
-
-        # Overlaying the layers on the main graph
-        for overlay in overlay_charts:
-            main_chart += overlay
-
-        # Build the final layout
-        if left_charts:
-            main_chart = alt.hconcat(alt.vconcat(*left_charts), main_chart)
-        if right_charts:
-            main_chart = alt.hconcat(main_chart, alt.vconcat(*right_charts))
-        if top_charts:
-            main_chart = alt.vconcat(alt.hconcat(*top_charts), main_chart)
-        if bottom_charts:
-            main_chart = alt.vconcat(main_chart, alt.hconcat(*bottom_charts))
-
-        # Apply configurations
-        if 'view' in self.config:
-            main_chart = main_chart.configure_view(**self.config['view'])
-
-        return main_chart.resolve_axis(x='independent', y='independent')
-    
+                charts = sides.get(layer.get('position'))
+                if charts is not None:
+                    parts.append((charts, layer['chart'], layer_type))
+            elif placement == 'text':
+                build = getattr(self, builder)
+                parts.append((overlay_charts, cached(
+                    ('overlay', _freeze(layer), geometry), (tuple(layer.values()), self.chart.data),
+                    lambda: build(layer),
+                    'pynarrative.render.layer', {'layer.type': layer_type}
+                ), layer_type))
+            elif placement == 'overlay':
+                parts.append((overlay_charts, layer['chart'], layer_type))
+
+        main = self.chart
+        if precompute:
+            from .precompute import precompute_chart
+            main = cached(('precompute', id(main)), main, lambda: precompute_chart(main),
+                          'pynarrative.render.precompute', None, describe_rows)
+        max_points = self._max_points()
+        if max_points is not None:
+            # Only the main chart is downsampled: annotations and lines keep
+            # their exact coordinates
+            from .downsample import downsample_chart
+            source = main
+            main = cached(('downsample', id(source), max_points, self.downsample), source,
+                          lambda: downsample_chart(source, max_points, self.downsample),
+                          'pynarrative.render.downsample', None, describe_rows)
+
+        # Only the columns some layer reads are kept of each DataFrame
+        projection.update(column_projection([main] + [chart for _, chart, _ in parts], fields))
+        for charts, chart, layer_type in parts:
+            charts.append(named(chart, layer_type))
+        base_chart = named(main)
+
+        def overlay_main():
+            # Overlaying the layers on the main graph, in a single layer chart
+            # (adding them one by one re-processes all previous layers each time)
+            if not overlay_charts:
+                return base_chart
+            return _combine('layer', [base_chart] + overlay_charts)
+
+        def stack(side, kind, charts):
+            # Next-step charts placed on the same side of the main chart
+            if not charts:
+                return None
+            return cached((side, tuple(map(id, charts))), charts, lambda: _combine(kind, charts),
+                          'pynarrative.render.compose', {'layout.part': side})
+
+        main_chart = cached(
+            ('main', id(base_chart), tuple(map(id, overlay_charts))),
+            (base_chart, overlay_charts), overlay_main,
+            'pynarrative.render.compose', {'layout.part': 'main'}
+        )
+        left = stack('left', 'vconcat', left_charts)
+        right = stack('right', 'vconcat', right_charts)
+        top = stack('top', 'hconcat', top_charts)
+        bottom = stack('bottom', 'hconcat', bottom_charts)
+
+        def compose():
+            chart = main_chart
+
+            # Build the final layout
+            if left is not None:
+                chart = _combine('hconcat', [left, chart])
+            if right is not None:
+                chart = _combine('hconcat', [chart, right])
+            if top is not None:
+                chart = _combine('vconcat', [top, chart])
+            if bottom is not None:
+                chart = _combine('vconcat', [chart, bottom])
+
+            # Top-level properties are set on a shallow copy: configure_view() and
+            # resolve_axis() would copy the whole, possibly cached, layout tree
+            chart = _shallow_copy(chart)
+
+            # Apply configurations
+            if 'view' in self.config:
+                config = alt.Config() if chart.config is alt.Undefined else chart.config.copy()
+                config.view = alt.ViewConfig(**self.config['view'])
+                chart.config = config
+
+            resolve = alt.Resolve() if chart.resolve is alt.Undefined else chart.resolve.copy()
+            resolve.axis = alt.AxisResolveMap(x='independent', y='independent')
+            chart.resolve = resolve
+            if datasets:
+                chart.datasets = datasets
+            return chart
+
+        parts = (main_chart, left, right, top, bottom)
+        chart = cached(('final', tuple(map(id, parts)), _freeze(self.config)), parts, compose,
+                       'pynarrative.render.compose', {'layout.part': 'final'})
+
+        # Keep only the dataset conversions still referenced by the story
+        self._dataset_cache = {
+            id(entry[0]): entry
+            for key, (_, value) in self._render_cache.items() if key[0] == 'named'
+            for entry in value[2]
+        }
+        # The main chart may have been replaced by a precomputed or
+        # downsampled copy, with a DataFrame of its own
+        entry = self._dataset_cache.get(id(main.data)) if _is_frame(main.data) else None
+        self._main_dataset = None if entry is None else (entry[1], entry[3][0])
+        return chart
 
+    def _max_points(self):
+        """
+        Returns the number of points per series kept by downsampling, or None.
+        """
+        if self.max_points == 'auto':
+            # One point per pixel of the chart width
+            width = self.chart.width
+            return width if isinstance(width, int) else 600
+        return self.max_points
+
+    def _compact_digits(self):
+        """
+        Returns the significant digits of the floats of compact data, or None
+        if the data is not compacted.
+        """
+        if not self.compact:
+            return None
+        if self.precision == 'auto':
+            from .compact import significant_digits
+            return significant_digits(self.chart.width, self.chart.height)
+        return self.precision
+
+    def explain_cost(self, precompute=False, large_rows=5000):
+        """
+        Reports where the bytes and marks of the rendered story come from.
+
+        Each layer (the main chart, then story_layers in order) is described by
+        the datasets it embeds, the number of marks Vega will draw for it and
+        the transforms Vega-Lite will run in the browser. The number of marks
+        is exact when pandas can compute the transforms (see render(precompute=True)),
+        otherwise it is the number of rows the transforms receive; data only
+        known to Vega, such as URLs, counts as no mark.
+
+        Known hot spots are flagged: text overlays drawn once per row of the
+        data they are bound to, transforms run in the browser over large data,
+        and dense lines that max_points could downsample.
+
+        Parameters:
+        - precompute: Whether the story is rendered with precompute=True (default: False)
+        - large_rows: Number of rows above which data is considered large (default: 5000)
+
+        Returns:
+        - Dictionary with:
+          - 'spec_bytes': Size of the JSON specification in bytes
+          - 'marks': Total number of marks
+          - 'layers': List of dictionaries with the 'layer' ('main' or index in
+            story_layers), 'type', 'datasets' (names), 'rows', 'bytes', 'marks'
+            and 'transforms' of each layer
+          - 'datasets': Dictionary of the 'rows', 'bytes' (compact JSON) and
+            'layers' of each named dataset
+          - 'duplicates': Datasets read by several layers, stored once in the
+            specification, with the bytes this saves
+          - 'hotspots': List of dictionaries with the 'layer', 'kind' and
+            'message' of each hot spot found
+        """
+        from .cost import explain_cost
+        return explain_cost(self, precompute, large_rows)
+
+    def save_story(self, path):
+        """
+        Saves the story to a compact binary file, to be loaded with Story.load_story().
+
+        Not to be confused with save(), which Story delegates to the main
+        chart, as for the other methods of alt.Chart (e.g. save('chart.html')).
+
+        The file holds the specification of the charts, the narrative layers,
+        the theme and the settings of the story, as compressed JSON. The
+        DataFrames are stored once each, as Arrow IPC streams, in a side file
+        named path + '.data' (written only if the story has DataFrames).
+        Loading a story this way is much faster than building it again with
+        the builder methods, which validate and infer the types of every
+        encoding.
+
+        Saving a story with DataFrames requires pyarrow; a ValueError is
+        raised if a DataFrame cannot be converted to Arrow (e.g. columns of
+        mixed Python objects).
+
+        Parameters:
+        - path: Path of the file
+        """
+        from .ir import save
+        save(self, path)
+
+    @classmethod
+    def load_story(cls, path, allow_pickle=False):
+        """
+        Loads a story saved with Story.save_story().
+
+        Parameters:
+        - path: Path of the file
+        - allow_pickle: Whether to load DataFrames stored as pickles, which
+          earlier versions wrote for DataFrames without an Arrow equivalent;
+          unpickling can run arbitrary code, so only a trusted file should be
+          loaded this way (default: False, a ValueError is raised instead)
+
+        Returns:
+        - Story object, which renders the same specification as the saved story
+          and can be extended with the builder methods
+
+        A ValueError is raised if the file is not a saved story, is truncated
+        or corrupt, or was saved by a newer version of pynarrative.
+        """
+        from .ir import load
+        return load(path, cls, allow_pickle)
+
+    async def arender(self, precompute=False, executor=None, timeout=None):
+        """
+        Coroutine version of render(), for asyncio applications.
+
+        The story is rendered in the executor set with pynarrative.set_executor()
+        (a thread pool by default), within its concurrency limit, so that the
+        event loop is not blocked meanwhile. Cancelling the call cancels the
+        rendering if it has not started yet. Concurrent calls on the same story
+        render it one at a time and return the same, read-only, chart (see
+        render()).
+
+        Parameters:
+        - precompute: See render() (default: False)
+        - executor: Executor used for this call instead of the configured one (optional)
+        - timeout: Maximum time in seconds; raises asyncio.TimeoutError when
+          exceeded (default: None, no limit)
+
+        Returns:
+        - The Altair chart of the whole story
+        """
+        from .aio import _render, run
+        return await run(_render, self, precompute, executor=executor, timeout=timeout)
+
+    async def ato_json(self, validate=None, indent=2, sort_keys=True, executor=None,
+                       timeout=None, **kwargs):
+        """
+        Coroutine version of to_json(), for asyncio applications (see arender()).
+
+        Parameters:
+        - validate, indent, sort_keys, **kwargs: See to_json()
+        - executor: Executor used for this call instead of the configured one (optional)
+        - timeout: Maximum time in seconds; raises asyncio.TimeoutError when
+          exceeded (default: None, no limit)
+
+        Returns:
+        - JSON string of the specification
+        """
+        from .aio import _to_json, run
+        return await run(_to_json, self, validate, indent, sort_keys, kwargs,
+                         executor=executor, timeout=timeout)
+
+    async def aexport(self, path, format=None, scale=1, ppi=72, executor=None, timeout=None):
+        """
+        Exports the story to a static image or PDF file with vl-convert, as a
+        coroutine for asyncio applications (see arender()).
+
+        Parameters:
+        - path: Path of the file
+        - format: 'svg', 'png', 'pdf' or 'jpeg' (default: the extension of path)
+        - scale: Scale factor of PNG and JPEG images (default: 1)
+        - ppi: Pixels per inch of PNG images (default: 72)
+        - executor: Executor used for this call instead of the configured one (optional)
+        - timeout: Maximum time in seconds; raises asyncio.TimeoutError when
+          exceeded (default: None, no limit)
+
+        Returns:
+        - Path of the file
+        """
+        from .aio import _export, run
+        from .export import FORMATS
+
+        if format is None:
+            format = path.rsplit('.', 1)[-1].lower()
+            format = 'jpeg' if format == 'jpg' else format
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}")
+        return await run(_export, self, format, path, {'scale': scale, 'ppi': ppi},
+                         executor=executor, timeout=timeout)
+
+    def clear_cache(self):
+        """
+        Discards the overlays, sub-charts and dataset hashes cached by render().
+
+        Needed only when a DataFrame used by the story has been modified in place.
+
+        Returns:
+        - self, to allow method chaining
+        """
+        with self._render_lock:
+            self._render_cache = {}
+            self._dataset_cache = {}
+        return self
+
+    def compile(self):
+        """
+        Compiles the story into a template that can be re-bound to new data.
+
+        The story is rendered and converted to a Vega-Lite specification once;
+        overlays, next-step charts and layout are not rebuilt afterwards. Texts
+        may contain str.format fields (e.g. add_title("Sales of {customer}")),
+        which are filled in by StoryTemplate.bind(). This includes the texts of
+        annotations and next steps, but not the data of the main chart.
+
+        The new data must have the same columns and types as the data of the
+        story, since the encodings were resolved against it. It is embedded as
+        it is: a story with max_points gets its own data downsampled, but not
+        the data given to bind().
+
+        Returns:
+        - StoryTemplate object
+        """
+        with self._render_lock:
+            spec = self.to_dict()
+            data_name, columns = self._main_dataset or (None, None)
+        return StoryTemplate(spec, data_name, columns, self._compact_digits())
+
+    def to_dict(self, validate=None, **kwargs):
+        """
+        Renders the story and converts it to a Vega-Lite specification.
+
+        Same result as render().to_dict(), with serialization and schema
+        validation traced as separate phases (see set_tracer). The rows of the
+        datasets, already converted to JSON values by render(), are not
+        visited again by the conversion nor by the validation: the lists of
+        rows are those cached by the story, to be copied before modifying them.
+
+        Parameters:
+        - validate: Whether to validate the specification against the
+          Vega-Lite schema (default: None, as set by the validation of the story)
+        - **kwargs: Other arguments of Altair's to_dict()
+
+        Returns:
+        - Dictionary of the specification
+        """
+        spec, datasets = self._to_dict(validate, **kwargs)
+        if datasets:
+            spec['datasets'] = datasets
+        return spec
+
+    def to_json(self, validate=None, indent=2, sort_keys=True, backend=None, **kwargs):
+        """
+        Renders the story and converts it to a Vega-Lite specification in JSON.
+
+        Same JSON value as render().to_json(), with serialization and schema
+        validation traced as separate phases (see set_tracer). The text is
+        encoded with orjson if it is installed (see set_json_backend), unless
+        options only the json module supports are given.
+
+        Parameters:
+        - validate: Whether to validate the specification against the
+          Vega-Lite schema (default: None, as set by the validation of the story)
+        - indent: Indentation of the JSON text (default: 2)
+        - sort_keys: Whether to sort the keys (default: True)
+        - backend: 'orjson', 'json' or 'auto', for this call instead of the
+          one set with set_json_backend() (optional)
+        - **kwargs: Other arguments of json.dumps()
+
+        Returns:
+        - JSON string of the specification
+        """
+        from .jsonio import dumps, get_json_backend
+
+        spec = self.to_dict(validate=validate)
+        backend = get_json_backend(backend, indent, **kwargs)
+        with _span('pynarrative.serialize', {'format': 'json', 'json.backend': backend}) as span:
+            text = dumps(spec, indent=indent, sort_keys=sort_keys, backend=backend, **kwargs)
+            span.set_attribute('spec.bytes', len(text.encode('utf-8')))
+        return text
+
+    def write_json(self, file, validate=None, indent=None, sort_keys=True, backend=None,
+                   chunk_rows=None, workers=None):
+        """
+        Renders the story and writes its Vega-Lite specification in JSON to a
+        file or socket, without building the whole text in memory.
+
+        The rows of the datasets are encoded and written by chunks, possibly
+        by worker processes for very large datasets; the rest of the
+        specification is encoded at once. Workers are started with the 'spawn'
+        method, so scripts using them must guard their entry point with
+        `if __name__ == '__main__':`.
+
+        Parameters:
+        - file: Path, binary or text file object, or socket (e.g. of an HTTP
+          response)
+        - validate: Whether to validate the specification against the
+          Vega-Lite schema (default: None, as set by the validation of the story)
+        - indent: Indentation, None or a number of spaces (default: None,
+          compact text)
+        - sort_keys: Whether to sort the keys (default: True)
+        - backend: 'orjson', 'json' or 'auto' (optional, see to_json)
+        - chunk_rows: Number of rows encoded at a time (default: 10,000)
+        - workers: Number of worker processes encoding the chunks, or a
+          concurrent.futures Executor (default: None, encoded in this thread)
+
+        Returns:
+        - Number of bytes written
+        """
+        from .jsonio import CHUNK_ROWS, get_json_backend, write_json
+
+        spec, datasets = self._to_dict(validate)
+        separators = (',', ':') if indent is None else (',', ': ')
+        backend = get_json_backend(backend, indent, separators=separators)
+        with _span('pynarrative.serialize', {'format': 'json', 'json.backend': backend}) as span:
+            written = write_json(spec, datasets, file, indent=indent, sort_keys=sort_keys,
+                                 backend=backend, chunk_rows=chunk_rows or CHUNK_ROWS, workers=workers)
+            span.set_attribute('spec.bytes', written)
+        return written
+
+    def to_vega(self, validate=None):
+        """
+        Renders the story and compiles it to a Vega specification, which
+        browsers draw without compiling Vega-Lite first (e.g. with
+        vega-embed in 'vega' mode).
+
+        The compilation runs offline with vl-convert, and is cached by the
+        structure of the specification: stories differing only by their data
+        reuse it (see vega.compile_vega).
+
+        Parameters:
+        - validate: Whether to validate the Vega-Lite specification first
+          (default: None, as set by the validation of the story)
+
+        Returns:
+        - Vega specification, as a dictionary
+        """
+        from .vega import compile_vega
+
+        spec, datasets = self._to_dict(validate)
+        with _span('pynarrative.compile', {'format': 'vega'}):
+            return compile_vega(spec, datasets)
+
+    def _to_dict(self, validate, **kwargs):
+        """
+        Converts the rendered story to a specification whose datasets are
+        empty, and returns it with the datasets.
+
+        Returns:
+        - Tuple (spec, datasets): the specification and the dictionary
+          {name: rows} of its datasets
+        """
+        chart = self.render()
+        datasets = chart.datasets
+        skeleton = chart
+        if isinstance(datasets, dict) and datasets:
+            # Altair's conversion would copy every row, one value at a time
+            skeleton = _shallow_copy(chart)
+            skeleton.datasets = {name: [] for name in datasets}
+        else:
+            datasets = {}
+        with _span('pynarrative.serialize', {'format': 'dict'}):
+            spec = skeleton.to_dict(validate=False, **kwargs)
+        mode = self.validation if validate is None else ('always' if validate else 'never')
+        if mode != 'never':
+            # Any list of rows is a valid inline dataset: they need no check
+            with _span('pynarrative.validate', {'validation.mode': mode}) as span:
+                span.set_attribute('validation.skipped', not validate_spec(chart, spec, mode))
+        if datasets:
+            # Inline data of the layers is moved to the datasets by to_dict()
+            datasets = {**spec['datasets'], **datasets}
+        return spec, datasets
+
+    def _name_datasets(self, chart, projection=None):
+        """
+        Replaces the inline datasets of a chart with references by name.
+
+        Main chart, annotations, lines and next-step charts each carry their own
+        DataFrame, often with identical content. Each distinct content is hashed and
+        converted with the active Altair data transformer only once, and render()
+        stores it a single time at the top level of the spec, so the spec grows with
+        the number of distinct datasets rather than the number of layers.
+
+        Parameters:
+        - chart: An Altair chart (possibly layered or concatenated)
+        - projection: Dictionary {id(frame): columns} of the columns kept of
+          each DataFrame, the others being left out of the datasets (see
+          projection.column_projection; default: None, all columns)
+
+        Datasets are compacted if the story is (see compact in __init__); the
+        charts reading a dictionary-encoded dataset decode it first, from the
+        datasets of its categories, which are added to the datasets.
+
+        Returns:
+        - Tuple (chart, datasets, entries): a copy of the chart whose layers reference
+          their data by name, the dictionary of the datasets it references and the
+          dataset conversions it used
+        """
+        datasets = {}
+        entries = []
+        digits = self._compact_digits()
+
+        def dataset_name(data):
+            # Conversions are cached by identity, so the same DataFrame used by
+            # several layers, or across renders, is converted and hashed once
+            options = ((projection or {}).get(id(data)), digits)
+            entry = self._dataset_cache.get(id(data))
+            if entry is None or entry[3] != options:
+                columns = options[0]
+                source = data if columns is None else project(data, columns)
+                decoders, dictionaries = [], {}
+                if digits is not None:
+                    from .compact import compact_frame
+                    source, decoders, dictionaries = compact_frame(source, digits)
+                entry = (data, None, None, options, [], {})
+                values = alt.data_transformers.get()(source)
+                if isinstance(values, dict) and 'values' in values:
+                    name = 'data-' + _content_hash(source, values['values'])
+                    entry = (data, name, values['values'], options, decoders, dictionaries)
+                self._dataset_cache[id(data)] = entry
+            entries.append(entry)
+            _, name, values, _, decoders, dictionaries = entry
+            if name is not None:
+                datasets[name] = values
+                datasets.update(dictionaries)
+            return name, decoders
+
+        def visit(node, inherited):
+            # 'inherited' is the DataFrame a node reads through its parent, if the
+            # parent's data has been replaced by a name in this pass
+            data = getattr(node, 'data', alt.Undefined)
+            name, decoders = dataset_name(data) if _is_frame(data) else (None, [])
+            if name is None and data is not alt.Undefined:
+                inherited = None
+            node = _shallow_copy(node)
+            if name is not None:
+                node.data = alt.NamedData(name=name)
+                inherited = data
+            if decoders:
+                # Dictionary-encoded strings are decoded before any transform
+                transform = node.transform
+                node.transform = decoders + ([] if transform is alt.Undefined else list(transform))
+            if isinstance(node, alt.Chart):
+                if inherited is not None:
+                    _resolve_encoding(node, inherited)
+                return node
+            for key in ('layer', 'hconcat', 'vconcat', 'concat'):
+                children = getattr(node, key, alt.Undefined)
+                if children is not alt.Undefined:
+                    setattr(node, key, [visit(child, inherited) for child in children])
+            return node
+
+        return visit(chart, None), datasets, entries
+
+
+def _delegate(name, method):
+    """
+    Builds a Story method calling a method of alt.Chart on the main chart.
+
+    Like the wrappers of Story.__getattr__, a resulting Chart replaces the main
+    chart and the Story is returned to allow method chaining; any other result
+    is returned as it is.
+    """
+    @functools.wraps(method)
+    def delegated(self, *args, **kwargs):
+        chart = self.chart
+        if type(chart) is alt.Chart:
+            result = method(chart, *args, **kwargs)
+        else:
+            # A main chart of another class may override the method
+            result = getattr(chart, name)(*args, **kwargs)
+        if isinstance(result, alt.Chart):
+            self.chart = result
+            return self
+        return result
+
+    delegated.__qualname__ = f'Story.{name}'
+    return delegated
+
+
+def _install_delegates():
+    """
+    Adds to the Story class a delegate for each public method of alt.Chart
+    that Story does not define itself.
+
+    Delegation through __getattr__ costs an attribute lookup on the chart and a
+    new wrapper function on every access; pre-built delegates are plain methods
+    with a fixed cost per call. They are generated from the installed Altair
+    version when pynarrative.story is imported, so they follow its Chart API.
+    """
+    for name in dir(alt.Chart):
+        if name.startswith('_') or hasattr(Story, name):
+            continue
+        # Class and static methods (e.g. from_dict) are left to __getattr__
+        method = inspect.getattr_static(alt.Chart, name)
+        if inspect.isfunction(method):
+            setattr(Story, name, _delegate(name, method))
+
+
+_install_delegates()
+
+
+class StoryTemplate:
+    """
+    StoryTemplate class: A compiled story whose data and texts can be replaced.
+
+    A template is created with Story.compile(). Binding it to new data and
+    text values only substitutes them in the compiled Vega-Lite specification,
+    which is much cheaper than building and rendering a new Story.
+    """
+
+    # Name given to the dataset of the main chart in the compiled specification
+    DATA_NAME = 'story-data'
+
+    def __init__(self, spec, data_name=None, columns=None, digits=None):
+        """
+        Initialise a StoryTemplate object.
+
+        Parameters:
+        - spec: Vega-Lite specification of the rendered story, as a dictionary
+        - data_name: Name of the dataset of the main chart in spec (optional)
+        - columns: Columns of the new data kept by bind(), those the story
+          reads (default: None, all columns)
+        - digits: Significant digits of the floats of the new data, if it is
+          compacted as in the story (default: None, not compacted)
+        """
+        spec = dict(spec)
+        self.columns = columns
+        self.digits = digits
+        self.has_data = data_name is not None
+        if self.has_data:
+            # Every reference to the main dataset points to a fixed name, and
+            # its values are dropped: they are supplied by bind()
+            datasets = dict(spec.get('datasets', {}))
+            del datasets[data_name]
+            spec['datasets'] = datasets
+            spec = _rename_dataset(spec, data_name, self.DATA_NAME)
+        self.spec = spec
+        # (path, text) of every string containing format fields
+        self.texts = list(_find_format_strings(spec))
+
+    @property
+    def fields(self):
+        """
+        Names of the text parameters accepted by bind().
+        """
+        return sorted({
+            name for _, text in self.texts
+            for _, name, _, _ in string.Formatter().parse(text) if name
+        })
+
+    def bind(self, data=None, **text_params):
+        """
+        Produces the specification of the story for new data and texts.
+
+        Parameters:
+        - data: New data of the main chart, with the same columns as the data
+          of the compiled story (default: None, keeps no data)
+        - **text_params: Values of the format fields used in the texts
+
+        Returns:
+        - Vega-Lite specification as a dictionary (not validated again)
+        """
+        spec = dict(self.spec)
+        if data is not None:
+            if not self.has_data:
+                raise ValueError("The compiled story has no data to replace")
+            if self.columns is not None:
+                data = project(data, self.columns)
+            if self.digits is not None:
+                # Strings are not dictionary-encoded: the decoders of the
+                # compiled specification leave them as they are
+                from .compact import compact_frame
+                data, _, _ = compact_frame(data, self.digits, dictionary=False)
+            datasets = dict(spec['datasets'])
+            datasets[self.DATA_NAME] = alt.data_transformers.get()(data)['values']
+            spec['datasets'] = datasets
+
+        # Containers along the path of each text are copied, the rest of the
+        # specification is shared with the template
+        copied = {id(spec)}
+        for path, text in self.texts:
+            parent = spec
+            for key in path[:-1]:
+                child = parent[key]
+                if id(child) not in copied:
+                    child = copy.copy(child)
+                    parent[key] = child
+                    copied.add(id(child))
+                parent = child
+            parent[path[-1]] = text.format_map(text_params)
+        return spec
+
+
+def _rename_dataset(spec, old, new):
+    """
+    Returns a copy of a specification where references to a named dataset use
+    another name. Datasets themselves are not copied.
+    """
+    if isinstance(spec, dict):
+        if spec.get('name') == old and len(spec) == 1:
+            return {'name': new}
+        return {
+            key: value if key == 'datasets' else _rename_dataset(value, old, new)
+            for key, value in spec.items()
+        }
+    if isinstance(spec, list):
+        return [_rename_dataset(value, old, new) for value in spec]
+    return spec
+
+
+def _find_format_strings(spec, path=()):
+    """
+    Yields (path, string) for every string of a specification that contains
+    str.format fields.
+    """
+    if isinstance(spec, dict):
+        items = spec.items()
+    elif isinstance(spec, list):
+        items = enumerate(spec)
+    else:
+        return
+    for key, value in items:
+        if isinstance(value, str):
+            try:
+                names = [name for _, name, _, _ in string.Formatter().parse(value) if name is not None]
+            except ValueError:
+                # Not a format string (e.g. a Vega expression with braces)
+                continue
+            if names and all(name.isidentifier() for name in names):
+                yield path + (key,), value
+        else:
+            yield from _find_format_strings(value, path + (key,))
+
+
+def _freeze(value):
+    """
+    Converts a layer (or any value stored in it) into a hashable cache key.
+
+    Primitive values are kept, containers are converted recursively and any
+    other object (charts, DataFrames) is represented by its identity.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (dict, Layer)):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return ('id', id(value))
+
+
+def _shallow_copy(chart):
+    """
+    Returns a copy of an Altair object sharing its attribute values.
+
+    chart.copy(deep=False) re-runs the constructor, which for layered and
+    concatenated charts deep-copies every sub-chart.
+    """
+    copy = object.__new__(type(chart))
+    object.__setattr__(copy, '_args', chart._args)
+    object.__setattr__(copy, '_kwds', dict(chart._kwds))
+    return copy
+
+
+def _has_params(chart):
+    """
+    Checks whether a chart or any of its sub-charts defines parameters.
+    """
+    if getattr(chart, 'params', alt.Undefined) is not alt.Undefined:
+        return True
+    for key in ('layer', 'hconcat', 'vconcat', 'concat'):
+        children = getattr(chart, key, alt.Undefined)
+        if children is not alt.Undefined and any(_has_params(child) for child in children):
+            return True
+    return False
+
+
+def _combine(kind, charts):
+    """
+    Builds a layer, hconcat or vconcat chart out of the given charts.
+
+    Altair's constructors deep-copy every sub-chart to merge their parameters,
+    which is quadratic when layers are added one at a time and would copy the
+    cached parts of a story on every render. The sub-charts are used as they
+    are unless one of them defines parameters.
+
+    Parameters:
+    - kind: 'layer', 'hconcat' or 'vconcat'
+    - charts: List of sub-charts
+
+    Returns:
+    - Altair LayerChart, HConcatChart or VConcatChart
+    """
+    if any(_has_params(chart) for chart in charts):
+        return {'layer': alt.layer, 'hconcat': alt.hconcat, 'vconcat': alt.vconcat}[kind](*charts)
+    combined = {'layer': alt.LayerChart, 'hconcat': alt.HConcatChart, 'vconcat': alt.VConcatChart}[kind]()
+    setattr(combined, kind, list(charts))
+    return combined
+
+
+def _resolve_encoding(chart, data):
+    """
+    Gives explicit types to the encoding shorthands of a chart (a copy owned
+    by the caller) whose type is inferred from its DataFrame (e.g. 'Sales'),
+    since the DataFrame is about to be replaced by a reference.
+    """
+    if chart.encoding is alt.Undefined:
+        return
+    try:
+        chart.encoding.to_dict(validate=False, context={})
+    except ValueError:
+        encoding = chart.encoding.to_dict(validate=False, context={'data': data})
+        chart.encoding = alt.FacetedEncoding.from_dict(encoding, validate=False)
+
+
+def _is_frame(data):
+    """
+    Checks whether data is a dataframe (pandas, or any object exposing the
+    dataframe interchange or Arrow protocols) rather than a URL or named dataset.
+    """
+    pd = sys.modules.get('pandas')  # a DataFrame implies pandas is imported
+    return ((pd is not None and isinstance(data, pd.DataFrame))
+            or hasattr(data, '__dataframe__')
+            or hasattr(data, '__arrow_c_stream__'))
+
+
+def _content_hash(data, values):
+    """
+    Computes a short hash identifying the content of a dataset.
+
+    pandas DataFrames are hashed column-wise with pandas' vectorised hashing,
+    Polars frames with their row hashes and Arrow tables through their column
+    buffers, without copying them; other data falls back to hashing the JSON of
+    its values.
+
+    Parameters:
+    - data: The original dataset
+    - values: The list of records produced by the data transformer, or a
+      function returning it, called only if the data has to be hashed as JSON
+
+    Returns:
+    - Hexadecimal digest string
+    """
+    digest = hashlib.sha256()
+    pd = sys.modules.get('pandas')
+    # pandas cannot hash a DataFrame without columns
+    if pd is not None and isinstance(data, pd.DataFrame) and len(data.columns):
+        try:
+            digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+            digest.update(repr((list(data.columns), list(data.dtypes.astype(str)))).encode())
+            return digest.hexdigest()[:32]
+        except TypeError:
+            # Unhashable cell values (lists, dicts): hash the JSON instead
+            digest = hashlib.sha256()
+    if _hash_columnar(data, digest):
+        return digest.hexdigest()[:32]
+    if callable(values):
+        values = values()
+    digest.update(json.dumps(values, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:32]
+
+
+def _hash_columnar(data, digest):
+    """
+    Feeds the content of a Polars DataFrame or an Arrow table to a hash,
+    reading its columns in place.
+
+    Returns:
+    - True if the data was hashed, False if it is of another type
+    """
+    pl = sys.modules.get('polars')
+    if pl is not None and isinstance(data, pl.DataFrame):
+        try:
+            # One 64-bit hash per row, computed natively
+            hashes = data.hash_rows()
+        except Exception:  # Column types Polars cannot hash
+            return False
+        digest.update(hashes.to_numpy().tobytes())
+        digest.update(repr([(name, str(dtype)) for name, dtype in data.schema.items()]).encode())
+        return True
+
+    pa = sys.modules.get('pyarrow')
+    if pa is not None and isinstance(data, (pa.Table, pa.RecordBatch)):
+        for name, column in zip(data.schema.names, data.columns):
+            digest.update(repr((name, str(column.type))).encode())
+            chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+            for chunk in chunks:
+                # Buffers are shared with the slices of an array: the position
+                # of the slice is part of its content
+                digest.update(repr((chunk.offset, len(chunk))).encode())
+                for buffer in chunk.buffers():
+                    if buffer is not None:
+                        digest.update(memoryview(buffer))
+        return True
+    return False
 
-    
 
 def story(data=None, **kwargs):
     """
@@ -997,3 +2328,41 @@ def story(data=None, **kwargs):
     """
     return Story(data, **kwargs)
 
+
+
+_warmed_up = False
+
+
+def warmup():
+    """
+    Prepares the process for rendering stories, once per process.
+
+    The first story rendered in a process pays for importing pandas, loading
+    Altair's Vega-Lite schema, building the JSON schema validators and
+    compiling their format checkers. Calling this function at start-up (for
+    example in the initialisation phase of a serverless function, or before
+    forking worker processes) moves that cost out of the first request.
+    Subsequent calls return immediately.
+
+    Returns:
+    - None
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+    import pandas as pd
+
+    # A small story using every kind of layer, rendered and validated once
+    data = pd.DataFrame({'x': [0, 1], 'y': [0, 1]})
+    (Story(data, width=100, height=100)
+        .mark_line()
+        .encode(x='x:Q', y='y:Q')
+        .add_title("Title", "Subtitle")
+        .add_context("Context")
+        .add_source("Source")
+        .add_annotation(0, 0, "Annotation")
+        .add_line(0)
+        .add_next_steps(mode='line_steps', texts=["Step"])
+        .render()
+        .to_dict())
+    _warmed_up = True
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Validation modes of a story (see Story.__init__)
+MODES = ('always', 'once', 'never')
+
+# Largest number of specification structures remembered as valid
+MAX_STRUCTURES = 1024
+
+# Keys whose values are texts or data of the story (title and annotation
+# texts, positions computed from the data, scale domains): a specification
+# differing from a valid one only by these values has the same structure
+VARIABLE_KEYS = frozenset(('text', 'title', 'subtitle', 'description', 'href', 'url',
+                           'value', 'datum', 'domain'))
+
+# Structures already validated in this process, in LRU order
+_validated = OrderedDict()
+_lock = threading.Lock()
+
+
+def validate_spec(chart, spec, mode='always'):
+    """
+    Validates a specification produced by chart.to_dict(validate=False)
+    against the Vega-Lite schema.
+
+    In 'once' mode, a specification whose structure (see structure_key) has
+    already been validated in this process is not validated again, whichever
+    story produced it: stories built by the same code for other data or texts
+    are validated only the first time.
+
+    Parameters:
+    - chart: The chart the specification comes from
+    - spec: Specification, as a dictionary
+    - mode: 'always', 'once' or 'never' (default: 'always')
+
+    Returns:
+    - True if the specification was validated, False if it was skipped
+
+    An invalid specification raises Altair's own, detailed, error.
+    """
+    if mode not in MODES:
+        raise ValueError(f"validation must be one of {MODES}")
+    if mode == 'never':
+        return False
+    key = None
+    if mode == 'once':
+        key = (type(chart).__name__, structure_key(spec))
+        with _lock:
+            if key in _validated:
+                _validated.move_to_end(key)
+                return False
+    try:
+        type(chart).validate(spec)
+    except Exception:
+        # Converting again with validation raises Altair's own, more
+        # detailed error
+        chart.to_dict(validate=True)
+        raise
+    if key is not None:
+        with _lock:
+            _validated[key] = True
+            while len(_validated) > MAX_STRUCTURES:
+                _validated.popitem(last=False)
+    return True
+
+
+def structure_key(spec, keys=VARIABLE_KEYS):
+    """
+    Returns a hash of the structure of a specification (see normalize_structure).
+
+    Parameters:
+    - spec: Specification, as a dictionary
+    - keys: Keys whose values are reduced to their types (default: VARIABLE_KEYS)
+
+    Returns:
+    - Hexadecimal digest string
+    """
+    normalized, _ = normalize_structure(spec, keys)
+    text = json.dumps(normalized, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_structure(spec, keys=VARIABLE_KEYS):
+    """
+    Reduces a specification to its structure: its datasets are emptied and
+    numbered in order of appearance rather than named after their content,
+    and the values of the given keys are replaced by their types.
+
+    Parameters:
+    - spec: Specification, as a dictionary
+    - keys: Keys whose values are reduced to their types, if they are plain
+      values or lists of them (default: VARIABLE_KEYS); with no keys, the
+      result is still a valid specification, without data
+
+    Returns:
+    - Tuple (spec, names): the normalized copy of the specification and the
+      dictionary {name: new name} of its datasets
+    """
+    datasets = spec.get('datasets', {})
+    names = {}
+
+    def dataset(name):
+        return names.setdefault(name, f'dataset-{len(names)}')
+
+    def normalize(value, key=None):
+        if isinstance(value, dict):
+            if key == 'data' and value.get('name') in datasets:
+                value = dict(value, name=dataset(value['name']))
+            return {item_key: normalize(item, item_key) for item_key, item in value.items()}
+        if isinstance(value, list):
+            if key in keys and not any(isinstance(item, (dict, list)) for item in value):
+                return [_type(item) for item in value]
+            return [normalize(item) for item in value]
+        if key in keys:
+            return _type(value)
+        return value
+
+    # Layers reference datasets before they are listed at the top level: the
+    # layers are numbered first
+    normalized = normalize({key: value for key, value in spec.items() if key != 'datasets'})
+    if datasets:
+        normalized['datasets'] = {dataset(name): [] for name in datasets}
+    return normalized, names
+
+
+def clear_validated():
+    """
+    Forgets the structures validated so far: 'once' validates them again.
+    """
+    with _lock:
+        _validated.clear()
+
+
+def _type(value):
+    """
+    Returns the JSON type of a value, as a string.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)):
+        return 'number'
+    return 'string' if isinstance(value, str) else type(value).__name__
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Largest number of compiled specifications kept in the cache
+MAX_COMPILED = 256
+
+# Compiled Vega specifications, without data, as JSON text keyed by the
+# structure of their Vega-Lite specification, in LRU order
+_compiled = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_vega(spec, datasets=None):
+    """
+    Compiles a Vega-Lite specification to Vega with vl-convert, offline.
+
+    The compilation of a structure is cached: specifications differing only
+    by the rows of their datasets (see validation.normalize_structure) reuse
+    it, and only get their rows inserted. Datasets are named dataset-0,
+    dataset-1, ... in the Vega specification, whatever their content.
+
+    Parameters:
+    - spec: Vega-Lite specification, as a dictionary
+    - datasets: Dictionary {name: rows} of the datasets of the specification,
+      in place of those it holds (default: None, those of spec)
+
+    Returns:
+    - Vega specification, as a dictionary; the lists of rows are those
+      given, to be copied before modifying them
+    """
+    try:
+        import vl_convert
+    except ImportError:
+        raise ImportError("Compiling to Vega requires the vl-convert-python package") from None
+    from .validation import normalize_structure
+
+    normalized, names = normalize_structure(spec, keys=())
+    text = json.dumps(normalized, sort_keys=True, separators=(',', ':'), default=str)
+    key = (vl_convert.__version__, hashlib.sha256(text.encode('utf-8')).hexdigest())
+    with _lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+    if compiled is None:
+        # Compiled outside the lock: concurrent misses of one structure
+        # compile it twice, to the same result
+        # Given as a dictionary: vl-convert parses the floats of JSON text
+        # with less precision
+        compiled = json.dumps(vl_convert.vegalite_to_vega(normalized))
+        with _lock:
+            _compiled[key] = compiled
+            while len(_compiled) > MAX_COMPILED:
+                _compiled.popitem(last=False)
+
+    # Each call gets its own copy of the cached specification
+    vega = json.loads(compiled)
+    rows = {**spec.get('datasets', {}), **(datasets or {})}
+    rows = {names[name]: values for name, values in rows.items() if name in names}
+    for entry in vega.get('data', ()):
+        if entry.get('name') in rows and 'values' in entry:
+            entry['values'] = rows[entry['name']]
+    return vega
+
+
+def clear_compiled():
+    """
+    Discards the cached compilations.
+    """
+    with _lock:
+        _compiled.clear()
+
+
+def compiled_count():
+    """
+    Returns the number of cached compilations.
+    """
+    return len(_compiled)
@@ -1,8 +1,32 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import urllib.error
+import urllib.request
 import pandas as pd
 import altair as alt
+import pynarrative
 from pynarrative import Story
+from pynarrative import StoryTemplate
 from pynarrative import NextStep
+from pynarrative import render_many
+from pynarrative import export_many
+
+
+def _customer_story(data, customer, title):
+    # Module-level story template, so that it can be sent to worker processes
+    return Story(data).mark_line().encode(x='x:Q', y='y:Q').add_title(title)
 
 class TestStoryInitialization(unittest.TestCase):
     def setUp(self):
@@ -204,6 +228,1373 @@ class TestConfiguration(unittest.TestCase):
         self.assertEqual(self.story.config['view']['fill'], '#f0f0f0')
         print("✓ View configuration works")
 
+class TestOverlayData(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(100), 'y': range(100)})
+
+    def _text_mark_rows(self, spec, data=None, datasets=None):
+        """Returns the number of rows each text mark of the spec is drawn from."""
+        datasets = spec.get('datasets', datasets)
+        data = spec.get('data', data)
+        if 'layer' in spec:
+            return [n for sub in spec['layer'] for n in self._text_mark_rows(sub, data, datasets)]
+        if spec['mark']['type'] != 'text':
+            return []
+        return [len(datasets[data['name']])]
+
+    def test_constant_overlays(self):
+        """Text overlays are bound to a single constant datum."""
+        story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                 .add_title("Title", "Subtitle")
+                 .add_context("Context")
+                 .add_source("Source"))
+        self.assertEqual(self._text_mark_rows(story.render().to_dict()), [1, 1, 1, 1])
+        print("✓ Overlays use a single datum")
+
+    def test_legacy_overlays(self):
+        """constant_overlays=False keeps overlays bound to the main data."""
+        story = (Story(self.data, constant_overlays=False).mark_line()
+                 .encode(x='x:Q', y='y:Q').add_context("Context"))
+        self.assertEqual(self._text_mark_rows(story.render().to_dict()), [100])
+        print("✓ Legacy overlays use the main data")
+
+class TestDatasetDeduplication(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(1, 6), 'y': [10, 20, 15, 25, 30]})
+
+    def test_identical_datasets_are_shared(self):
+        """Layers with identical data reference a single named dataset."""
+        story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                 .add_line(20).add_line(20)
+                 .add_annotation(3, 15, "Peak").add_annotation(3, 15, "Again"))
+        spec = story.render().to_dict()
+        # main data, the line value and the annotation point
+        self.assertEqual(len(spec['datasets']), 3)
+        print("✓ Identical datasets shared")
+
+    def test_untyped_shorthand_is_inferred(self):
+        """Shorthands without a type are still inferred from the DataFrame."""
+        story = Story(self.data).mark_line().encode(x='x', y='y').add_title("Title")
+        spec = story.render().to_dict()
+        self.assertEqual(spec['layer'][0]['encoding']['x']['type'], 'quantitative')
+        print("✓ Encoding types inferred")
+
+class TestBulkAnnotations(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(1, 6), 'y': [10, 20, 15, 25, 30]})
+        self.story = Story(self.data)
+        self.story.encode(x='x:Q', y='y:Q')
+        self.annotations = pd.DataFrame({
+            'x': [1, 3, 5],
+            'y': [10, 15, 30],
+            'text': ['Start', 'Dip', 'Peak'],
+            'direction': ['left', 'down', 'upright'],
+            'color': ['red', 'green', 'blue'],
+        })
+
+    def test_single_annotation_layer(self):
+        """All annotations are drawn by three layers sharing one dataset."""
+        self.story.add_annotations(self.annotations, direction='direction', label_color='color')
+        self.assertEqual(len(self.story.story_layers), 1)
+        layer = self.story.story_layers[-1]
+        self.assertEqual(layer['type'], 'annotation')
+        self.assertEqual(len(layer['chart'].layer), 3)
+        self.assertEqual(len(layer['chart'].data), 3)
+        self.assertEqual(list(layer['chart'].data['arrow']), ['←', '↓', '↗'])
+        print("✓ Bulk annotations added in a single layer")
+
+    def test_invalid_direction(self):
+        """Invalid directions in the DataFrame are rejected."""
+        self.annotations.loc[1, 'direction'] = 'sideways'
+        with self.assertRaises(ValueError):
+            self.story.add_annotations(self.annotations, direction='direction')
+        print("✓ Invalid bulk direction caught")
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(1, 6), 'y': [10, 20, 15, 25, 30]})
+        self.story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                      .add_title("Title", "Subtitle")
+                      .add_next_steps(mode='line_steps', texts=["Step 1", "Step 2"]))
+
+    def _count_builds(self):
+        calls = []
+        original = self.story.create_title_layer
+
+        def create_title_layer(layer):
+            calls.append(layer['title'])
+            return original(layer)
+
+        self.story.create_title_layer = create_title_layer
+        return calls
+
+    def test_unchanged_story_is_not_rebuilt(self):
+        """A second render of an unchanged story returns the cached chart."""
+        self.assertIs(self.story.render(), self.story.render())
+        print("✓ Unchanged story reused")
+
+    def test_only_changed_layers_are_rebuilt(self):
+        """Unchanged overlays are reused when other layers change."""
+        calls = self._count_builds()
+        first = self.story.render()
+        self.story.add_context("Context").mark_point()
+        second = self.story.render()
+        self.assertIsNot(first, second)
+        self.assertEqual(calls, ["Title"])
+        self.assertEqual(len(second.vconcat[0].layer), 3)
+        print("✓ Unchanged layers reused")
+
+    def test_edited_layer_is_rebuilt(self):
+        """Editing a layer record invalidates its cached overlay."""
+        calls = self._count_builds()
+        self.story.render()
+        self.story.story_layers[0]['title'] = "New title"
+        spec = self.story.render().to_dict()
+        self.assertEqual(calls, ["Title", "New title"])
+        self.assertEqual(spec['vconcat'][0]['layer'][1]['layer'][0]['mark']['text'], "New title")
+        print("✓ Edited layer rebuilt")
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+
+    def test_lazy_import(self):
+        """Importing the package does not import altair or pandas."""
+        code = ("import sys, pynarrative; "
+                "assert 'altair' not in sys.modules and 'pandas' not in sys.modules; "
+                "assert callable(pynarrative.story)")
+        subprocess.run([sys.executable, '-c', code], check=True)
+        print("✓ Package imported lazily")
+
+    def test_story_after_submodule_import(self):
+        """pynarrative.story stays the story() function once its submodule is imported."""
+        code = ("from pynarrative.story import Story; import pynarrative, pandas as pd; "
+                "assert isinstance(pynarrative.story(pd.DataFrame({'x': [1]})), Story)")
+        subprocess.run([sys.executable, '-c', code], check=True)
+        print("✓ story() function kept")
+
+    def test_warmup(self):
+        """warmup() can be called repeatedly."""
+        pynarrative.warmup()
+        pynarrative.warmup()
+        print("✓ Warm-up successful")
+
+class TestRenderMany(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({
+            'customer': ['a', 'a', 'b', 'b', 'c'],
+            'x': [1, 2, 1, 2, 1],
+            'y': [10, 20, 30, 40, 50],
+        })
+        self.items = pd.DataFrame({'customer': ['a', 'b', 'c'], 'title': ['A', 'B', 'C']})
+
+    def test_inline_rendering(self):
+        """Items are rendered in order with their data slice."""
+        results = list(render_many(_customer_story, self.items, data=self.data, by='customer',
+                                   processes=0, output='dict'))
+        self.assertEqual([index for index, _ in results], [0, 1, 2])
+        spec = results[1][1]
+        self.assertEqual(spec['layer'][1]['mark']['text'], 'B')
+        self.assertEqual(len(spec['datasets'][spec['layer'][0]['data']['name']]), 2)
+        print("✓ Inline batch rendering successful")
+
+    def test_process_pool_rendering(self):
+        """The process pool produces the same output as rendering directly."""
+        results = dict(render_many(_customer_story, self.items, data=self.data, by='customer',
+                                   processes=2, chunksize=1, ordered=False))
+        expected = _customer_story(self.data[self.data.customer == 'c'], 'c', 'C').render().to_json()
+        self.assertEqual(sorted(results), [0, 1, 2])
+        self.assertEqual(results[2], expected)
+        print("✓ Process pool rendering successful")
+
+class TestStoryTemplate(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': [1, 2, 3], 'y': [10, 20, 30]})
+        self.template = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                         .add_title("Sales of {customer}")
+                         .add_annotation(2, 20, "Peak of {customer}")
+                         .compile())
+
+    def test_bind_replaces_data_and_texts(self):
+        """Binding fills in the format fields and the data of the main chart."""
+        self.assertEqual(self.template.fields, ['customer'])
+        spec = self.template.bind(self.data.iloc[:2], customer='ACME')
+        self.assertEqual(spec['layer'][1]['mark']['text'], 'Sales of ACME')
+        self.assertIn('Peak of ACME', json.dumps(spec))
+        self.assertEqual(spec['datasets'][spec['layer'][0]['data']['name']],
+                         [{'x': 1, 'y': 10}, {'x': 2, 'y': 20}])
+        print("✓ Template binding successful")
+
+    def test_bind_leaves_template_unchanged(self):
+        """The compiled specification is not modified by bind()."""
+        self.template.bind(self.data, customer='ACME')
+        spec = self.template.bind(self.data, customer='Initech')
+        self.assertEqual(spec['layer'][1]['mark']['text'], 'Sales of Initech')
+        self.assertNotIn('ACME', json.dumps(self.template.spec))
+        print("✓ Template reuse successful")
+
+    def test_bind_errors(self):
+        """Missing text parameters and data without a main dataset are rejected."""
+        with self.assertRaises(KeyError):
+            self.template.bind(self.data)
+        template = Story().mark_point().add_title("Report").compile()
+        with self.assertRaises(ValueError):
+            template.bind(self.data)
+        print("✓ Template errors correctly handled")
+
+    def test_compile_downsampled_story(self):
+        """A story whose main chart is downsampled compiles, without its downsampled data."""
+        data = pd.DataFrame({'x': range(1000), 'y': [value % 7 for value in range(1000)]})
+        template = (Story(data, max_points=100).mark_line().encode(x='x:Q', y='y:Q')
+                    .add_title("Sales of {customer}").compile())
+        spec = template.bind(self.data, customer='ACME')
+        self.assertEqual(spec['datasets'][StoryTemplate.DATA_NAME],
+                         [{'x': 1, 'y': 10}, {'x': 2, 'y': 20}, {'x': 3, 'y': 30}])
+        self.assertFalse(any(len(values) == 100 for values in spec['datasets'].values()))
+        print("✓ Downsampled story compiled")
+
+    def test_render_many_with_template(self):
+        """render_many binds each item to a compiled template."""
+        data = pd.DataFrame({'customer': ['a', 'b'], 'x': [1, 2], 'y': [3, 4]})
+        template = _customer_story(data, 'a', 'Sales of {customer}').compile()
+        results = dict(render_many(template, [{'customer': 'a'}, {'customer': 'b'}], data=data,
+                                   by='customer', processes=0, output='dict'))
+        self.assertEqual(results[1]['layer'][1]['mark']['text'], 'Sales of b')
+        # Only the columns the story reads are kept
+        self.assertEqual(results[1]['datasets'][StoryTemplate.DATA_NAME],
+                         [{'x': 2, 'y': 4}])
+        print("✓ Batch rendering of a template successful")
+
+    def test_render_many_template_json(self):
+        """render_many encodes bound templates as Story.to_json() does."""
+        from pynarrative.jsonio import set_json_backend
+        data = pd.DataFrame({'customer': ['a'], 'x': [1], 'y': [3]})
+        template = _customer_story(data, 'a', 'Sales of {customer}').compile()
+        items = [{'customer': 'a'}]
+        previous = set_json_backend('json')
+        try:
+            (_, text), = render_many(template, items, data=data, by='customer', processes=0)
+        finally:
+            set_json_backend(previous)
+        (_, spec), = render_many(template, items, data=data, by='customer', processes=0, output='dict')
+        self.assertEqual(text, json.dumps(spec, indent=2, sort_keys=True))
+        print("✓ Template output encoded as to_json()")
+
+class TestPrecompute(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({
+            'category': ['a', 'b', 'a', 'b', 'a', 'c'],
+            'value': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        })
+
+    def test_encoding_aggregate(self):
+        """Encoding aggregations are computed and the encoding rewritten."""
+        story = Story(self.data).mark_bar().encode(x='category:N', y='sum(value):Q')
+        spec = story.render(precompute=True).to_dict()
+        self.assertEqual(spec['encoding']['y'], {
+            'field': 'sum_value', 'title': 'Sum of value', 'type': 'quantitative'
+        })
+        self.assertEqual(spec['datasets'][spec['data']['name']], [
+            {'category': 'a', 'sum_value': 9.0},
+            {'category': 'b', 'sum_value': 6.0},
+            {'category': 'c', 'sum_value': 6.0},
+        ])
+        print("✓ Encoding aggregation precomputed")
+
+    def test_transforms(self):
+        """Supported transforms are computed in order, Vega bins included."""
+        story = (Story(self.data).mark_bar()
+                 .transform_filter(alt.FieldGTPredicate(field='value', gt=1))
+                 .transform_bin('bin', 'value', bin=alt.Bin(maxbins=5))
+                 .transform_aggregate(count='count()', groupby=['bin', 'bin_end'])
+                 .encode(x=alt.X('bin:Q', bin='binned'), x2='bin_end', y='count:Q'))
+        spec = story.render(precompute=True).to_dict()
+        self.assertNotIn('transform', spec)
+        self.assertEqual(spec['datasets'][spec['data']['name']], [
+            {'bin': 2.0, 'bin_end': 3.0, 'count': 1},
+            {'bin': 3.0, 'bin_end': 4.0, 'count': 1},
+            {'bin': 4.0, 'bin_end': 5.0, 'count': 1},
+            {'bin': 5.0, 'bin_end': 6.0, 'count': 2},
+        ])
+        print("✓ Transforms precomputed")
+
+    def test_unsupported_transform(self):
+        """Transforms from the first unsupported one onwards stay client-side."""
+        story = (Story(self.data).mark_bar()
+                 .transform_filter(alt.FieldOneOfPredicate(field='category', oneOf=['a', 'b']))
+                 .transform_calculate(double='datum.value * 2')
+                 .encode(x='category:N', y='sum(double):Q'))
+        spec = story.render(precompute=True).to_dict()
+        self.assertEqual(spec['transform'], [{'calculate': 'datum.value * 2', 'as': 'double'}])
+        self.assertEqual(spec['encoding']['y']['aggregate'], 'sum')
+        self.assertEqual(len(spec['datasets'][spec['data']['name']]), 5)
+        print("✓ Unsupported transforms left to Vega-Lite")
+
+class TestDownsampling(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        x = list(range(1000))
+        self.data = pd.DataFrame({
+            'x': x + x,
+            'y': [(i % 50) * (1 if i != 510 else 100) for i in x] + [-i for i in x],
+            'series': ['a'] * 1000 + ['b'] * 1000,
+        })
+
+    def _main_values(self, story):
+        spec = story.render().to_dict()
+        return spec['datasets'][spec['layer'][0]['data']['name']]
+
+    def test_lttb_per_series(self):
+        """Each series is reduced to the point budget, keeping its ends and peaks."""
+        story = (Story(self.data, width=100, max_points='auto').mark_line()
+                 .encode(x='x:Q', y='y:Q', color='series:N')
+                 .add_annotation(250, 10, "Exact point"))
+        values = self._main_values(story)
+        for series in ('a', 'b'):
+            points = [row for row in values if row['series'] == series]
+            self.assertEqual(len(points), 100)
+            self.assertEqual({points[0]['x'], points[-1]['x']}, {0, 999})
+        self.assertIn(1000, [row['y'] for row in values])
+        print("✓ LTTB downsampling successful")
+
+    def test_missing_values_keep_gaps(self):
+        """Rows with a missing y value are kept, with the points around each gap."""
+        y = [float(i % 50) for i in range(1000)]
+        for i in list(range(300, 320)) + [700]:
+            y[i] = None
+        data = pd.DataFrame({'x': range(1000), 'y': y})
+        for method in ('lttb', 'minmax'):
+            story = Story(data, max_points=50, downsample=method).mark_line().encode(x='x:Q', y='y:Q')
+            values = self._main_values(story.add_title("Gaps"))
+            kept = {row['x']: row['y'] for row in values}
+            self.assertLess(len(values), 100)
+            for x in (300, 700):
+                self.assertIsNone(kept[x])
+            for x in (299, 320, 699, 701):
+                self.assertIsNotNone(kept[x])
+        print("✓ Gaps of the line kept")
+
+    def test_minmax_and_untouched_charts(self):
+        """Min/max keeps the extremes; non-line charts are not downsampled."""
+        story = Story(self.data, max_points=50, downsample='minmax').mark_line().encode(x='x:Q', y='y:Q', color='series:N')
+        values = self._main_values(story.add_title("Min/max"))
+        self.assertLessEqual(len(values), 100)
+        self.assertIn(1000, [row['y'] for row in values])
+        self.assertIn(-999, [row['y'] for row in values])
+
+        story = Story(self.data, max_points=50).mark_point().encode(x='x:Q', y='y:Q').add_title("Points")
+        self.assertEqual(len(self._main_values(story)), 2000)
+        with self.assertRaises(ValueError):
+            Story(self.data, downsample='mean')
+        print("✓ Min/max downsampling successful")
+
+@unittest.skipUnless(importlib.util.find_spec('polars') and importlib.util.find_spec('pyarrow'),
+                     "polars and pyarrow are required")
+class TestColumnarData(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        import polars as pl
+        self.data = pl.DataFrame({'x': [1, 2, 3], 'y': [10.0, 20.0, 30.0]})
+
+    def test_polars_and_arrow_render(self):
+        """Polars and Arrow data are rendered without conversion to pandas."""
+        for data in (self.data, self.data.to_arrow()):
+            story = Story(data).mark_line().encode(x='x', y='y:Q').add_title("Columnar")
+            spec = story.render().to_dict()
+            self.assertIs(story.chart.data, data)
+            self.assertEqual(spec['layer'][0]['encoding']['x']['type'], 'quantitative')
+            self.assertEqual(spec['datasets'][spec['layer'][0]['data']['name']][2], {'x': 3, 'y': 30.0})
+        print("✓ Columnar data rendered")
+
+    def test_columnar_hash(self):
+        """Columnar data is hashed in place, by content and not by identity."""
+        from pynarrative.story import _content_hash
+        table = self.data.to_arrow()
+        # No records are given: the hash must come from the columns themselves
+        self.assertEqual(_content_hash(self.data, None), _content_hash(self.data.clone(), None))
+        self.assertNotEqual(_content_hash(self.data, None), _content_hash(self.data.head(2), None))
+        self.assertEqual(_content_hash(table, None), _content_hash(self.data.to_arrow(), None))
+        self.assertNotEqual(_content_hash(table, None), _content_hash(table.slice(1), None))
+        print("✓ Columnar hashing successful")
+
+@unittest.skipUnless(importlib.util.find_spec('vl_convert'), "vl-convert-python is required")
+class TestExportMany(unittest.TestCase):
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        data = pd.DataFrame({'x': [1, 2, 3], 'y': [10, 20, 30]})
+        self.stories = [
+            Story(data).mark_line().encode(x='x:Q', y='y:Q').add_title(f"Story {index}")
+            for index in range(3)
+        ]
+
+    def test_inline_export(self):
+        """Stories and named stories are written to the directory."""
+        results = dict(export_many([self.stories[0], ('named', self.stories[1])], format='svg',
+                                   directory=self.directory, workers=0))
+        self.assertEqual(results, {0: os.path.join(self.directory, '0.svg'),
+                                   1: os.path.join(self.directory, 'named.svg')})
+        with open(results[1]) as file:
+            self.assertIn('Story 1', file.read())
+        print("✓ Inline export successful")
+
+    def test_worker_export(self):
+        """The worker pool writes every file, with bounded pending stories."""
+        results = dict(export_many(self.stories, format='png', directory=self.directory,
+                                   workers=1, max_pending=1))
+        self.assertEqual(sorted(results), [0, 1, 2])
+        for path in results.values():
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(8), b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['0.png', '1.png', '2.png'])
+        with self.assertRaises(ValueError):
+            list(export_many(self.stories, format='gif', directory=self.directory))
+        print("✓ Worker pool export successful")
+
+class TestTracing(unittest.TestCase):
+    """
+    Tests of the tracing hooks of the render pipeline.
+    """
+
+    class RecordingTracer:
+        # Minimal tracer with the OpenTelemetry interface, recording the spans
+        def __init__(self):
+            self.spans = []
+
+        @contextlib.contextmanager
+        def start_as_current_span(self, name, attributes=None):
+            span = {'name': name, 'attributes': dict(attributes or {})}
+            self.spans.append(span)
+
+            class Span:
+                def set_attribute(self, key, value):
+                    span['attributes'][key] = value
+            yield Span()
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(10), 'y': range(10)})
+        self.tracer = self.RecordingTracer()
+        self.previous = pynarrative.set_tracer(self.tracer)
+
+    def tearDown(self):
+        pynarrative.set_tracer(self.previous)
+
+    def names(self):
+        return [span['name'] for span in self.tracer.spans]
+
+    def test_builder_and_render_spans(self):
+        """Test that builders and render phases emit spans"""
+        story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                 .add_title("Title").add_annotation(1, 1, "Note"))
+        story.render()
+        names = self.names()
+        self.assertIn('pynarrative.add_title', names)
+        self.assertIn('pynarrative.add_annotation', names)
+        self.assertIn('pynarrative.render', names)
+        self.assertIn('pynarrative.render.layer', names)
+        self.assertIn('pynarrative.render.datasets', names)
+        self.assertIn('pynarrative.render.compose', names)
+        layers = [span for span in self.tracer.spans if span['name'] == 'pynarrative.add_annotation']
+        self.assertEqual(layers[0]['attributes']['story.layers'], 2)
+        print("✓ Builder and render spans recorded")
+
+    def test_cached_phases_not_traced(self):
+        """Test that parts reused from the render cache emit no span"""
+        story = Story(self.data).mark_line().encode(x='x:Q', y='y:Q').add_title("Title")
+        story.render()
+        self.tracer.spans.clear()
+        story.render()
+        self.assertEqual(self.names(), ['pynarrative.render'])
+        print("✓ Cached render emits only the render span")
+
+    def test_serialize_and_validate_spans(self):
+        """Test the spans of to_json() and that it matches render().to_json()"""
+        story = Story(self.data).mark_line().encode(x='x:Q', y='y:Q').add_title("Title")
+        text = story.to_json()
+        self.assertEqual(text, story.render().to_json())
+        self.assertIn('pynarrative.validate', self.names())
+        serialize = [span for span in self.tracer.spans
+                     if span['name'] == 'pynarrative.serialize' and span['attributes']['format'] == 'json']
+        self.assertEqual(serialize[0]['attributes']['spec.bytes'], len(text.encode('utf-8')))
+
+        self.tracer.spans.clear()
+        story.to_dict(validate=False)
+        self.assertNotIn('pynarrative.validate', self.names())
+        print("✓ Serialization and validation spans recorded")
+
+    def test_disable_tracing(self):
+        """Test that set_tracer(None) disables tracing"""
+        self.assertIs(pynarrative.set_tracer(None), self.tracer)
+        Story(self.data).mark_line().encode(x='x:Q', y='y:Q').add_title("Title").to_dict()
+        self.assertEqual(self.tracer.spans, [])
+        print("✓ No span recorded without a tracer")
+
+class TestExplainCost(unittest.TestCase):
+    """
+    Tests of the spec size analyzer.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(20), 'y': [i % 4 for i in range(20)],
+                                  'category': ['a', 'b'] * 10})
+
+    def test_layers_and_marks(self):
+        """Test the datasets and marks reported per layer"""
+        story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                 .add_title("Title", "Subtitle").add_annotation(2, 2, "Note"))
+        cost = story.explain_cost()
+        self.assertEqual([layer['layer'] for layer in cost['layers']], ['main', 0, 1])
+        main, title, annotation = cost['layers']
+        self.assertEqual((main['rows'], main['marks']), (20, 20))
+        self.assertEqual((title['datasets'], title['marks']), ([], 2))
+        self.assertEqual(annotation['marks'], 3)
+        self.assertEqual(cost['marks'], 25)
+        self.assertEqual(cost['spec_bytes'], len(story.render().to_json().encode('utf-8')))
+        self.assertEqual(cost['hotspots'], [])
+        print("✓ Per-layer costs reported")
+
+    def test_full_data_overlay_hotspot(self):
+        """Test that text overlays bound to the main data are flagged"""
+        story = (Story(self.data, constant_overlays=False).mark_line().encode(x='x:Q', y='y:Q')
+                 .add_title("Title").add_source("Source"))
+        cost = story.explain_cost()
+        hotspots = [spot for spot in cost['hotspots'] if spot['kind'] == 'text-overlay-full-data']
+        self.assertEqual([spot['layer'] for spot in hotspots], [0, 1])
+        self.assertEqual(cost['layers'][1]['marks'], 20)
+        # The main dataset is read by the overlays but stored once
+        self.assertEqual(cost['duplicates'][0]['layers'], ['main', 0, 1])
+        print("✓ Full-data text overlays flagged")
+
+    def test_client_side_transforms(self):
+        """Test the transforms reported and the hot spot on large data"""
+        story = (Story(self.data).mark_bar().encode(x='category:N', y='sum(y):Q')
+                 .transform_filter(alt.FieldGTPredicate(field='x', gt=3)))
+        main = story.explain_cost()['layers'][0]
+        self.assertEqual(main['transforms'], ['filter', 'aggregate:y'])
+        self.assertEqual(main['marks'], 2)
+
+        hotspots = story.explain_cost(large_rows=10)['hotspots']
+        self.assertEqual([spot['kind'] for spot in hotspots], ['client-side-transforms'])
+        self.assertEqual(story.explain_cost(precompute=True, large_rows=10)['hotspots'], [])
+        print("✓ Client-side transforms reported")
+
+class TestDelegation(unittest.TestCase):
+    """
+    Tests of the pre-built delegation of Altair methods.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': [1, 2, 3], 'y': [4, 5, 6]})
+
+    def test_delegates_are_class_methods(self):
+        """Test that Chart methods are delegated by methods of the Story class"""
+        for name in ('mark_line', 'encode', 'properties', 'transform_filter', 'interactive'):
+            self.assertIn(name, vars(Story))
+        self.assertEqual(Story.mark_line.__doc__, alt.Chart.mark_line.__doc__)
+        # Methods defined by Story are not replaced
+        self.assertNotEqual(Story.configure_view, alt.Chart.configure_view)
+        self.assertIs(Story.to_dict, vars(Story)['to_dict'])
+        print("✓ Delegates installed on the Story class")
+
+    def test_chaining(self):
+        """Test that delegated calls update the chart and return the story"""
+        story = Story(self.data)
+        self.assertIs(story.mark_line().encode(x='x:Q', y='y:Q').properties(title="T"), story)
+        self.assertEqual(story.chart.mark, 'line')
+        self.assertEqual(story.chart.title, "T")
+        # Results other than charts are returned as they are
+        self.assertIsInstance(story.copy().to_dict(), dict)
+        print("✓ Delegated calls chain")
+
+    def test_other_attributes(self):
+        """Test that other attributes still go through __getattr__"""
+        story = Story(self.data, width=300)
+        self.assertEqual(story.width, 300)
+        self.assertEqual(story.mark_point().mark, 'point')
+        # Class methods are not pre-built
+        self.assertNotIn('from_dict', vars(Story))
+        self.assertTrue(callable(story.from_dict))
+        with self.assertRaises(AttributeError):
+            story.not_an_attribute
+        print("✓ Properties and class methods delegated")
+
+class TestLayerRecords(unittest.TestCase):
+    """
+    Tests of the layer records and shared themes.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': [1, 2, 3], 'y': [4, 5, 6]})
+        self.story = Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+
+    def test_records(self):
+        """Test that builders store slotted records readable by key"""
+        from pynarrative.layers import TitleLayer
+        self.story.add_title("Title").add_source("Source")
+        title, source = self.story.story_layers
+        self.assertIsInstance(title, TitleLayer)
+        self.assertFalse(hasattr(title, '__dict__'))
+        self.assertEqual((title['type'], title['title'], title['title_font_size']), ('title', "Title", 32))
+        self.assertEqual(source.get('vertical'), False)
+        self.assertEqual(dict(source)['type'], 'source')
+        with self.assertRaises(KeyError):
+            title['unknown'] = 1
+        print("✓ Layer records behave as mappings")
+
+    def test_shared_theme(self):
+        """Test that stories share an immutable theme"""
+        other = Story(self.data)
+        self.assertIs(self.story.theme, other.theme)
+        with self.assertRaises(TypeError):
+            self.story.font_sizes['title'] = 3
+        with self.assertRaises(AttributeError):
+            self.story.theme.base_font_size = 20
+        themed = Story(self.data, theme=self.story.theme.replace(colors={'title': 'red'}))
+        themed.add_title("Title")
+        self.assertEqual(themed.story_layers[0]['title_color'], 'red')
+        self.story.base_font_size = 10
+        self.assertEqual(self.story.theme.font_px['title'], 20)
+        self.assertIsNot(self.story.theme, other.theme)
+        print("✓ Themes shared and immutable")
+
+    def test_dictionary_layers(self):
+        """Test that layers given as dictionaries are still rendered"""
+        line = alt.Chart(pd.DataFrame({'y': [5]})).mark_rule().encode(y='y:Q')
+        self.story.story_layers.append({'type': 'shape', 'chart': line})
+        self.story.story_layers.append({'type': 'context', 'text': "Context", 'position': 'left',
+                                        'color': 'black', 'font_size': 12})
+        spec = self.story.render().to_dict()
+        self.assertEqual(len(spec['layer']), 3)
+        print("✓ Dictionary layers rendered")
+
+class TestPickling(unittest.TestCase):
+    """
+    Tests of pickling, copying and sending stories to worker processes.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(2000), 'y': [i % 7 for i in range(2000)]})
+        self.story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q')
+                      .add_title("Title").add_annotation(3, 3, "Note").add_line(3))
+
+    def test_pickle_and_copy(self):
+        """Test that stories can be pickled and copied"""
+        import copy
+        import pickle
+        expected = self.story.to_json()
+        self.assertEqual(pickle.loads(pickle.dumps(self.story)).to_json(), expected)
+        self.assertEqual(copy.deepcopy(self.story).to_json(), expected)
+
+        copied = copy.copy(self.story)
+        copied.add_source("Source")
+        self.assertEqual(len(self.story.story_layers), 3)
+        self.assertEqual(len(copied.story_layers), 4)
+        print("✓ Stories pickled and copied")
+
+    def test_shared_data(self):
+        """Test that large DataFrames are sent through shared memory"""
+        import pickle
+        inline = len(pickle.dumps(self.story))
+        with pynarrative.shared_data(min_bytes=1000):
+            shared = pickle.dumps(self.story)
+            loaded = pickle.loads(shared)
+            self.assertEqual(loaded.to_json(), self.story.to_json())
+        self.assertLess(len(shared), inline / 4)
+        # The story itself is unchanged
+        self.assertIs(self.story.chart.data, self.data)
+        print(f"✓ Pickle of {len(shared)} bytes instead of {inline}")
+
+    def test_loaded_frames_bounded(self):
+        """Test that a process keeps a bounded number of loaded frames"""
+        from pynarrative import sharing
+        frames = [self.data + index for index in range(sharing.MAX_ATTACHED + 4)]
+        with pynarrative.shared_data(min_bytes=1000) as shared:
+            for frame in frames:
+                loaded = shared.reference(frame).load()
+                self.assertTrue(loaded.equals(frame))
+            self.assertLessEqual(len(sharing._attached), sharing.MAX_ATTACHED)
+            # pandas frames are copies: their segments are closed
+            self.assertTrue(all(segment is None for segment, _ in sharing._attached.values()))
+        print(f"✓ At most {sharing.MAX_ATTACHED} frames kept")
+
+    def test_process_pool(self):
+        """Test sending stories to worker processes"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        context = multiprocessing.get_context('spawn')
+        with pynarrative.shared_data(min_bytes=1000):
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                specs = list(pool.map(Story.to_json, [self.story, self.story]))
+        self.assertEqual(specs, [self.story.to_json()] * 2)
+        print("✓ Stories rendered by a worker process")
+
+class TestSaveLoad(unittest.TestCase):
+    """
+    Tests of saving stories with Story.save_story() and loading them with
+    Story.load_story().
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'story.pns')
+        self.data = pd.DataFrame({'x': range(50), 'y': [i % 7 for i in range(50)],
+                                  'group': ['a', 'b'] * 25})
+        self.story = (Story(self.data, base_font_size=14).mark_line()
+                      .encode(x='x:Q', y='y', color='group')
+                      .add_title("Title", "Subtitle").add_context("Context")
+                      .add_annotation(3, 3, "Note").add_line(3)
+                      .add_source("Source").configure_view(stroke=None))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Test that a loaded story renders the same specification"""
+        self.story.save_story(self.path)
+        loaded = Story.load_story(self.path)
+        self.assertEqual(loaded.to_json(), self.story.to_json())
+        self.assertEqual(loaded.theme, self.story.theme)
+        self.assertEqual([layer['type'] for layer in loaded.story_layers],
+                         [layer['type'] for layer in self.story.story_layers])
+        self.assertTrue(os.path.exists(self.path + '.data'))
+
+        # Next-step charts are saved with the story
+        self.story.add_next_steps(mode='line_steps', texts=['One', 'Two', 'Three'])
+        self.story.save_story(self.path)
+        self.assertEqual(Story.load_story(self.path).to_json(), self.story.to_json())
+        print("✓ Loaded story renders the same specification")
+
+    def test_extend_loaded_story(self):
+        """Test that a loaded story can be extended with the builder methods"""
+        self.story.save_story(self.path)
+        loaded = Story.load_story(self.path).add_annotation(10, 4, "Another note")
+        expected = self.story.add_annotation(10, 4, "Another note")
+        self.assertEqual(loaded.to_json(), expected.to_json())
+        print("✓ Loaded story extended")
+
+    def test_url_data(self):
+        """Test that stories without DataFrames are saved without a data file"""
+        story = Story('https://example.com/data.csv').mark_point().encode(x='a:Q', y='b:Q')
+        story.add_context("Context")
+        story.save_story(self.path)
+        self.assertFalse(os.path.exists(self.path + '.data'))
+        self.assertEqual(Story.load_story(self.path).to_json(), story.to_json())
+        print("✓ Story with URL data saved and loaded")
+
+    def test_altair_save(self):
+        """Test that save() still saves the main chart with Altair"""
+        path = os.path.join(self.directory.name, 'chart.json')
+        self.story.save(path)
+        with open(path) as file:
+            self.assertEqual(json.load(file)['mark']['type'], 'line')
+        print("✓ Altair's save() kept")
+
+    def test_pickled_frames(self):
+        """Test that pickled DataFrames are neither saved nor loaded by default"""
+        import pickle
+        import struct
+        import zlib
+        from pynarrative import ir
+        story = Story(pd.DataFrame({'x': [1, 2], 'y': [3, 4], 'o': [object(), 'a']}))
+        with self.assertRaises(ValueError):
+            story.mark_point(tooltip=True).encode(x='x:Q', y='y:Q').save_story(self.path)
+
+        # A story whose side file holds pickles, as earlier versions wrote
+        spec, frames = ir.to_ir(self.story)
+        entries, offset = [], 0
+        with open(self.path + ir.DATA_SUFFIX, 'wb') as file:
+            for frame in frames:
+                payload = pickle.dumps(frame)
+                file.write(payload)
+                entries.append({'kind': 'pickle', 'offset': offset, 'size': len(payload)})
+                offset += len(payload)
+        spec['frames'] = entries
+        payload = zlib.compress(json.dumps(spec).encode('utf-8'))
+        with open(self.path, 'wb') as file:
+            file.write(ir.MAGIC + struct.pack('<I', len(payload)) + payload)
+        with self.assertRaises(ValueError):
+            Story.load_story(self.path)
+        loaded = Story.load_story(self.path, allow_pickle=True)
+        self.assertEqual(loaded.to_json(), self.story.to_json())
+        print("✓ Pickles only loaded with allow_pickle=True")
+
+    def test_invalid_file(self):
+        """Test that loading a file that is not a saved story raises ValueError"""
+        with open(self.path, 'wb') as file:
+            file.write(b'{"mark": "point"}')
+        with self.assertRaises(ValueError):
+            Story.load_story(self.path)
+
+        # Truncated and corrupt saved stories
+        self.story.save_story(self.path)
+        with open(self.path, 'rb') as file:
+            content = file.read()
+        for broken in (content[:10], content[:-5], content[:12] + b'x' * (len(content) - 12)):
+            with open(self.path, 'wb') as file:
+                file.write(broken)
+            with self.assertRaises(ValueError):
+                Story.load_story(self.path)
+        print("✓ Invalid file rejected")
+
+class TestAsync(unittest.TestCase):
+    """
+    Tests of the coroutines Story.arender(), Story.ato_json() and Story.aexport().
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.story = (Story(pd.DataFrame({'x': range(20), 'y': range(20)}))
+                      .mark_line().encode(x='x:Q', y='y:Q').add_title("Title"))
+        self.previous = pynarrative.set_executor(None)
+
+    def tearDown(self):
+        pynarrative.set_executor(self.previous)
+
+    def test_ato_json(self):
+        """Test that the coroutines give the same results as their blocking versions"""
+        async def main():
+            return await self.story.ato_json(), await self.story.arender()
+
+        spec, chart = asyncio.run(main())
+        self.assertEqual(spec, self.story.to_json())
+        self.assertEqual(chart.to_json(), self.story.render().to_json())
+        print("✓ Same specification as to_json()")
+
+    def test_concurrent_renders(self):
+        """Test that concurrent arender() calls on one story render it one at a time"""
+        inside = []
+        render = self.story._render
+
+        def counting_render(precompute):
+            inside.append(None)
+            try:
+                # Leaves time for another call to start, were they not serialised
+                time.sleep(0.01)
+                self.assertEqual(len(inside), 1)
+                return render(precompute)
+            finally:
+                inside.pop()
+
+        self.story._render = counting_render
+        executor = concurrent.futures.ThreadPoolExecutor(4)
+        pynarrative.set_executor(executor, max_concurrency=4)
+
+        async def main():
+            return await asyncio.gather(*(self.story.arender() for _ in range(8)))
+
+        try:
+            charts = asyncio.run(main())
+        finally:
+            executor.shutdown()
+        self.assertEqual(len({id(chart) for chart in charts}), 1)
+        print("✓ Concurrent renders serialised")
+
+    def test_timeout(self):
+        """Test that exceeding the timeout raises asyncio.TimeoutError"""
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self.story.ato_json(timeout=0))
+        print("✓ Timeout raised")
+
+    def test_bounded_concurrency(self):
+        """Test that at most max_concurrency stories are rendered at a time"""
+        running = []
+        peak = []
+
+        class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+            def submit(self, function, *args, **kwargs):
+                running.append(None)
+                peak.append(len(running))
+                future = super().submit(function, *args, **kwargs)
+                future.add_done_callback(lambda _: running.pop())
+                return future
+
+        executor = CountingExecutor(4)
+        pynarrative.set_executor(executor, max_concurrency=2)
+
+        async def main():
+            return await asyncio.gather(*(self.story.ato_json() for _ in range(6)))
+
+        try:
+            specs = asyncio.run(main())
+        finally:
+            executor.shutdown()
+        self.assertEqual(len(set(specs)), 1)
+        self.assertLessEqual(max(peak), 2)
+        print(f"✓ At most {max(peak)} stories rendered at a time")
+
+    def test_cancellation(self):
+        """Test that a cancelled call waiting for a slot gives the slot back"""
+        from pynarrative import aio
+        pynarrative.set_executor('thread', max_concurrency=1)
+        release = threading.Event()
+
+        async def main():
+            blocking = asyncio.ensure_future(aio.run(release.wait))
+            waiting = asyncio.ensure_future(self.story.ato_json())
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            release.set()
+            await blocking
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            # The slot is free again
+            return await self.story.ato_json(timeout=30)
+
+        try:
+            self.assertEqual(asyncio.run(main()), self.story.to_json())
+        finally:
+            pynarrative.set_executor(None).shutdown()
+        print("✓ Cancelled call released its slot")
+
+    @unittest.skipUnless(importlib.util.find_spec('vl_convert'), "vl-convert-python is required")
+    def test_aexport(self):
+        """Test exporting a story to SVG from a coroutine"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = asyncio.run(self.story.aexport(os.path.join(directory, 'story.svg')))
+            with open(path) as file:
+                self.assertIn('<svg', file.read())
+        with self.assertRaises(ValueError):
+            asyncio.run(self.story.aexport('story.txt'))
+        print("✓ Story exported to SVG")
+
+class TestServe(unittest.TestCase):
+    """
+    Tests of the story server, on localhost.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        from pynarrative.serve import StoryServer
+        self.story = (Story(pd.DataFrame({'x': range(100), 'y': range(100)}))
+                      .mark_line().encode(x='x:Q', y='y:Q').add_title("Title"))
+        self.server = StoryServer(('127.0.0.1', 0))
+        self.server.add('sales', self.story)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, path, **headers):
+        request = urllib.request.Request(self.base + path, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+    def test_json_and_html(self):
+        """Test serving the specification and the HTML page of a story"""
+        status, _, body = self.get('/')
+        self.assertEqual(json.loads(body), {'stories': ['sales']})
+        status, headers, body = self.get('/stories/sales.json')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), json.loads(self.story.to_json()))
+        status, headers, body = self.get('/stories/sales.html')
+        self.assertEqual(status, 200)
+        self.assertIn(b'vegaEmbed', body)
+        self.assertEqual(self.get('/stories/unknown.json')[0], 404)
+        print("✓ JSON and HTML served")
+
+    def test_cache_and_etag(self):
+        """Test that responses are rendered once and revalidated with their ETag"""
+        _, headers, _ = self.get('/stories/sales.json')
+        etag = headers['ETag']
+        status, _, body = self.get('/stories/sales.json', **{'If-None-Match': etag})
+        self.assertEqual((status, body), (304, b''))
+        self.assertEqual(self.get('/stories/sales.json', **{'If-None-Match': '"other"'})[0], 200)
+        self.assertEqual((self.server.cache.misses, self.server.cache.hits), (1, 2))
+        print("✓ Rendered once, 304 on matching ETag")
+
+    def test_gzip(self):
+        """Test that clients accepting gzip get a compressed body"""
+        import gzip
+        _, _, plain = self.get('/stories/sales.json')
+        _, headers, body = self.get('/stories/sales.json', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), plain)
+        for refused in ('gzip;q=0', 'br, gzip; q=0.0', 'x-gzipped', '*;q=0'):
+            _, other, _ = self.get('/stories/sales.json', **{'Accept-Encoding': refused})
+            self.assertNotIn('Content-Encoding', other)
+        _, other, _ = self.get('/stories/sales.json', **{'Accept-Encoding': 'br;q=1, *;q=0.5'})
+        self.assertEqual(other['Content-Encoding'], 'gzip')
+
+        # The compressed body has its own ETag
+        self.assertEqual(headers['ETag'], self.get('/stories/sales.json')[1]['ETag'][:-1] + '-gz"')
+        status, _, _ = self.get('/stories/sales.json', **{'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 200)
+        print(f"✓ {len(body)} compressed bytes instead of {len(plain)}")
+
+    def test_data_version(self):
+        """Test that a new data version renders the story again"""
+        version = ['1']
+        self.server.add('versioned', self.story, data_version=lambda: version[0])
+        self.get('/stories/versioned.json')
+        self.get('/stories/versioned.json')
+        version[0] = '2'
+        self.get('/stories/versioned.json')
+        # The story has the same fingerprint as 'sales', not yet requested
+        self.assertEqual(self.server.cache.misses, 2)
+        print("✓ Rendered again for a new data version")
+
+    def test_saved_story(self):
+        """Test serving a saved story, reloaded when its file changes"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'saved.pns')
+            self.story.save_story(path)
+            self.server.add_path(directory)
+            _, headers, body = self.get('/stories/saved.json')
+            self.assertEqual(json.loads(body), json.loads(self.story.to_json()))
+
+            self.story.add_source("Source")
+            self.story.save_story(path)
+            os.utime(path, ns=(0, 0))  # A new state even within the clock resolution
+            _, new_headers, body = self.get('/stories/saved.json')
+            self.assertNotEqual(new_headers['ETag'], headers['ETag'])
+            self.assertEqual(json.loads(body), json.loads(self.story.to_json()))
+        print("✓ Saved story served and reloaded")
+
+class TestColumnProjection(unittest.TestCase):
+    """
+    Tests that rendered stories only embed the columns they read.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        columns = {f'unused_{index}': range(4) for index in range(20)}
+        self.data = pd.DataFrame(dict(columns, Sales=[1.0, 2.0, 3.0, 4.0], Region=['N', 'S', 'N', 'S'],
+                                      Cost=[0.5, 1.0, 1.5, 2.0], Target=[1, 1, 2, 2], Note=list('abcd')))
+
+    def dataset_columns(self, story):
+        spec = story.to_dict()
+        return [sorted(values[0]) for values in spec['datasets'].values() if values and values[0]]
+
+    def test_encodings_and_expressions(self):
+        """Test that shorthands, tooltips and expression fields are kept"""
+        story = (Story(self.data).mark_point()
+                 .encode(x='Sales', y='margin:Q', color='Region', tooltip=['Note'])
+                 .transform_calculate(margin='datum.Sales - datum["Cost"]')
+                 .transform_filter('datum.Target > 1')
+                 .add_title("Title"))
+        self.assertEqual(self.dataset_columns(story), [['Cost', 'Note', 'Region', 'Sales', 'Target']])
+        print("✓ Only the columns read are embedded")
+
+    def test_all_fields(self):
+        """Test that tooltips showing every field keep all columns"""
+        story = Story(self.data).mark_point(tooltip=True).encode(x='Sales:Q', y='Cost:Q')
+        self.assertEqual(len(self.dataset_columns(story)[0]), len(self.data.columns))
+        print("✓ All columns kept for tooltip=True")
+
+    def test_shared_by_layers(self):
+        """Test that layers reading the same DataFrame share one projected dataset"""
+        story = (Story(self.data, constant_overlays=False).mark_line()
+                 .encode(x='Sales:Q', y='Cost:Q').add_title("Title").add_context("Context"))
+        self.assertEqual(self.dataset_columns(story), [['Cost', 'Sales']])
+        print("✓ One dataset for the main chart and its overlays")
+
+    @unittest.skipUnless(importlib.util.find_spec('polars'), "polars is required")
+    def test_polars(self):
+        """Test projecting a Polars DataFrame"""
+        import polars as pl
+        story = Story(pl.from_pandas(self.data)).mark_bar().encode(x='Region:N', y='sum(Sales):Q')
+        self.assertEqual(self.dataset_columns(story), [['Region', 'Sales']])
+        print("✓ Polars DataFrame projected")
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is required")
+    def test_arrow(self):
+        """Test projecting an Arrow table"""
+        import pyarrow as pa
+        story = Story(pa.Table.from_pandas(self.data)).mark_bar().encode(x='Region:N', y='sum(Sales):Q')
+        self.assertEqual(self.dataset_columns(story), [['Region', 'Sales']])
+        print("✓ Arrow table projected")
+
+    def test_no_encodings(self):
+        """Test that a chart reading no column keeps a row per mark"""
+        spec = Story(self.data).mark_point().render().to_dict()
+        self.assertEqual(len(spec['datasets'][spec['data']['name']]), len(self.data))
+        print("✓ Chart without encodings rendered")
+
+class TestCompact(unittest.TestCase):
+    """
+    Tests of the compact data encoding of stories (compact=True).
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({
+            'x': [0.123456789 * i for i in range(40)],
+            'big': [1000.0 * i + 0.123 for i in range(40)],
+            'date': pd.date_range('2024-01-01', periods=40, freq='D'),
+            'region': ['north', 'south'] * 20,
+        })
+
+    def dataset(self, story):
+        spec = story.to_dict()
+        return next(values for name, values in spec['datasets'].items() if name.startswith('data-')), spec
+
+    def test_numbers_and_dates(self):
+        """Test that floats are rounded to the chart resolution and dates become epoch milliseconds"""
+        story = Story(self.data, compact=True).mark_point().encode(x='x:Q', y='big:Q', color='date:T')
+        rows, _ = self.dataset(story)
+        self.assertEqual(story._compact_digits(), 4)
+        self.assertEqual(rows[1]['x'], 0.123)
+        self.assertEqual(rows[1]['big'], 1000)
+        self.assertIsInstance(rows[1]['big'], int)
+        self.assertEqual(rows[1]['date'], int(pd.Timestamp('2024-01-02', tz='UTC').timestamp() * 1000))
+        print("✓ Floats rounded and dates written as timestamps")
+
+    def test_large_numbers(self):
+        """Test that floats beyond the integers exact in JavaScript are not written as integers"""
+        data = pd.DataFrame({'x': [0, 1, 2], 'y': [1e20, 2e20, 3.5e20]})
+        story = Story(data, compact=True).mark_point().encode(x='x:Q', y='y:Q')
+        rows, _ = self.dataset(story)
+        self.assertEqual([row['y'] for row in rows], [1e20, 2e20, 3.5e20])
+        self.assertIsInstance(rows[0]['x'], int)
+        print("✓ Large floats kept")
+
+    def test_dictionary(self):
+        """Test that repeated strings are replaced by codes looked up in a dataset of the categories"""
+        story = Story(self.data, compact=True).mark_point().encode(x='x:Q', y='big:Q', color='region:N')
+        rows, spec = self.dataset(story)
+        self.assertEqual({row['region'] for row in rows}, {0, 1})
+        lookup, decoder = spec['transform'][:2]
+        self.assertEqual(spec['datasets'][lookup['from']['data']['name']],
+                         [{'code': 0, 'value': 'north'}, {'code': 1, 'value': 'south'}])
+        self.assertEqual(lookup['lookup'], 'region')
+        self.assertEqual(decoder['as'], 'region')
+        self.assertNotIn('north', decoder['calculate'])
+        print("✓ Strings dictionary-encoded")
+
+    @unittest.skipUnless(importlib.util.find_spec('vl_convert'), "vl-convert-python is required")
+    def test_dictionary_rendered(self):
+        """Test that a dictionary-encoded story renders as the story without compaction"""
+        import vl_convert
+
+        # Dots and brackets in column names are escaped by the lookup
+        data = pd.DataFrame({'x': range(40), 'region.name[0]': ['north', 'south', 'east', 'west'] * 10})
+        encoding = dict(x='x:Q', color=r'region\.name\[0\]:N')
+        compact, plain = (Story(data, compact=compact).mark_point().encode(**encoding).to_dict()
+                          for compact in (True, False))
+        self.assertEqual(vl_convert.vegalite_to_svg(compact), vl_convert.vegalite_to_svg(plain))
+        print("✓ Dictionary decoded by Vega")
+
+    def test_disabled(self):
+        """Test that stories are not compacted by default, and that precision is checked"""
+        story = Story(self.data).mark_point().encode(x='x:Q', y='big:Q', color='region:N')
+        rows, spec = self.dataset(story)
+        self.assertEqual(rows[1]['region'], 'south')
+        self.assertEqual(rows[1]['x'], 0.123456789)
+        self.assertNotIn('transform', spec)
+        self.assertEqual(Story(self.data, compact=True, precision=2)._compact_digits(), 2)
+        with self.assertRaises(ValueError):
+            Story(self.data, compact=True, precision=0)
+        print("✓ Data unchanged without compact=True")
+
+    def test_compiled(self):
+        """Test that data bound to a compiled compact story is compacted"""
+        story = Story(self.data, compact=True).mark_point().encode(x='x:Q', y='big:Q', color='region:N')
+        template = story.compile()
+        new = self.data.assign(region=['east', 'west'] * 20)
+        rows = template.bind(new)['datasets'][template.DATA_NAME]
+        self.assertEqual(rows[1]['x'], 0.123)
+        self.assertEqual(rows[1]['region'], 'west')
+        print("✓ Bound data compacted")
+
+    def test_save_load(self):
+        """Test that the compact settings are saved with the story"""
+        story = Story(self.data, compact=True, precision=3).mark_point().encode(x='x:Q', y='big:Q')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'story.pns')
+            story.save_story(path)
+            loaded = Story.load_story(path)
+        self.assertTrue(loaded.compact)
+        self.assertEqual(loaded.precision, 3)
+        self.assertEqual(loaded.to_json(), story.to_json())
+        print("✓ Compact settings saved")
+
+class TestJsonBackend(unittest.TestCase):
+    """
+    Tests of the JSON encoding of stories: backends and streamed output.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        self.data = pd.DataFrame({'x': range(30), 'y': [i * 0.5 for i in range(30)],
+                                  'label': ['café', 'tea'] * 15})
+        self.story = (Story(self.data).mark_line().encode(x='x:Q', y='y:Q', color='label:N')
+                      .add_title("Title").add_annotation(3, 1.5, "Note"))
+        self.expected = json.loads(self.story.render().to_json())
+
+    def test_backends(self):
+        """Test that every backend encodes the same specification as Altair"""
+        self.assertEqual(self.story.to_dict(), self.story.render().to_dict())
+        self.assertEqual(json.loads(self.story.to_json(backend='json')), self.expected)
+        # Options only the json module supports fall back to it
+        self.assertEqual(self.story.to_json(indent=4, backend='auto'),
+                         json.dumps(self.expected, indent=4, sort_keys=True))
+        if importlib.util.find_spec('orjson'):
+            self.assertEqual(json.loads(self.story.to_json(backend='orjson')), self.expected)
+            with self.assertRaises(ValueError):
+                self.story.to_json(indent=4, backend='orjson')
+        print("✓ Same specification with every backend")
+
+    def test_set_backend(self):
+        """Test selecting the default backend"""
+        previous = pynarrative.set_json_backend('json')
+        try:
+            self.assertEqual(self.story.to_json(), json.dumps(self.expected, indent=2, sort_keys=True))
+            with self.assertRaises(ValueError):
+                pynarrative.set_json_backend('simplejson')
+        finally:
+            pynarrative.set_json_backend(previous)
+        print("✓ Default backend set")
+
+    def test_write_json(self):
+        """Test streaming the specification by chunks of rows"""
+        output = io.BytesIO()
+        written = self.story.write_json(output, indent=2, backend='json', chunk_rows=7)
+        self.assertEqual(written, len(output.getvalue()))
+        self.assertEqual(output.getvalue().decode('utf-8'),
+                         json.dumps(self.expected, indent=2, sort_keys=True, separators=(',', ': ')))
+
+        text = io.StringIO()
+        self.story.write_json(text, chunk_rows=4)
+        self.assertEqual(json.loads(text.getvalue()), self.expected)
+        with tempfile.TemporaryDirectory() as directory, concurrent.futures.ThreadPoolExecutor(2) as pool:
+            path = os.path.join(directory, 'story.json')
+            self.story.write_json(path, workers=pool, chunk_rows=5)
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual(json.load(file), self.expected)
+        print("✓ Specification written by chunks")
+
+class TestValidationModes(unittest.TestCase):
+    """
+    Tests of the validation setting of stories: 'always', 'once' and 'never'.
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        from pynarrative.validation import clear_validated
+        clear_validated()
+
+    def build(self, index, validation='always'):
+        data = pd.DataFrame({'x': range(10 + index), 'y': [i * index for i in range(10 + index)]})
+        return (Story(data, validation=validation).mark_line().encode(x='x:Q', y='y:Q')
+                .add_title(f"Title {index}", "Subtitle").add_annotation(index, index, f"Note {index}"))
+
+    def test_structure_key(self):
+        """Test that stories differing only by data and texts share a structure"""
+        from pynarrative.validation import structure_key
+        keys = {structure_key(self.build(index).to_dict(validate=False)) for index in (1, 2, 3)}
+        self.assertEqual(len(keys), 1)
+        other = self.build(1).mark_point().to_dict(validate=False)
+        self.assertNotIn(structure_key(other), keys)
+        print("✓ Same structure for other data and texts")
+
+    def test_once(self):
+        """Test that 'once' validates each structure a single time"""
+        from pynarrative.validation import validate_spec
+        checks = []
+        for index in (1, 2):
+            story = self.build(index, 'once')
+            checks.append(validate_spec(story.render(), story.to_dict(validate=False), 'once'))
+        self.assertEqual(checks, [True, False])
+        story = self.build(3)
+        self.assertTrue(validate_spec(story.render(), story.to_dict(validate=False), 'always'))
+        print("✓ Structure validated once")
+
+    def test_never(self):
+        """Test that invalid specifications pass unchecked only when validation is skipped"""
+        story = self.build(1, 'never')
+        story.chart.description = 5  # Must be a string
+        self.assertIn('"description": 5', story.to_json())
+        with self.assertRaises(Exception):
+            story.to_dict(validate=True)
+        story.validation = 'always'
+        with self.assertRaises(Exception):
+            story.to_json()
+        with self.assertRaises(ValueError):
+            Story(validation='sometimes')
+        print("✓ Validation skipped with 'never'")
+
+    def test_render_many(self):
+        """Test that render_many validates the stories as set by their validation"""
+        def build(index, validation):
+            story = self.build(index, validation)
+            story.chart.description = 5  # Must be a string
+            return story
+
+        items = [{'index': 1, 'validation': 'never'}, {'index': 2, 'validation': 'never'}]
+        results = list(render_many(build, items, processes=0))
+        self.assertTrue(all('"description": 5' in text for _, text in results))
+        with self.assertRaises(Exception):
+            list(render_many(build, [{'index': 1, 'validation': 'always'}], processes=0, output='dict'))
+        print("✓ Validation setting of the stories applied")
+
+@unittest.skipUnless(importlib.util.find_spec('vl_convert'), "vl-convert-python is required")
+class TestVega(unittest.TestCase):
+    """
+    Tests of the compiled Vega output of stories (Story.to_vega()).
+    """
+
+    def setUp(self):
+        print(f"\nExecuting: {self._testMethodName}")
+        from pynarrative.vega import clear_compiled
+        clear_compiled()
+
+    def build(self, index, title="Title"):
+        data = pd.DataFrame({'x': range(20), 'y': [(i * index) % 7 for i in range(20)]})
+        return (Story(data).mark_line().encode(x='x:Q', y='y:Q')
+                .add_title(title).add_annotation(3, 3, "Note"))
+
+    def test_same_drawing(self):
+        """Test that the compiled Vega draws the same image as the Vega-Lite specification"""
+        import vl_convert
+        story = self.build(1)
+        vega = story.to_vega()
+        self.assertIn('/schema/vega/', vega['$schema'])
+        self.assertEqual(vl_convert.vega_to_svg(vega), vl_convert.vegalite_to_svg(story.to_dict()))
+        print("✓ Same drawing")
+
+    def test_cache(self):
+        """Test that stories differing only by their data reuse the compilation"""
+        from pynarrative.vega import compiled_count
+        first, second = self.build(1).to_vega(), self.build(2).to_vega()
+        self.assertEqual(compiled_count(), 1)
+        rows = [entry['values'] for entry in second['data'] if entry.get('values')]
+        self.assertIn([{'x': 1, 'y': 2}], [values[1:2] for values in rows])
+        self.assertNotEqual(first['data'], second['data'])
+        self.build(1, title="Other title").to_vega()
+        self.assertEqual(compiled_count(), 2)
+        print("✓ Compilation reused for other data")
+
+    def test_serve(self):
+        """Test serving the compiled Vega and HTML pages embedding it"""
+        from pynarrative.serve import StoryServer
+        server = StoryServer(('127.0.0.1', 0), compiled=True)
+        server.add('sales', self.build(1))
+        self.assertEqual(json.loads(server.response('sales', 'vega').body), self.build(1).to_vega())
+        self.assertIn(b'/schema/vega/', server.response('sales', 'html').body)
+        server.server_close()
+        print("✓ Compiled Vega served")
+
 if __name__ == '__main__':
     print("\n=== Starting Story Tests ===")
     unittest.main(verbosity=2)